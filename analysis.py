@@ -0,0 +1,366 @@
+import numpy as np
+
+import integrators
+import neighbors
+import periodic
+
+### STREAMING HISTOGRAMS ###
+
+# Each analysis is updated with one frame (or one batch of samples) at a
+# time and keeps only its histogram counts, so it can follow a trajectory
+# reader or a running simulation for any number of frames in fixed memory.
+
+class Histogram:
+
+    """
+    a histogram of n_bins equal bins between lo and hi, accumulated over
+    calls to add
+    """
+
+    def __init__(self, lo, hi, n_bins=100):
+
+        self.edges = np.linspace(lo, hi, n_bins + 1)
+        self.counts = np.zeros(n_bins)
+        self.n_samples = 0
+
+    @property
+    def centers(self):
+
+        "returns the bin centers"
+
+        return 0.5 * (self.edges[1:] + self.edges[:-1])
+
+    @property
+    def width(self):
+
+        "returns the bin width"
+
+        return self.edges[1] - self.edges[0]
+
+    def add(self, values):
+
+        """
+        adds values to the histogram; values outside the range are counted
+        in the normalization only
+        """
+
+        values = np.ravel(values)
+        index = np.floor((values - self.edges[0]) / self.width).astype(int)
+        inside = (index >= 0) & (index < len(self.counts))
+        self.counts += np.bincount(index[inside], minlength=len(self.counts))
+        self.n_samples += len(values)
+
+    def density(self):
+
+        """
+        returns the normalized probability density of each bin
+        """
+
+        return self.counts / (max(self.n_samples, 1) * self.width)
+
+    def jacobian(self):
+
+        """
+        returns the volume factor of each bin (1 for a plain coordinate)
+        """
+
+        return np.ones(len(self.counts))
+
+    def boltzmann_inversion(self, temperature):
+
+        """
+        returns -RT ln(P/J) (kJ/mol) in each bin, with the minimum at zero,
+        where J is the Jacobian of the coordinate; empty bins are nan
+        """
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pmf = -integrators.gas_constant * temperature * np.log(self.density() / self.jacobian())
+        pmf[~np.isfinite(pmf)] = np.nan
+        return pmf - np.nanmin(pmf) if np.any(np.isfinite(pmf)) else pmf
+
+class BondLengths(Histogram):
+
+    """
+    histogram of the lengths (Angstroms) of the given bonds; without bonds,
+    distances can be added directly
+    """
+
+    def __init__(self, bonds, lo, hi, n_bins=100):
+
+        super().__init__(lo, hi, n_bins)
+        self.bonds = np.zeros((0, 2), dtype=int) if bonds is None \
+            else np.asarray(bonds).reshape(-1, 2)
+
+    def update(self, coords):
+
+        i, j = self.bonds.T
+        self.add(np.sqrt(np.sum((coords[i] - coords[j])**2, axis=1)))
+
+    def jacobian(self):
+
+        return self.centers**2
+
+class BondAngles(Histogram):
+
+    """
+    histogram of the angles (degrees) of the given (i, j, k) triplets
+    """
+
+    def __init__(self, angles, lo=0, hi=180, n_bins=180):
+
+        super().__init__(lo, hi, n_bins)
+        self.angles = np.asarray(angles).reshape(-1, 3)
+
+    def update(self, coords):
+
+        i, j, k = self.angles.T
+        u = coords[i] - coords[j]
+        v = coords[k] - coords[j]
+        cos = np.einsum('ij,ij->i', u, v) / np.sqrt(
+            np.einsum('ij,ij->i', u, u) * np.einsum('ij,ij->i', v, v))
+        self.add(np.degrees(np.arccos(np.clip(cos, -1, 1))))
+
+    def jacobian(self):
+
+        return np.sin(np.radians(self.centers))
+
+### RADIAL DISTRIBUTION FUNCTION ###
+
+def sphere_directions(n=2000):
+
+    """
+    returns n nearly uniform unit vectors (Fibonacci sphere)
+    """
+
+    k = np.arange(n) + 0.5
+    z = 1 - 2*k/n
+    phi = np.pi * (1 + 5**0.5) * k
+    rho = np.sqrt(1 - z**2)
+    return np.stack([rho*np.cos(phi), rho*np.sin(phi), z], axis=1)
+
+class RDF(Histogram):
+
+    """
+    radial distribution function g(r) of the given atoms (all by default),
+    with pairs found by a cell-list search up to r_max (Angstroms)
+
+    g(r) is the pair count relative to that of an ideal gas: in a box of the
+    given edge lengths (with walls, so pairs at long range are fewer), in a
+    periodic.Box (by minimum images, with r_max at most half its narrowest
+    width), or at the mean density over a given volume (Angstroms^3) otherwise
+    """
+
+    def __init__(self, r_max, n_bins=150, atoms=None, box=None, volume=None):
+
+        super().__init__(0, r_max, n_bins)
+        if box is None and volume is None:
+            raise ValueError('RDF needs a box or a volume for the ideal gas reference')
+        self.atoms = atoms
+        self.periodic_box = None
+        if isinstance(box, periodic.Box):
+            box.check_cutoff(r_max)
+            self.periodic_box, volume, box = box, box.volume, None
+        self.box = None if box is None else np.broadcast_to(np.asarray(box, dtype=float), 3)
+        self.volume = volume if box is None else np.prod(self.box)
+        self.n_frames = 0
+        self.n_atoms = 0
+
+    def update(self, coords):
+
+        coords = np.asarray(coords, dtype=float)
+        if self.atoms is not None:
+            coords = coords[self.atoms]
+        i, j = neighbors.cell_pairs(coords, self.edges[-1], self.periodic_box)
+        self.add(np.sqrt(np.sum(periodic.displacements(coords, i, j, self.periodic_box)**2,
+            axis=1)))
+        self.n_frames += 1
+        self.n_atoms = len(coords)
+
+    def ideal_pairs(self):
+
+        """
+        returns the expected number of pairs per bin and frame for an ideal
+        gas of the same number of atoms
+        """
+
+        n_pairs = self.n_atoms * (self.n_atoms - 1) / 2
+        r = self.centers
+        shell = 4*np.pi * r**2 * self.width
+        if self.box is None:
+            return n_pairs * shell / self.volume
+
+        ### fraction of displacements of length r that fit in the box ###
+        overlap = np.prod(np.maximum(self.box - r[:,None,None] *
+            np.abs(sphere_directions())[None], 0), axis=2).mean(axis=1)
+        return n_pairs * shell * overlap / np.prod(self.box)**2
+
+    def g(self):
+
+        """
+        returns g(r) at the bin centers
+        """
+
+        return self.counts / (max(self.n_frames, 1) * self.ideal_pairs())
+
+    def boltzmann_inversion(self, temperature):
+
+        """
+        returns the potential of mean force -RT ln g(r) (kJ/mol), which goes
+        to zero where the atoms are uncorrelated; empty bins are nan
+        """
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pmf = -integrators.gas_constant * temperature * np.log(self.g())
+        pmf[~np.isfinite(pmf)] = np.nan
+        return pmf
+
+def accumulate(frames, analyses):
+
+    """
+    updates every analysis with every frame (from a trajectory reader or
+    any iterable of coordinates) and returns the analyses
+    """
+
+    for coords in frames:
+        for analysis in analyses:
+            analysis.update(coords)
+    return analyses
+
+### DIFFUSION ###
+
+# Mean-squared displacements and velocity autocorrelations are averaged over
+# every time origin. Both reduce to autocorrelations, computed with FFTs in
+# O(T log T) per atom instead of the O(T^2) loop over windows. Atoms are
+# processed in chunks small enough for the FFT buffers of a long trajectory,
+# so the positions can be a memory map (e.g. trajectory.DCD.positions or
+# np.load(..., mmap_mode='r')) of any length that is read chunk by chunk.
+
+chunk_memory = 2**28  # bytes of FFT buffers per chunk of atoms
+
+def fft_length(n):
+
+    """
+    returns the smallest length >= n with no prime factors above 5, for
+    which FFTs are fast
+    """
+
+    best = 2 ** int(np.ceil(np.log2(n)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p = p35 * 2 ** max(int(np.ceil(np.log2(n / p35))), 0)
+            best = min(best, p)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+def chunk_atoms(n_frames, chunk_size=None):
+
+    """
+    returns the number of atoms per chunk, by default as many as fit in
+    chunk_memory for a trajectory of n_frames
+    """
+
+    if chunk_size is None:
+        chunk_size = chunk_memory // (128 * n_frames)
+    return max(int(chunk_size), 1)
+
+def autocorrelation(x, max_lag=None):
+
+    """
+    returns the autocorrelation sum_t x(t) . x(t+lag) / (T - lag) of each
+    column of x, shape (T, n, 3), for lags 0 to max_lag (all by default),
+    summed over the last axis
+    """
+
+    x = np.asarray(x, dtype=float)
+    n_frames = len(x)
+    max_lag = n_frames - 1 if max_lag is None else min(max_lag, n_frames - 1)
+    n = fft_length(2 * n_frames)  # zero padding, so the correlation is not circular
+
+    f = np.fft.rfft(x, n, axis=0)
+    power = np.sum(f.real**2 + f.imag**2, axis=-1)
+    del f
+    corr = np.fft.irfft(power, n, axis=0)[:max_lag + 1]
+    return corr / (n_frames - np.arange(max_lag + 1))[:,None]
+
+def msd(positions, max_lag=None):
+
+    """
+    returns the mean-squared displacement (Angstroms^2) of each atom at lags
+    0 to max_lag, shape (lags, n_atoms), from positions of shape
+    (T, n_atoms, 3), averaged over all time origins
+
+    MSD(m) = <r(t+m)^2> + <r(t)^2> - 2<r(t) . r(t+m)>; the first two terms are
+    running sums and the last is an FFT autocorrelation
+    """
+
+    positions = np.asarray(positions, dtype=float)
+    positions = positions - positions.mean(axis=0)  # less cancellation
+    n_frames = len(positions)
+    max_lag = n_frames - 1 if max_lag is None else min(max_lag, n_frames - 1)
+    lags = np.arange(max_lag + 1)
+
+    d = np.sum(positions**2, axis=-1)
+    prefix = np.concatenate([np.zeros((1, d.shape[1])), np.cumsum(d, axis=0)])
+    squares = (prefix[n_frames - lags] + prefix[n_frames] - prefix[lags]) \
+        / (n_frames - lags)[:,None]
+    return squares - 2 * autocorrelation(positions, max_lag)
+
+def chunked_mean(func, array, max_lag=None, chunk_size=None):
+
+    """
+    returns func(block, max_lag) averaged over the atoms of array, shape
+    (T, n_atoms, 3), evaluated on chunks of atoms
+    """
+
+    n_frames, n_atoms = array.shape[:2]
+    step = chunk_atoms(n_frames, chunk_size)
+    total = 0
+    for start in range(0, n_atoms, step):
+        total = total + np.sum(func(array[:, start:start + step], max_lag), axis=1)
+    return total / n_atoms
+
+def mean_squared_displacement(positions, max_lag=None, chunk_size=None):
+
+    """
+    returns the mean-squared displacement (Angstroms^2) averaged over atoms
+    and time origins at lags 0 to max_lag, from positions (T, n_atoms, 3)
+    of unwrapped coordinates
+    """
+
+    return chunked_mean(msd, positions, max_lag, chunk_size)
+
+def velocity_autocorrelation(velocities, max_lag=None, chunk_size=None, normalize=False):
+
+    """
+    returns the velocity autocorrelation <v(t) . v(t+lag)> ((Angstroms/fs)^2,
+    or relative to lag 0 if normalize) averaged over atoms and time origins
+    at lags 0 to max_lag, from velocities (T, n_atoms, 3)
+    """
+
+    vacf = chunked_mean(autocorrelation, velocities, max_lag, chunk_size)
+    return vacf / vacf[0] if normalize else vacf
+
+def einstein_diffusion(msd_values, dt, start=0.1, stop=0.5):
+
+    """
+    returns the diffusion coefficient (Angstroms^2/fs; 1 Angstroms^2/fs =
+    0.1 cm^2/s) from the slope of the mean-squared displacement, sampled
+    every dt fs, fitted between the given fractions of its lags
+    """
+
+    lags = np.arange(len(msd_values))
+    fit = slice(int(start * len(lags)), max(int(stop * len(lags)), int(start * len(lags)) + 2))
+    return np.polyfit(dt * lags[fit], msd_values[fit], 1)[0] / 6
+
+def green_kubo_diffusion(vacf, dt):
+
+    """
+    returns the diffusion coefficient (Angstroms^2/fs) from the integral of
+    the velocity autocorrelation, sampled every dt fs, by the trapezoid rule
+    """
+
+    vacf = np.asarray(vacf, dtype=float)
+    return dt * (vacf.sum() - 0.5*(vacf[0] + vacf[-1])) / 3
@@ -5,6 +5,8 @@ import numpy as np
 import plotly.graph_objects as go
 import plotly.subplots as psub
 
+import fitting
+
 ### COLORS ###
 
 #E2C458 yellow
@@ -149,9 +151,26 @@ angle_kth_slider = dcc.Slider(
     tooltip = { 'always_visible': False },
 )
 
+### ENERGY SCAN FIT ###
+
+angle_fit_checklist = dcc.Checklist(
+    id='angle_fit_checklist',
+    options=[
+        {'label': ' fit to an energy scan (water bend reference, or upload one)', 'value': 'fit'},
+    ],
+    value=[],
+)
+
+angle_scan_upload = dcc.Upload(
+    id='angle_scan_upload',
+    children=html.Div(['drop or select a scan file (degrees, kJ/mol)']),
+    style={'borderWidth':'1px', 'borderStyle':'dashed', 'borderColor':'#c3c3c3',
+        'borderRadius':'5px', 'textAlign':'center', 'padding':'5px'},
+)
+
 ### ANGLE POTENTIAL PLOT ###
 
-def update_angle_plot(th_value, tho_value, kth_value):
+def update_angle_plot(th_value, tho_value, kth_value, fit_value=(), scan_contents=None):
 
     th = np.arange(min_th,max_th,0.001)
     if th[0] == 0:
@@ -293,6 +312,10 @@ def update_angle_plot(th_value, tho_value, kth_value):
         showlegend=False,
     )
 
+    ### fit to an energy scan ###
+    if 'fit' in fit_value:
+        fitting.add_fit(fig, 'angle', scan_contents)
+
     return fig
 
 fig  = update_angle_plot(angle_th_slider.value, angle_tho_slider.value, angle_kth_slider.value)
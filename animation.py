@@ -0,0 +1,245 @@
+import numpy as np
+import plotly.graph_objects as go
+
+import analysis
+import integrators
+
+### TWO-BODY DYNAMICS ###
+
+# The "play" mode of the atom-force plots integrates the motion of the two
+# atoms on the server and sends every frame in one response as plotly
+# animation frames, which the browser then plays at a steady frame rate with
+# no further callbacks. At a finite temperature the pair is run with
+# Langevin dynamics as an ensemble of replicas, whose distance distribution
+# is overlaid on the potential plots, and the first replica is animated.
+
+frame_rate = 30  # frames per second in the browser
+n_frames = 120  # four seconds of animation
+
+wall_k = 1000  # kJ/(mol*Angstroms^2), soft walls at the ends of the plots
+
+def pair_system(energy, force, r_min=None, r_max=None):
+
+    """
+    returns an energy_forces function of two atoms for a pair energy(r)
+    (kJ/mol) and force(r) (N/mol, positive when repulsive), for the
+    integrators; it is vectorized over replicas, coords (..., 2, 3), and
+    harmonic walls keep the distance between r_min and r_max if given
+    """
+
+    def energy_forces(coords):
+        d = coords[...,1,:] - coords[...,0,:]
+        r = np.sqrt(np.sum(d**2, axis=-1))
+        e, f = np.sum(energy(r)), force(r)
+        for wall, side in [(r_min, -1), (r_max, 1)]:
+            if wall is not None:
+                over = np.maximum(side * (r - wall), 0)
+                e += 0.5 * wall_k * np.sum(over**2)
+                f = f - side * wall_k * over * integrators.force_scale
+        f = (f / r)[...,None] * d
+        return float(e), np.stack([-f, f], axis=-2)
+
+    return energy_forces
+
+class Distances:
+
+    "observer that records the distance between the first two atoms (of each replica)"
+
+    def __init__(self):
+
+        self.values = []
+
+    def update(self, coords):
+
+        self.values.append(np.sqrt(np.sum((coords[...,1,:] - coords[...,0,:])**2, axis=-1)))
+
+def two_body(energy, force, r0, masses, frame_time, r_min, r_max,
+             n_frames=n_frames, steps_per_frame=20):
+
+    """
+    returns the distance (Angstroms) between two atoms of the given masses
+    (g/mol), released at rest r0 apart, at every frame_time fs for n_frames
+    frames of velocity Verlet; the motion stops at the last frame that stays
+    within r_min and r_max
+    """
+
+    coords = np.array([[0.0, 0.0, 0.0], [r0, 0.0, 0.0]])
+    distances = Distances()
+    with np.errstate(all='ignore'):
+        integrators.velocity_verlet(pair_system(energy, force), coords, np.zeros((2, 3)),
+            np.asarray(masses, dtype=float), frame_time / steps_per_frame,
+            n_frames * steps_per_frame, sample=steps_per_frame, observers=(distances,))
+
+    r = np.concatenate([[r0], distances.values])
+    outside = np.nonzero(~np.isfinite(r) | (r < r_min) | (r > r_max))[0]
+    return r[:outside[0]] if len(outside) else r
+
+def langevin_pairs(energy, force, r0, masses, temperature, frame_time, r_min, r_max,
+                   n_replicas=1000, n_frames=n_frames, steps_per_frame=4, seed=0):
+
+    """
+    returns the distance (Angstroms) between two atoms at every frame_time
+    fs, shape (n_frames + 1, n_replicas), for n_replicas independent pairs
+    released r0 apart with thermal velocities and run with Langevin dynamics
+    at temperature (K), all integrated at once
+
+    the friction damps the motion over about 10 frames, and soft walls at
+    r_min and r_max keep dissociating pairs in the plotted range
+    """
+
+    masses = np.asarray(masses, dtype=float)
+    coords = np.zeros((n_replicas, 2, 3))
+    coords[:,1,0] = r0
+    velocities = np.sqrt(integrators.gas_constant * temperature * integrators.accel_scale
+        / masses)[:,None] * np.random.default_rng(seed).standard_normal((n_replicas, 2, 3))
+    distances = Distances()
+    with np.errstate(all='ignore'):
+        integrators.langevin(pair_system(energy, force, r_min, r_max), coords, velocities,
+            masses, frame_time / steps_per_frame, n_frames * steps_per_frame, temperature,
+            friction=1 / (10 * frame_time), seed=seed + 1, sample=steps_per_frame,
+            observers=(distances,))
+    return np.concatenate([np.full((1, n_replicas), float(r0)), distances.values])
+
+def release_time(force, r0, mu):
+
+    """
+    returns the time (fs) for the force (N/mol) at r0 to move atoms of reduced
+    mass mu (g/mol) by about half their distance, a time scale for the
+    animation when there is no vibration period
+    """
+
+    a = abs(force(r0)) / integrators.force_scale * integrators.accel_scale / mu
+    return np.sqrt(r0 / a) if a > 0 else 100.0
+
+### ANIMATED FIGURES ###
+
+# Frame traces are plain dicts rather than graph objects: a few hundred
+# traces are built per animation, and validating each one as a graph object
+# would take longer than the dynamics.
+
+def arrow(x0, x1, y=1.5):
+
+    """
+    returns a force vector from x0 to x1 as a trace, so it can be animated
+    (layout annotations are not)
+    """
+
+    head = 'triangle-right' if x1 >= x0 else 'triangle-left'
+    return dict(
+        type='scatter',
+        x=[x0, x1],
+        y=[y, y],
+        mode='lines+markers',
+        hoverinfo='none',
+        line={'color':'#E2C458', 'width':3},
+        marker={'color':'#E2C458', 'size':[0, 12], 'symbol':['circle', head]},
+    )
+
+def pair_traces(mid_pt, r, force_length, text, text_y, labels=None):
+
+    """
+    returns the traces of one frame of a two-atom force plot: the atoms, their
+    force vectors and the force label (and optional labels under the atoms)
+    """
+
+    left, right = mid_pt - r/2, mid_pt + r/2
+    traces = [
+        dict(
+            type='scatter',
+            x=[left, right],
+            y=[1.5, 1.5],
+            mode='markers',
+            hoverinfo='none',
+            marker={'color':'#E6526A', 'size':20},
+        ),
+        arrow(left, left + force_length),
+        arrow(right, right - force_length),
+        dict(
+            type='scatter',
+            x=[mid_pt],
+            y=[text_y],
+            mode='text',
+            hoverinfo='none',
+            text=[text],
+            textfont={'color':'#E2C458', 'size':16},
+        ),
+    ]
+    if labels is not None:
+        traces.append(
+            dict(
+                type='scatter',
+                x=[left, right],
+                y=[1.4, 1.4],
+                mode='text',
+                hoverinfo='none',
+                text=labels,
+                textfont={'color':'#c3c3c3', 'size':16},
+            )
+        )
+    return traces
+
+def animate(fig, frames):
+
+    """
+    returns the figure dict of fig showing the first of frames (each a list
+    of trace dicts) with play and pause buttons; the static annotations are
+    removed, since the frames draw the force vectors and labels themselves
+    """
+
+    play = {'frame': {'duration': 1000 / frame_rate, 'redraw': True},
+        'transition': {'duration': 0}, 'fromcurrent': True, 'mode': 'immediate'}
+    pause = {'frame': {'duration': 0, 'redraw': False},
+        'transition': {'duration': 0}, 'mode': 'immediate'}
+    fig.update_layout(
+        annotations=[],
+        updatemenus=[
+            dict(
+                type='buttons',
+                direction='left',
+                showactive=False,
+                x=0.5,
+                xanchor='center',
+                y=0,
+                yanchor='top',
+                bgcolor='rgba(0,0,0,0)',
+                bordercolor='#c3c3c3',
+                font={'color':'#c3c3c3'},
+                buttons=[
+                    dict(label='\u25B6 play', method='animate', args=[None, play]),
+                    dict(label='\u275A\u275A pause', method='animate', args=[[None], pause]),
+                ],
+            ),
+        ],
+    )
+
+    figure = {'layout': fig.to_dict()['layout'], 'data': frames[0]}
+    figure['frames'] = [{'data': traces, 'name': str(n)} for n, traces in enumerate(frames)]
+    return figure
+
+def add_distribution(fig, distances, lo, hi, n_bins=150):
+
+    """
+    adds the probability density of the sampled distances (all frames after
+    the first sixth, of all replicas) to fig as a shaded curve in the lower
+    third of the plot, on a hidden axis of its own
+    """
+
+    histogram = analysis.BondLengths(None, lo, hi, n_bins)
+    histogram.add(distances[len(distances)//6:])
+    density = histogram.density()
+
+    fig.add_trace(
+        go.Scatter(
+            x=histogram.centers,
+            y=density,
+            mode='lines',
+            fill='tozeroy',
+            yaxis='y3',
+            hoverinfo='none',
+            line={'color':'rgba(230,82,106,0.6)','width':2},
+            fillcolor='rgba(230,82,106,0.25)',
+        )
+    )
+    fig.update_layout(yaxis3=dict(overlaying='y', visible=False,
+        range=[0, 3 * max(density.max(), 1e-12)]))
+    return fig
@@ -0,0 +1,236 @@
+import collections
+import io
+import json
+import re
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+import angles as angle
+import bonds as bond
+import coulomb as coul
+import dihedrals as dihedral
+import lennard_jones as lj
+
+### TERMS ###
+
+# The API evaluates the same functions the site plots. Each term has one
+# coordinate (distance in Angstroms or angle in degrees), its parameters in
+# the order of the function arguments, and the units of the potential and
+# force as returned by the functions.
+
+Term = collections.namedtuple('Term',
+    ['coordinate', 'params', 'potential', 'force', 'units', 'positive'])
+
+terms = {
+    'lennard_jones': Term('r', ('sigma', 'epsilon'), lj.potential, lj.force,
+        ('kJ/mol', 'N/mol'), ('r',)),
+    'coulomb': Term('r', ('q1', 'q2', 'k'),
+        lambda r, q1, q2, k: coul.potential(q1, q2, r, k),
+        lambda r, q1, q2, k: coul.force(q1, q2, r, k),
+        ('kJ', 'N'), ('r', 'k')),
+    'bond': Term('b', ('bo', 'kb'), bond.potential, bond.force,
+        ('kJ/mol', 'N/mol'), ()),
+    'angle': Term('th', ('tho', 'kth'), angle.potential, angle.force,
+        ('kJ/mol', 'N/mol'), ()),
+    'dihedral': Term('phi', ('kphi', 'n', 'delta'), dihedral.potential, dihedral.force,
+        ('kJ/mol', 'N/mol'), ()),
+}
+
+quantities = ('potential', 'force')
+
+### LIMITS ###
+
+max_request_bytes = 64 * 2**20  # request bodies
+max_values = 10**8  # output values per request
+chunk_values = 2**18  # values evaluated and sent per streamed chunk
+
+### REQUESTS ###
+
+class RequestError(ValueError):
+
+    "an invalid request, reported to the client with its status code"
+
+    def __init__(self, message, status=400):
+
+        super().__init__(message)
+        self.status = status
+
+def as_values(body, name):
+
+    """
+    returns a request field as a flat float array, checking that it is
+    finite and not empty
+    """
+
+    if name not in body:
+        raise RequestError('missing field {!r}'.format(name))
+    try:
+        values = np.atleast_1d(np.asarray(body[name], dtype=float)).ravel()
+    except (TypeError, ValueError):
+        raise RequestError('field {!r} must be a number or an array of numbers'.format(name))
+    if not len(values):
+        raise RequestError('field {!r} must not be empty'.format(name))
+    if not np.all(np.isfinite(values)):
+        raise RequestError('field {!r} must be finite'.format(name))
+    return values
+
+def parse(term, body):
+
+    """
+    returns the coordinate values, the parameter sets (n_params, n_sets), the
+    quantities, format and dtype of a request body
+
+    each parameter is a number or an array with one value per parameter set;
+    every set is evaluated at every coordinate value
+    """
+
+    if not isinstance(body, dict):
+        raise RequestError('the request body must be a JSON object')
+    x = as_values(body, term.coordinate)
+    params = body.get('params', {})
+    if not isinstance(params, dict):
+        raise RequestError("'params' must be an object")
+    unknown = set(params) - set(term.params)
+    if unknown:
+        raise RequestError('unknown parameters: {}'.format(', '.join(sorted(unknown))))
+    values = [as_values(params, name) for name in term.params]
+
+    n_sets = max(len(v) for v in values)
+    for name, v in zip(term.params, values):
+        if len(v) not in (1, n_sets):
+            raise RequestError('parameter {!r} has {} values for {} parameter sets'.format(
+                name, len(v), n_sets))
+    sets = np.stack([np.broadcast_to(v, n_sets) for v in values])
+
+    for name in term.positive:
+        v = x if name == term.coordinate else sets[term.params.index(name)]
+        if np.any(v <= 0):
+            raise RequestError('{!r} must be positive'.format(name))
+
+    wanted = body.get('quantities', list(quantities))
+    if isinstance(wanted, str):
+        wanted = [wanted]
+    if not wanted or any(q not in quantities for q in wanted):
+        raise RequestError("'quantities' must be a subset of {}".format(list(quantities)))
+
+    fmt = body.get('format', 'json')
+    if fmt not in ('json', 'npy'):
+        raise RequestError("'format' must be 'json' or 'npy'")
+    dtype = body.get('dtype', 'float32' if fmt == 'npy' else 'float64')
+    if dtype not in ('float32', 'float64'):
+        raise RequestError("'dtype' must be 'float32' or 'float64'")
+
+    if len(wanted) * n_sets * len(x) > max_values:
+        raise RequestError('{} values requested, the limit is {}'.format(
+            len(wanted) * n_sets * len(x), max_values), 413)
+    return x, sets, wanted, fmt, np.dtype(dtype)
+
+### EVALUATION ###
+
+def evaluate(term, quantity, x, sets):
+
+    """
+    yields the quantity for consecutive blocks of parameter sets, each an
+    array (sets in block, len(x)), with about chunk_values values per block
+    """
+
+    func = getattr(term, quantity)
+    rows = max(chunk_values // len(x), 1)
+    for start in range(0, sets.shape[1], rows):
+        block = sets[:, start:start + rows, None]
+        with np.errstate(all='ignore'):
+            yield np.broadcast_to(func(x[None,:], *block), (block.shape[1], len(x)))
+
+def stream_npy(term, x, sets, wanted, dtype):
+
+    """
+    yields an npy file of shape (quantities, parameter sets, len(x)) in
+    pieces, header first
+    """
+
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': dtype.str,
+        'fortran_order': False, 'shape': (len(wanted), sets.shape[1], len(x))})
+    yield header.getvalue()
+    for quantity in wanted:
+        for block in evaluate(term, quantity, x, sets):
+            yield np.ascontiguousarray(block, dtype=dtype).tobytes()
+
+non_finite = re.compile(r'-?(?:nan|inf)')  # as printed by %g; numbers only contain 'e'
+
+def stream_json(name, term, x, sets, wanted, dtype):
+
+    """
+    yields a JSON object with one nested list (parameter sets, len(x)) per
+    quantity in pieces, a block of rows at a time; non-finite values (e.g.
+    overflow at tiny r) are written as null, as JSON has no nan or inf
+    """
+
+    head = {'term': name, 'shape': [sets.shape[1], len(x)],
+        'units': dict(zip(quantities, term.units))}
+    ### rows are formatted from one template, with enough digits to round trip ###
+    row = '[' + ','.join(['%.9g' if dtype == np.float32 else '%.17g'] * len(x)) + ']'
+
+    yield json.dumps(head)[:-1]
+    for quantity in wanted:
+        yield ', "{}": ['.format(quantity)
+        first = True
+        for block in evaluate(term, quantity, x, sets):
+            rows = ','.join([row] * len(block)) % tuple(block.ravel())
+            if not np.all(np.isfinite(block)):
+                rows = non_finite.sub('null', rows)
+            yield rows if first else ',' + rows
+            first = False
+        yield ']'
+    yield '}'
+
+### ENDPOINTS ###
+
+blueprint = Blueprint('api', __name__, url_prefix='/api/v1')
+
+@blueprint.errorhandler(RequestError)
+def request_error(error):
+
+    return jsonify({'error': str(error)}), error.status
+
+@blueprint.route('/', methods=['GET'])
+def index():
+
+    """
+    returns the available terms with their coordinate, parameters and units
+    """
+
+    return jsonify({name: {'coordinate': term.coordinate, 'params': list(term.params),
+        'units': dict(zip(quantities, term.units))} for name, term in terms.items()})
+
+@blueprint.route('/<name>', methods=['POST'])
+def evaluate_term(name):
+
+    """
+    evaluates a term for a batch of parameter sets at an array of coordinate
+    values, e.g. POST /api/v1/lennard_jones with
+
+        {"r": [3, 3.5, 4], "params": {"sigma": [3.4, 3.0], "epsilon": 1},
+         "quantities": ["potential"], "format": "npy"}
+
+    the response is streamed as JSON or as an npy array of shape
+    (quantities, parameter sets, coordinate values)
+    """
+
+    if name not in terms:
+        raise RequestError('unknown term {!r}'.format(name), 404)
+    if request.content_length is not None and request.content_length > max_request_bytes:
+        raise RequestError('request body over {} bytes'.format(max_request_bytes), 413)
+    body = request.get_json(force=True, silent=True)
+    if body is None:
+        raise RequestError('the request body must be JSON')
+
+    term = terms[name]
+    x, sets, wanted, fmt, dtype = parse(term, body)
+    if fmt == 'npy':
+        return Response(stream_with_context(stream_npy(term, x, sets, wanted, dtype)),
+            mimetype='application/octet-stream',
+            headers={'X-Quantities': ','.join(wanted)})
+    return Response(stream_with_context(stream_json(name, term, x, sets, wanted, dtype)),
+        mimetype='application/json')
@@ -12,8 +12,12 @@ import introduction as intro
 import force_fields as ff
 import bonds as bond
 import angles as angle
+import dihedrals as dihedral
 import coulomb as coul
+import simulation as sim
+import vibrations as vib
 import references as ref
+import api
 
 import plotly.express as px
 
@@ -21,8 +25,9 @@ import plotly.express as px
 
 app = dash.Dash(__name__,external_stylesheets=[dbc.themes.GRID])
 
-# server = app.server
-#
+server = app.server
+server.register_blueprint(api.blueprint)  # batch evaluation API under /api/v1
+
 # app.scripts.config.serve_locally = True
 # app.css.config.serve_locally = True
 
@@ -73,6 +78,51 @@ app.layout = html.Div([
                     ], className = 'col-sm-9'),
                 ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
 
+                html.Div([
+                    html.Label(['bonded atoms'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        bond.bond_pair_dropdown,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        bond.bond_constraint_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        bond.bond_structure_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['T (K)'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        bond.bond_t_slider,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        bond.bond_play_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        bond.bond_fit_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['energy scan'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        bond.bond_scan_upload,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
             ], className = 'float', style={'verticalAlign':'center'}),
 
             html.Div([
@@ -131,6 +181,19 @@ app.layout = html.Div([
                     ], className = 'col-sm-8'),
                 ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
 
+                html.Div([
+                    html.Div([
+                        angle.angle_fit_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['energy scan'], className = 'col-sm-4', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        angle.angle_scan_upload,
+                    ], className = 'col-sm-8'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
             ], className = 'float', style={'verticalAlign':'center'}),
 
             html.Div([
@@ -152,6 +215,70 @@ app.layout = html.Div([
         ], className='col-sm-6'),
     ], className='row'),
 
+    ### DIHEDRAL POTENTIAL ###
+    html.Div([
+
+        dihedral.dihedral_text,
+
+        html.Br(),
+
+    ], className='float'),
+
+    html.Div([
+
+        html.Div([
+
+            html.Div([
+
+                html.Div([
+                    html.Div(['\u03D5 (degrees)'], className = 'col-sm-4', style={'textAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        dihedral.dihedral_phi_slider,
+                    ], className = 'col-sm-8', style={'verticalAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['K', html.Sub('\u03D5'),' (kJ/mol)'], className = 'col-sm-4', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        dihedral.dihedral_kphi_slider,
+                    ], className = 'col-sm-8'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['n'], className = 'col-sm-4', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        dihedral.dihedral_n_slider,
+                    ], className = 'col-sm-8'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['\u03B4 (degrees)'], className = 'col-sm-4', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        dihedral.dihedral_delta_slider,
+                    ], className = 'col-sm-8'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+            ], className = 'float', style={'verticalAlign':'center'}),
+
+            html.Div([
+
+                dihedral.dihedral_force_plot,
+
+            ], className = 'float', style={'height':'290px'}),
+
+        ], className='col-sm-6'),
+
+        html.Div([
+
+            html.Div([
+
+                dihedral.dihedral_plot,
+
+            ], className = 'float', style={}),
+
+        ], className='col-sm-6'),
+    ], className='row'),
+
     ### LENNARD-JONES POTENTIAL ###
     html.Div([
 
@@ -188,6 +315,52 @@ app.layout = html.Div([
                     ], className = 'col-sm-9'),
                 ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
 
+                html.Div([
+                    html.Label(['r', html.Sub('c'), ' (\u212B)'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        lj.lj_rc_slider,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['cutoff'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        lj.lj_cut_dropdown,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '5px 0'}),
+
+                html.Div([
+                    html.Div([
+                        lj.lj_structure_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['T (K)'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        lj.lj_t_slider,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        lj.lj_play_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        lj.lj_fit_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['energy scan'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        lj.lj_scan_upload,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
             ], className = 'float', style={'verticalAlign':'center'}),
 
             html.Div([
@@ -209,6 +382,48 @@ app.layout = html.Div([
         ], className='col-sm-6'),
     ], className='row'),
 
+    html.Div([
+
+        html.Div([
+
+            html.Div([
+
+                html.Div([
+                    html.Label(['\u03C3', html.Sub('B'), ' (\u212B)'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        lj.lj_s2_slider,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['\u025B', html.Sub('B'), ' (kJ/mol)'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        lj.lj_e2_slider,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['mixing rule'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        lj.lj_mix_dropdown,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '5px 0'}),
+
+            ], className = 'float', style={'verticalAlign':'center'}),
+
+        ], className='col-sm-6'),
+
+        html.Div([
+
+            html.Div([
+
+                lj.lj_mix_plot,
+
+            ], className = 'float', style={}),
+
+        ], className='col-sm-6'),
+    ], className='row'),
+
     ### COULOMB POTENTIAL ###
     html.Div([
 
@@ -252,6 +467,32 @@ app.layout = html.Div([
                     ], className = 'col-sm-9'),
                 ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
 
+                html.Div([
+                    html.Label(['r', html.Sub('c'), ' (\u212B)'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        coul.coul_rc_slider,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        coul.coul_wolf_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['T (K)'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        coul.coul_t_slider,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Div([
+                        coul.coul_play_checklist,
+                    ], className = 'col-sm-12', style={'textAlign':'center'}),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
             ], className = 'float', style={'verticalAlign':'center'}),
 
             html.Div([
@@ -273,6 +514,67 @@ app.layout = html.Div([
         ], className='col-sm-6'),
     ], className='row'),
 
+    ### NORMAL MODES ###
+    html.Div([
+
+        vib.vibrations_text,
+
+        html.Br(),
+
+    ], className='float'),
+
+    html.Div([
+
+        html.Div([
+
+            html.Div([
+
+                html.Div([
+                    html.Label(['molecule'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        vib.vib_molecule_dropdown,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+                html.Div([
+                    html.Label(['mode'], className = 'col-sm-3', style={'textAlign':'center', 'verticalAlign':'center', 'fontFamily':'serif', 'fontSize':'16px'}),
+                    html.Div([
+                        vib.vib_mode_dropdown,
+                    ], className = 'col-sm-9'),
+                ], className = 'row', style={'verticalAlign':'center','height':'50px', 'padding': '15px 0'}),
+
+            ], className = 'float', style={'verticalAlign':'center'}),
+
+            html.Div([
+
+                vib.spectrum_plot,
+
+            ], className = 'float', style={}),
+
+        ], className='col-sm-6'),
+
+        html.Div([
+
+            html.Div([
+
+                vib.mode_plot,
+
+            ], className = 'float', style={}),
+
+        ], className='col-sm-6'),
+    ], className='row'),
+
+    ### ENERGY DECOMPOSITION ###
+    html.Div([
+
+        sim.simulation_text,
+
+        html.Br(),
+
+        sim.energy_plot,
+
+    ], className='float'),
+
     # ### REFERENCES ###
     html.Div([ref.refs], className='float'),
 
@@ -283,18 +585,37 @@ app.layout = html.Div([
 @app.callback(Output('lj_plot', 'figure'),
              [Input('lj_e_slider', 'value'),
              Input('lj_s_slider', 'value'),
-             Input('lj_r_slider', 'value')])
-def update_lj_plot(e_value, s_value, r_value):
-    return lj.update_lj_plot(e_value, s_value, r_value)
+             Input('lj_r_slider', 'value'),
+             Input('lj_cut_dropdown', 'value'),
+             Input('lj_rc_slider', 'value'),
+             Input('lj_structure_checklist', 'value'),
+             Input('lj_t_slider', 'value'),
+             Input('lj_fit_checklist', 'value'),
+             Input('lj_scan_upload', 'contents')])
+def update_lj_plot(e_value, s_value, r_value, cut_value, rc_value, structure_value, t_value, fit_value, scan_contents):
+    return lj.update_lj_plot(e_value, s_value, r_value, cut_value, rc_value, structure_value, t_value, fit_value, scan_contents)
 
 ### UPDATE LENNARD-JONES ATOM-FORCE PLOT ###
 
 @app.callback(Output('lj_force_plot', 'figure'),
              [Input('lj_e_slider', 'value'),
              Input('lj_s_slider', 'value'),
-             Input('lj_r_slider', 'value')])
-def update_lj_force_plot(e_value, s_value, r_value):
-    return lj.update_lj_force_plot(e_value, s_value, r_value)
+             Input('lj_r_slider', 'value'),
+             Input('lj_play_checklist', 'value'),
+             Input('lj_t_slider', 'value')])
+def update_lj_force_plot(e_value, s_value, r_value, play_value, t_value):
+    return lj.update_lj_force_plot(e_value, s_value, r_value, play_value, t_value)
+
+### UPDATE MIXED LENNARD-JONES PLOT ###
+
+@app.callback(Output('lj_mix_plot', 'figure'),
+             [Input('lj_e_slider', 'value'),
+             Input('lj_s_slider', 'value'),
+             Input('lj_e2_slider', 'value'),
+             Input('lj_s2_slider', 'value'),
+             Input('lj_mix_dropdown', 'value')])
+def update_lj_mix_plot(e_value, s_value, e2_value, s2_value, mix_value):
+    return lj.update_lj_mix_plot(e_value, s_value, e2_value, s2_value, mix_value)
 
 ### UPDATE COULOMB POTENTIAL PLOT ###
 
@@ -302,9 +623,12 @@ def update_lj_force_plot(e_value, s_value, r_value):
              [Input('coul_q1_slider', 'value'),
              Input('coul_q2_slider', 'value'),
              Input('coul_r_slider', 'value'),
-             Input('coul_k_slider', 'value')])
-def update_coul_plot(q1_value, q2_value, r_value, k_value):
-    return coul.update_coul_plot(q1_value, q2_value, r_value, k_value)
+             Input('coul_k_slider', 'value'),
+             Input('coul_wolf_checklist', 'value'),
+             Input('coul_rc_slider', 'value'),
+             Input('coul_t_slider', 'value')])
+def update_coul_plot(q1_value, q2_value, r_value, k_value, wolf_value, rc_value, t_value):
+    return coul.update_coul_plot(q1_value, q2_value, r_value, k_value, wolf_value, rc_value, t_value)
 
 ### UPDATE COULOMB ATOM-FORCE PLOT ###
 
@@ -312,36 +636,49 @@ def update_coul_plot(q1_value, q2_value, r_value, k_value):
              [Input('coul_q1_slider', 'value'),
              Input('coul_q2_slider', 'value'),
              Input('coul_r_slider', 'value'),
-             Input('coul_k_slider', 'value')])
-def update_coul_force_plot(q1_value, q2_value, r_value, k_value):
-    return coul.update_coul_force_plot(q1_value, q2_value, r_value, k_value)
+             Input('coul_k_slider', 'value'),
+             Input('coul_play_checklist', 'value'),
+             Input('coul_t_slider', 'value')])
+def update_coul_force_plot(q1_value, q2_value, r_value, k_value, play_value, t_value):
+    return coul.update_coul_force_plot(q1_value, q2_value, r_value, k_value, play_value, t_value)
 
 ### UPDATE BONDED POTENTIAL PLOT ###
 
 @app.callback(Output('bond_plot', 'figure'),
              [Input('bond_b_slider', 'value'),
              Input('bond_bo_slider', 'value'),
-             Input('bond_kb_slider', 'value')])
-def update_bond_plot(b_value, bo_value, kb_value):
-    return bond.update_bond_plot(b_value, bo_value, kb_value)
+             Input('bond_kb_slider', 'value'),
+             Input('bond_constraint_checklist', 'value'),
+             Input('bond_pair_dropdown', 'value'),
+             Input('bond_structure_checklist', 'value'),
+             Input('bond_t_slider', 'value'),
+             Input('bond_fit_checklist', 'value'),
+             Input('bond_scan_upload', 'contents')])
+def update_bond_plot(b_value, bo_value, kb_value, constraint_value, pair_value, structure_value, t_value, fit_value, scan_contents):
+    return bond.update_bond_plot(b_value, bo_value, kb_value, constraint_value, pair_value, structure_value, t_value, fit_value, scan_contents)
 
 ### UPDATE BONDED ATOM-FORCE PLOT ###
 
 @app.callback(Output('bond_force_plot', 'figure'),
              [Input('bond_b_slider', 'value'),
              Input('bond_bo_slider', 'value'),
-             Input('bond_kb_slider', 'value')])
-def update_bond_force_plot(b_value, bo_value, kb_value):
-    return bond.update_bond_force_plot(b_value, bo_value, kb_value)
+             Input('bond_kb_slider', 'value'),
+             Input('bond_play_checklist', 'value'),
+             Input('bond_pair_dropdown', 'value'),
+             Input('bond_t_slider', 'value')])
+def update_bond_force_plot(b_value, bo_value, kb_value, play_value, pair_value, t_value):
+    return bond.update_bond_force_plot(b_value, bo_value, kb_value, play_value, pair_value, t_value)
 
 ### UPDATE ANGLE POTENTIAL PLOT ###
 
 @app.callback(Output('angle_plot', 'figure'),
              [Input('angle_th_slider', 'value'),
              Input('angle_tho_slider', 'value'),
-             Input('angle_kth_slider', 'value')])
-def update_angle_plot(th_value, tho_value, kth_value):
-    return angle.update_angle_plot(th_value, tho_value, kth_value)
+             Input('angle_kth_slider', 'value'),
+             Input('angle_fit_checklist', 'value'),
+             Input('angle_scan_upload', 'contents')])
+def update_angle_plot(th_value, tho_value, kth_value, fit_value, scan_contents):
+    return angle.update_angle_plot(th_value, tho_value, kth_value, fit_value, scan_contents)
 
 ### UPDATE ANGLE ATOM-FORCE PLOT ###
 
@@ -353,6 +690,49 @@ def update_angle_force_plot(th_value, tho_value, kth_value):
     return angle.update_angle_force_plot(th_value, tho_value, kth_value)
 
 
+### UPDATE DIHEDRAL POTENTIAL PLOT ###
+
+@app.callback(Output('dihedral_plot', 'figure'),
+             [Input('dihedral_phi_slider', 'value'),
+             Input('dihedral_kphi_slider', 'value'),
+             Input('dihedral_n_slider', 'value'),
+             Input('dihedral_delta_slider', 'value')])
+def update_dihedral_plot(phi_value, kphi_value, n_value, delta_value):
+    return dihedral.update_dihedral_plot(phi_value, kphi_value, n_value, delta_value)
+
+### UPDATE DIHEDRAL ATOM-FORCE PLOT ###
+
+@app.callback(Output('dihedral_force_plot', 'figure'),
+             [Input('dihedral_phi_slider', 'value'),
+             Input('dihedral_kphi_slider', 'value'),
+             Input('dihedral_n_slider', 'value'),
+             Input('dihedral_delta_slider', 'value')])
+def update_dihedral_force_plot(phi_value, kphi_value, n_value, delta_value):
+    return dihedral.update_dihedral_force_plot(phi_value, kphi_value, n_value, delta_value)
+
+### UPDATE NORMAL MODE CONTROLS ###
+
+@app.callback([Output('vib_mode_dropdown', 'options'),
+              Output('vib_mode_dropdown', 'value')],
+             [Input('vib_molecule_dropdown', 'value')])
+def update_mode_dropdown(molecule_value):
+    options = vib.mode_options(molecule_value)
+    return options, len(options) - 1
+
+### UPDATE NORMAL MODE PLOTS ###
+
+@app.callback(Output('mode_plot', 'figure'),
+             [Input('vib_molecule_dropdown', 'value'),
+             Input('vib_mode_dropdown', 'value')])
+def update_mode_plot(molecule_value, mode_value):
+    return vib.update_mode_plot(molecule_value, mode_value)
+
+@app.callback(Output('spectrum_plot', 'figure'),
+             [Input('vib_molecule_dropdown', 'value'),
+             Input('vib_mode_dropdown', 'value')])
+def update_spectrum_plot(molecule_value, mode_value):
+    return vib.update_spectrum_plot(molecule_value, mode_value)
+
 # set debug=False when not in development
 if __name__ == '__main__':
     app.run_server(debug=True)
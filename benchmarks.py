@@ -0,0 +1,643 @@
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from flask import Flask
+
+import analysis
+import animation
+import api
+import bonds
+import checkpoint
+import constraints
+import coulomb as coul
+import dihedrals
+import fitting
+import forces
+import hessian
+import integrators
+import minimize
+import montecarlo
+import neighbors
+import nonbonded
+import parallel
+import periodic
+import system
+import tables
+import topology
+import trajectory
+
+### TIMING ###
+
+def best_time(func, repeat=5):
+
+    """
+    returns the best wall time (s) of several calls to func
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def report(name, rows):
+
+    """
+    prints a benchmark table of (label, seconds, note) rows
+    """
+
+    print('### ' + name + ' ###')
+    for label, seconds, note in rows:
+        print('  {:<40s} {:>10.2f} ms  {}'.format(label, 1e3*seconds, note))
+    print()
+
+### TABULATED POTENTIALS ###
+
+def bench_tables(n_pairs=10**6, n_atoms=20000, cutoff=12.0, alpha=coul.wolf_alpha):
+
+    ### damped shifted-force Coulomb of unit charges, the only tabulated form ###
+    rng = np.random.default_rng(0)
+    r = rng.uniform(3, cutoff, n_pairs)
+    qq = rng.choice([-1.0, 1.0], n_pairs) * nonbonded.coulomb_constant
+    table = nonbonded.coulomb_table(cutoff, 'force-shift', alpha)
+
+    def direct():
+        return nonbonded.apply_cutoff(nonbonded.coulomb_radial(r, qq, alpha, False), r,
+            nonbonded.coulomb_radial(cutoff, qq, alpha), cutoff, 'force-shift')
+
+    def lookup():
+        energy, force = table.evaluate(r)
+        return qq * energy, -qq * force
+
+    t_direct = best_time(direct)
+    t_lookup = best_time(lookup)
+    error = tables.relative_error(lookup()[1], direct()[1])
+    rows = [
+        ('damped Coulomb, direct', t_direct, ''),
+        ('damped Coulomb, table', t_lookup, '{} points, {:.2f}x, force error {:.1e}'.format(
+            len(table), t_direct/t_lookup, error)),
+    ]
+
+    ### the full nonbonded kernel on a periodic fluid ###
+    coords, box = periodic.lattice_fluid(n_atoms)
+    charges = np.where(np.arange(n_atoms) % 2, 0.4, -0.4)
+    pairs = neighbors.cell_pairs(coords, cutoff, box)
+    for tabulate in (False, True):
+        rows.append(('pair_forces, tabulate={}'.format(tabulate), best_time(
+            lambda: nonbonded.pair_forces(coords, pairs, 3.4, 1.0, charges, 1,
+                cutoff=cutoff, box=box, alpha=alpha, tabulate=tabulate), 3),
+            '{} pairs'.format(len(pairs[0]))))
+
+    report('tables (alpha = {} 1/\u212B, cutoff {} \u212B)'.format(alpha, cutoff), rows)
+
+### TEST SYSTEMS ###
+
+def chain_system(n_atoms, spacing=3.0, seed=0):
+
+    """
+    returns coordinates, bonds and angles of one long chain folded onto a
+    cubic lattice, at roughly liquid density
+    """
+
+    side = int(np.ceil(n_atoms**(1/3)))
+    ix, iy, iz = np.unravel_index(np.arange(n_atoms), (side, side, side))
+    iy = np.where(ix % 2 == 1, side - 1 - iy, iy)  # snake so neighbors stay bonded
+    coords = spacing * np.stack([iz, iy, ix], axis=1).astype(float)
+    coords += np.random.default_rng(seed).normal(0, 0.05, coords.shape)
+
+    bonds = np.stack([np.arange(n_atoms - 1), np.arange(1, n_atoms)], axis=1)
+    angles = np.stack([np.arange(n_atoms - 2), np.arange(1, n_atoms - 1),
+        np.arange(2, n_atoms)], axis=1)
+    return coords, bonds, angles
+
+def lj_cluster(n_atoms, spacing=3.9, seed=0):
+
+    """
+    returns coordinates of a roughly spherical cluster cut from a jittered
+    cubic lattice
+    """
+
+    side = int(np.ceil(n_atoms**(1/3))) + 2
+    grid = np.stack(np.meshgrid(*[np.arange(side)]*3, indexing='ij'), -1).reshape(-1, 3)
+    grid = grid - grid.mean(axis=0)
+    grid = grid[np.argsort(np.sum(grid**2, axis=1), kind='stable')][:n_atoms]
+    return spacing*grid + np.random.default_rng(seed).normal(0, 0.2, (n_atoms, 3))
+
+### PARALLEL FORCES ###
+
+def bench_parallel(n_atoms=50000, max_workers=None):
+
+    coords, bonds, angles = chain_system(n_atoms)
+    charges = np.where(np.arange(n_atoms) % 2, 0.4, -0.4)
+    pairs = neighbors.cell_pairs(coords, 8.0)
+
+    def serial():
+        forces.bond_forces(coords, bonds, 3.0, 300)
+        forces.angle_forces(coords, angles, 109.5, 50)
+        forces.lj_forces(coords, pairs, 3.4, 1.0)
+        forces.coulomb_forces(coords, pairs, charges, 1)
+
+    t_serial = best_time(serial, repeat=3)
+    rows = [('serial', t_serial, '')]
+    for n_workers in range(1, (max_workers or mp.cpu_count()) + 1):
+        with parallel.ParallelForces(n_atoms, bonds, 3.0, 300, angles, 109.5, 50,
+                pairs, 3.4, 1.0, charges, 1, n_workers=n_workers) as evaluate:
+            t = best_time(lambda: evaluate(coords), repeat=3)
+        rows.append(('{} workers'.format(n_workers), t,
+            '{:.2f}x vs serial'.format(t_serial/t)))
+
+    report('parallel ({} atoms, {} pairs)'.format(n_atoms, len(pairs[0])), rows)
+
+### DIHEDRALS ###
+
+def bench_dihedrals(n_quads=2*10**6):
+
+    coords, _, _ = chain_system(n_quads + 3)
+    quads = np.stack([np.arange(n_quads) + offset for offset in range(4)],
+        axis=1).astype(np.int32)
+
+    t_angles = best_time(lambda: dihedrals.dihedral_angles(coords, quads), repeat=3)
+    t_dihedral = best_time(lambda: dihedrals.dihedral_forces(coords, quads, 10, 3, 0), repeat=3)
+    t_improper = best_time(lambda: dihedrals.improper_forces(coords, quads, 50, 0), repeat=3)
+
+    report('dihedrals ({} quadruplets)'.format(n_quads), [
+        ('angles only', t_angles, '{:.1f} M/s'.format(1e-6*n_quads/t_angles)),
+        ('dihedral energy + forces', t_dihedral, '{:.1f} M/s'.format(1e-6*n_quads/t_dihedral)),
+        ('improper energy + forces', t_improper, '{:.1f} M/s'.format(1e-6*n_quads/t_improper)),
+    ])
+
+### BONDED TOPOLOGY ###
+
+def bench_topology(n_atoms=300000):
+
+    coords, bonds, _ = chain_system(n_atoms)
+    top = topology.Topology.from_bonds(n_atoms, bonds, 3.0, 300, 90, 50, 5, 3, 0)
+    n_terms = len(top.bonds) + len(top.angles) + len(top.dihedrals)
+
+    def separate():
+        forces.bond_forces(coords, top.bonds, top.bo, top.kb)
+        forces.angle_forces(coords, top.angles, top.tho, top.kth)
+        dihedrals.dihedral_forces(coords, top.dihedrals, top.kphi, top.n, top.delta)
+
+    t_build = best_time(lambda: topology.Topology.from_bonds(
+        n_atoms, bonds, 3.0, 300, 90, 50, 5, 3, 0), repeat=3)
+    t_separate = best_time(separate, repeat=3)
+    t_fused = best_time(lambda: top.energy_forces(coords), repeat=3)
+
+    report('topology ({} atoms, {} bonded terms)'.format(n_atoms, n_terms), [
+        ('build from bond graph', t_build, ''),
+        ('separate kernels', t_separate, ''),
+        ('Topology.energy_forces', t_fused, '{:.2f}x'.format(t_separate/t_fused)),
+    ])
+
+### FUSED NONBONDED KERNEL ###
+
+def bench_nonbonded(n_atoms=50000):
+
+    coords, _, _ = chain_system(n_atoms)
+    charges = np.where(np.arange(n_atoms) % 2, 0.4, -0.4)
+    pairs = neighbors.cell_pairs(coords, 8.0)
+
+    def separate():
+        forces.lj_forces(coords, pairs, 3.4, 1.0)
+        forces.coulomb_forces(coords, pairs, charges, 1)
+
+    t_separate = best_time(separate, repeat=3)
+    t_fused = best_time(lambda: nonbonded.pair_forces(coords, pairs, 3.4, 1.0, charges, 1), repeat=3)
+
+    report('nonbonded ({} pairs)'.format(len(pairs[0])), [
+        ('lennard_jones + coulomb kernels', t_separate, ''),
+        ('fused kernel', t_fused, '{:.2f}x'.format(t_separate/t_fused)),
+    ])
+
+### ENERGY MINIMIZATION ###
+
+def bench_minimize(sizes=(13, 55, 147, 309, 561), fmax=1.0):
+
+    rows = []
+    for n_atoms in sizes:
+        coords = lj_cluster(n_atoms)
+        for name, method in minimize.methods.items():
+            lj_system = system.System(n_atoms, cutoff=12.0)
+            start = time.perf_counter()
+            result = method(lj_system, coords, fmax=fmax)
+            elapsed = time.perf_counter() - start
+            rows.append(('{} atoms, {}'.format(n_atoms, name), elapsed,
+                '{} steps, {} neighbor builds, E = {:.1f} kJ/mol{}'.format(
+                    result.steps, lj_system.neighbor_list.n_builds, result.energy,
+                    '' if result.converged else ' (not converged)')))
+
+    report('minimize (LJ clusters, fmax = {} kJ/(mol*A))'.format(fmax), rows)
+
+### MONTE CARLO ###
+
+def bench_montecarlo(sizes=(100, 1000, 10000), n_moves=20000, density=0.02):
+
+    rows = []
+    for n_atoms in sizes:
+        box = (n_atoms / density)**(1/3)
+        side = int(np.ceil(n_atoms**(1/3)))
+        coords = np.stack(np.unravel_index(np.arange(n_atoms), (side,)*3), axis=1)
+        coords = (coords + 0.5) * (box / side)
+        charges = np.where(np.arange(n_atoms) % 2, 0.3, -0.3)
+        sampler = montecarlo.MonteCarlo(coords, box, temperature=120,
+            charges=charges, cutoff=10.0, seed=0)
+        sampler.tune()
+
+        stats = sampler.run(n_moves)
+        t_full = best_time(sampler.total_energy, repeat=3)
+        rows.append(('{} atoms, incremental'.format(n_atoms), n_moves / stats['moves_per_second'],
+            '{:.0f} moves/s, acceptance {:.2f}'.format(stats['moves_per_second'], stats['acceptance'])))
+        rows.append(('{} atoms, full energy per move'.format(n_atoms), n_moves * t_full,
+            '{:.0f} moves/s (estimated)'.format(1 / t_full)))
+
+    report('montecarlo ({} moves)'.format(n_moves), rows)
+
+### CONSTRAINTS ###
+
+def bench_constraints(n_side=4, timesteps=(0.5, 1, 2, 3, 4), length=300):
+
+    water = system.water_cluster(n_side)
+    coords, waters, masses = water['coords'], water['waters'], water['masses']
+    n_atoms = len(coords)
+    bonds = np.concatenate([waters[:,[0,1]], waters[:,[0,2]], waters[:,[1,2]]])
+    lengths = np.repeat([1.012, 1.012, water['d_hh']], len(waters))
+
+    rows = []
+    for name, top, constraint in [
+        ('flexible', water['flexible'], ()),
+        ('SHAKE/RATTLE', water['rigid'], (constraints.Constraints(bonds, lengths, masses),)),
+        ('SETTLE', water['rigid'], (constraints.Settle(waters, masses, 1.012, water['d_hh']),)),
+    ]:
+        for dt in timesteps:
+            water_system = system.System(n_atoms, top, water['types'], water['sigmas'],
+                water['epsilons'], water['charges'], cutoff=40.0)
+            velocities = integrators.maxwell_boltzmann(masses, 300, seed=0)
+            start = time.perf_counter()
+            with np.errstate(all='ignore'):
+                trajectory = integrators.velocity_verlet(water_system, coords, velocities,
+                    masses, dt, int(length/dt), constraint)
+                drift, ratio = integrators.energy_drift(trajectory)
+            elapsed = time.perf_counter() - start
+            if np.isfinite(ratio) and ratio < 0.1:
+                note = 'per ps; fluctuation ratio {:.3f}, drift {:.1f} kJ/mol/ps'.format(ratio, drift)
+            else:
+                note = 'per ps; unstable'
+            rows.append(('{}, dt = {} fs'.format(name, dt), elapsed * 1000/length, note))
+
+    report('constraints ({} waters, {} fs each, time per ps simulated)'.format(
+        len(waters), length), rows)
+
+### MULTIPLE TIME STEP ###
+
+def bench_respa(n_side=5, inner_dt=0.5, ratios=(2, 4, 6, 8), length=200):
+
+    water = system.water_cluster(n_side)
+    coords, masses = water['coords'], water['masses']
+
+    def run(n_inner):
+        water_system = system.System(len(coords), water['flexible'], water['types'],
+            water['sigmas'], water['epsilons'], water['charges'], cutoff=40.0)
+        velocities = integrators.maxwell_boltzmann(masses, 300, seed=0)
+        dt = inner_dt * n_inner
+        start = time.perf_counter()
+        with np.errstate(all='ignore'):
+            if n_inner == 1:
+                trajectory = integrators.velocity_verlet(water_system, coords, velocities,
+                    masses, dt, int(length/dt))
+            else:
+                trajectory = integrators.respa(water_system.bonded, water_system.nonbonded,
+                    coords, velocities, masses, dt, n_inner, int(length/dt))
+            drift, ratio = integrators.energy_drift(trajectory)
+        return (time.perf_counter() - start) * 1000/length, drift, ratio
+
+    t_single, drift, ratio = run(1)
+    rows = [('velocity Verlet, dt = {} fs'.format(inner_dt), t_single,
+        'per ps; fluctuation ratio {:.3f}, drift {:.1f} kJ/mol/ps'.format(ratio, drift))]
+    for n_inner in ratios:
+        t, drift, ratio = run(n_inner)
+        if np.isfinite(ratio) and ratio < 0.1:
+            note = 'per ps; {:.2f}x, fluctuation ratio {:.3f}, drift {:.1f} kJ/mol/ps'.format(
+                t_single/t, ratio, drift)
+        else:
+            note = 'per ps; unstable'
+        rows.append(('RESPA, outer dt = {} fs ({} inner)'.format(inner_dt*n_inner, n_inner), t, note))
+
+    report('respa ({} flexible waters, {} fs each, time per ps simulated)'.format(
+        n_side**3, length), rows)
+
+### DIFFUSION ###
+
+def windowed_msd(positions):
+
+    """
+    returns the mean-squared displacement averaged over atoms with the
+    direct O(T^2) loop over lags and time origins
+    """
+
+    n_frames = len(positions)
+    return np.array([np.mean(np.sum((positions[m:] - positions[:n_frames-m])**2, axis=-1))
+        for m in range(n_frames)])
+
+def bench_diffusion(n_frames=10**5, n_atoms=100, n_direct=4000, max_lag=10**4):
+
+    rng = np.random.default_rng(0)
+    rows = []
+
+    ### FFT against the window loop on a short trajectory ###
+    short = np.cumsum(rng.normal(size=(n_direct, 10, 3)), axis=0)
+    t_direct = best_time(lambda: windowed_msd(short), repeat=1)
+    t_fft = best_time(lambda: analysis.mean_squared_displacement(short))
+    error = np.max(np.abs(analysis.mean_squared_displacement(short) - windowed_msd(short)))
+    rows.append(('MSD window loop, {} frames'.format(n_direct), t_direct, '10 atoms'))
+    rows.append(('MSD FFT, {} frames'.format(n_direct), t_fft,
+        '10 atoms, {:.0f}x, max error {:.1e}'.format(t_direct/t_fft, error)))
+
+    ### long memory-mapped trajectory, random walk with D = 0.5 Angstroms^2/fs ###
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'walk.npy')
+        positions = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+            shape=(n_frames, n_atoms, 3))
+        for start in range(0, n_atoms, 10):
+            positions[:, start:start+10] = np.cumsum(
+                rng.normal(size=(n_frames, min(10, n_atoms-start), 3)), axis=0)
+        positions.flush()
+        del positions
+
+        positions = np.load(path, mmap_mode='r')
+        step = analysis.chunk_atoms(n_frames)
+        start = time.perf_counter()
+        msd = analysis.mean_squared_displacement(positions, max_lag)
+        t_msd = time.perf_counter() - start
+        diffusion = analysis.einstein_diffusion(msd, 1.0)
+
+        velocities = np.diff(positions, axis=0)  # steps of 1 fs, in Angstroms/fs
+        del positions
+        start = time.perf_counter()
+        vacf = analysis.velocity_autocorrelation(velocities, max_lag)
+        t_vacf = time.perf_counter() - start
+
+    estimate = t_direct * (n_frames/n_direct)**2 * n_atoms/10
+    rows.append(('MSD FFT, {} frames (memory map)'.format(n_frames), t_msd,
+        '{} atoms in chunks of {}, D = {:.3f} (exact 0.5), window loop ~{:.0f} s'.format(
+            n_atoms, step, diffusion, estimate)))
+    rows.append(('VACF FFT, {} frames'.format(n_frames), t_vacf,
+        '{} atoms, <v(0)^2> = {:.2f} (exact 3)'.format(n_atoms, vacf[0])))
+    ### the walk decorrelates in one step; longer integrals only add noise ###
+    decayed = vacf[:101]
+    t_green_kubo = best_time(lambda: analysis.green_kubo_diffusion(decayed, 1.0))
+    rows.append(('Green-Kubo integral, {} lags'.format(len(decayed)), t_green_kubo,
+        'D = {:.3f} (exact 0.5)'.format(analysis.green_kubo_diffusion(decayed, 1.0))))
+
+    report('diffusion', rows)
+
+### CHECKPOINTS ###
+
+def bench_checkpoint(n_atoms=10**6):
+
+    rng = np.random.default_rng(0)
+    chain = np.arange(n_atoms)
+    arrays = {
+        'coords': rng.uniform(0, 100, (n_atoms, 3)),
+        'velocities': rng.normal(0, 0.01, (n_atoms, 3)),
+        'masses': np.full(n_atoms, 12.011),
+        'types': np.zeros(n_atoms, dtype=np.int32),
+        'charges': rng.normal(0, 0.3, n_atoms),
+        'topology_bonds': np.stack([chain[:-1], chain[1:]], axis=1).astype(np.int32),
+        'topology_bo': np.full(n_atoms - 1, 1.53),
+        'topology_kb': np.full(n_atoms - 1, 2000.0),
+        'topology_angles': np.stack([chain[:-2], chain[1:-1], chain[2:]], axis=1).astype(np.int32),
+        'topology_tho': np.full(n_atoms - 2, 109.5),
+        'topology_kth': np.full(n_atoms - 2, 0.1),
+    }
+    metadata = {'step': 1000, 'time': 2000.0, 'rng': rng.bit_generator.state}
+    size = sum(a.nbytes for a in arrays.values()) / 2**20
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'state.ckpt')
+        rows.append(('write (fsync)', best_time(lambda: checkpoint.write(path, arrays, metadata), 3),
+            '{:.0f} MB'.format(size)))
+        rows.append(('write (no fsync)', best_time(lambda: checkpoint.write(path, arrays, metadata,
+            sync=False), 3), ''))
+
+        with checkpoint.Checkpointer(path) as writer:
+            start = time.perf_counter()
+            writer.save(arrays, metadata)
+            stall = time.perf_counter() - start
+            writer.wait()
+        rows.append(('background save (time the caller waits)', stall, 'snapshot copy only'))
+
+        rows.append(('read, memory map', best_time(lambda: checkpoint.read(path)),
+            'zero-copy views'))
+        rows.append(('read, memory map + sum of coords', best_time(
+            lambda: checkpoint.read(path)[0]['coords'].sum()), ''))
+        rows.append(('read, whole file', best_time(lambda: checkpoint.read(path, mmap=False), 3), ''))
+
+        npz = os.path.join(directory, 'state.npz')
+        rows.append(('np.savez (baseline)', best_time(lambda: np.savez(npz, **arrays), 3), ''))
+        rows.append(('np.load of every array (baseline)', best_time(
+            lambda: [a for a in np.load(npz).values()], 3), ''))
+
+    report('checkpoint ({} atoms)'.format(n_atoms), rows)
+
+### TRAJECTORY OUTPUT ###
+
+def bench_output(n_side=10, n_steps=500, dt=0.5, sample=10):
+
+    water = system.water_cluster(n_side)
+    coords, masses = water['coords'], water['masses']
+    symbols = ['O', 'H', 'H'] * n_side**3
+    water_system = system.System(len(coords), water['flexible'], water['types'],
+        water['sigmas'], water['epsilons'], water['charges'])
+    velocities = integrators.maxwell_boltzmann(masses, 300, seed=0)
+
+    ### bonded forces only, so the integration step is cheap next to the output ###
+    def run(writer=None):
+        integrators.velocity_verlet(water_system.bonded, coords, velocities, masses, dt, n_steps,
+            sample=sample, observers=() if writer is None else (writer,))
+        if writer is not None:
+            writer.close()
+        return writer
+
+    t_none = best_time(run, 3)
+    rows = [('no output', t_none, '{} atoms, {} steps'.format(len(coords), n_steps))]
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ['frames.xyz', 'frames.xyz.gz', 'frames.dcd']:
+            path = os.path.join(directory, name)
+            t_sync = best_time(lambda: run(trajectory.open_writer(path, symbols)), 3)
+            rows.append(('{}, synchronous'.format(name), t_sync,
+                '+{:.0f}%'.format(100 * (t_sync/t_none - 1))))
+
+            writers = []
+            t_background = best_time(lambda: writers.append(run(
+                trajectory.BackgroundWriter(trajectory.open_writer(path, symbols)))), 3)
+            timings = writers[-1].timings
+            rows.append(('{}, background thread'.format(name), t_background,
+                '+{:.0f}%; copy {:.1f} ms, wait {:.1f} ms, write {:.1f} ms, {:.1f} MB'.format(
+                    100 * (t_background/t_none - 1), 1e3*timings['copy'], 1e3*timings['wait'],
+                    1e3*timings['write'], os.path.getsize(path) / 2**20)))
+
+    report('output (bonded water, frame every {} steps)'.format(sample), rows)
+
+### LANGEVIN REPLICAS ###
+
+def bench_langevin(replicas=(1, 100, 1000, 10000), temperature=300, bo=1.5, kb=500):
+
+    masses = bonds.bond_pairs['C-H']
+    frame_time = bonds.frame_time(kb, 'C-H')
+    spread = np.sqrt(integrators.gas_constant * temperature / kb)
+
+    rows = []
+    for n_replicas in replicas:
+        start = time.perf_counter()
+        distances = animation.langevin_pairs(lambda b: bonds.potential(b, bo, kb),
+            lambda b: bonds.force(b, bo, kb), bo, masses, temperature, frame_time,
+            bonds.min_b, bonds.max_b, n_replicas=n_replicas)
+        elapsed = time.perf_counter() - start
+        sampled = distances[len(distances)//6:]
+        rows.append(('{} replicas'.format(n_replicas), elapsed,
+            '{} frames; sampled spread {:.4f} \u212B, (RT/Kb)^1/2 = {:.4f} \u212B'.format(
+                len(distances), np.std(sampled), spread)))
+
+    report('langevin (C-H bond pairs, {} K)'.format(temperature), rows)
+
+### BATCH API ###
+
+def bench_api(n_sets=1000, n_points=1000, n_small=500):
+
+    server = Flask(__name__)
+    server.register_blueprint(api.blueprint)
+    client = server.test_client()
+    r = np.linspace(3, 8, n_points).tolist()
+    sigma = np.linspace(3, 4, n_sets).tolist()
+
+    rows = []
+    for fmt, dtype in [('json', 'float64'), ('npy', 'float32'), ('npy', 'float64')]:
+        body = {'r': r, 'params': {'sigma': sigma, 'epsilon': 1}, 'format': fmt, 'dtype': dtype}
+        size = []
+        def call():
+            size[:] = [len(client.post('/api/v1/lennard_jones', json=body).data)]
+        rows.append(('{} sets x {} distances, {} {}'.format(n_sets, n_points, fmt, dtype),
+            best_time(call, 3), '{:.1f} MB, potential and force'.format(size[0] / 2**20)))
+
+    body = {'r': r[:10], 'params': {'sigma': 3.4, 'epsilon': 1}}
+    def small():
+        for _ in range(n_small):
+            client.post('/api/v1/lennard_jones', json=body)
+    elapsed = best_time(small, 3)
+    rows.append(('{} small requests'.format(n_small), elapsed,
+        '{:.0f} requests/s on one thread'.format(n_small / elapsed)))
+
+    report('api (lennard_jones)', rows)
+
+### PARAMETER FITTING ###
+
+def bench_fitting(n_starts=1024, workers=(2, 4)):
+
+    r, energy = fitting.dimer_scan()
+    energy = energy + np.random.default_rng(0).normal(0, 0.01, len(r))
+
+    rows = []
+    for label, kwargs in [('one start per batch', {'batch_size': 1}),
+                          ('batches of 64 starts', {'batch_size': 64})] + \
+            [('batches of 64 starts, {} workers'.format(n), {'batch_size': 64, 'n_workers': n})
+                for n in workers]:
+        result = []
+        elapsed = best_time(lambda: result.append(fitting.fit('lennard_jones', r, energy,
+            n_starts=n_starts, **kwargs)), 3)
+        costs = result[-1].costs
+        rows.append((label, elapsed, '{:.1f} us per start; {} of {} starts at the best fit'.format(
+            1e6 * elapsed / n_starts, np.sum(costs <= costs.min() * (1 + 1e-6)), n_starts)))
+
+    report('fitting (Lennard-Jones to an exp-6 dimer scan, {} starts, {} cores)'.format(
+        n_starts, os.cpu_count()), rows)
+
+### HESSIANS ###
+
+def bench_hessian(sizes=(2, 4, 6, 8, 10), max_dense=1000):
+
+    rows = []
+    for n_side in sizes:
+        water = system.water_cluster(n_side)
+        coords, masses = water['coords'], water['masses']
+        water_system = system.System(len(coords), water['flexible'], water['types'],
+            water['sigmas'], water['epsilons'], water['charges'])
+        water_system.update_pairs(coords)
+
+        blocks = []
+        t_assemble = best_time(lambda: blocks.append(hessian.system_hessian(water_system, coords)), 3)
+        hess = blocks[-1]
+        note = '{} blocks ({:.2%} of N^2)'.format(len(hess.blocks), hess.density)
+        rows.append(('{} atoms, block-sparse assembly'.format(len(coords)), t_assemble, note))
+
+        frequency = []
+        t_lanczos = best_time(lambda: frequency.append(hessian.highest_frequency(hess, masses)), 3)
+        rows.append(('{} atoms, highest frequency (Lanczos)'.format(len(coords)), t_lanczos,
+            '{:.0f} cm^-1, timestep <= {:.2f} fs'.format(frequency[-1],
+                hessian.max_timestep(frequency[-1]))))
+
+        if len(coords) <= max_dense:
+            t_dense = best_time(lambda: hessian.normal_modes(hess, coords, masses), 1)
+            rows.append(('{} atoms, dense normal modes'.format(len(coords)), t_dense,
+                '{} x {} eigenproblem'.format(3*len(coords), 3*len(coords))))
+
+    report('hessian (water clusters, bonded and nonbonded)', rows)
+
+### PERIODIC BOUNDARIES ###
+
+def bench_periodic(n_atoms=50000, density=0.03, cutoff=8.0):
+
+    coords, box = periodic.lattice_fluid(n_atoms, density)
+    charges = np.where(np.arange(n_atoms) % 2, 0.4, -0.4)
+    triclinic_coords, triclinic = periodic.lattice_fluid(n_atoms, density, box_angles=(70, 80, 100))
+
+    rows = []
+    for label, x, pbc in [('isolated', coords, None), ('orthorhombic', coords, box),
+                          ('triclinic', triclinic_coords, triclinic)]:
+        pairs = []
+        t_search = best_time(lambda: pairs.append(neighbors.cell_pairs(x, cutoff, pbc)), 3)
+        n_pairs = len(pairs[-1][0])
+        t_kernel = best_time(lambda: nonbonded.pair_forces(x, pairs[-1], 3.4, 1.0, charges, 1,
+            box=pbc), 3)
+        rows.append(('{}, cell-list search'.format(label), t_search,
+            '{} pairs, {:.0f} ns/pair'.format(n_pairs, 1e9 * t_search / n_pairs)))
+        rows.append(('{}, fused kernel'.format(label), t_kernel,
+            '{:.0f} ns/pair'.format(1e9 * t_kernel / n_pairs)))
+
+    d = triclinic_coords[pairs[-1][0]] - triclinic_coords[pairs[-1][1]]
+    rows.append(('triclinic minimum image', best_time(lambda: triclinic.minimum_image(d)),
+        '{:.1f} ns/pair'.format(1e9 * best_time(lambda: triclinic.minimum_image(d)) / len(d))))
+    rows.append(('wrap', best_time(lambda: triclinic.wrap(triclinic_coords)), ''))
+
+    report('periodic ({} atoms, {} atoms/A^3, cutoff {} A)'.format(n_atoms, density, cutoff), rows)
+
+benchmarks = {
+    'tables': bench_tables,
+    'parallel': bench_parallel,
+    'dihedrals': bench_dihedrals,
+    'topology': bench_topology,
+    'nonbonded': bench_nonbonded,
+    'minimize': bench_minimize,
+    'montecarlo': bench_montecarlo,
+    'constraints': bench_constraints,
+    'respa': bench_respa,
+    'diffusion': bench_diffusion,
+    'checkpoint': bench_checkpoint,
+    'output': bench_output,
+    'langevin': bench_langevin,
+    'api': bench_api,
+    'fitting': bench_fitting,
+    'hessian': bench_hessian,
+    'periodic': bench_periodic,
+}
+
+# usage: python benchmarks.py [name ...]
+if __name__ == '__main__':
+    for name in sys.argv[1:] or benchmarks:
+        benchmarks[name]()
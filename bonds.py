@@ -1,10 +1,17 @@
 import dash_core_components as dcc
 import dash_html_components as html
+import functools
 import math
 import numpy as np
 import plotly.graph_objects as go
 import plotly.subplots as psub
 
+import analysis
+import animation
+import fitting
+import integrators
+import montecarlo
+
 ### COLORS ###
 
 #E2C458 yellow
@@ -77,6 +84,18 @@ bond_text = html.Div([
         '''
     ], style={'textAlign':'justify'}),
 
+    html.P([
+        '''
+        In a simulation, the timestep has to resolve the fastest motion in the system, and stiff bonds (especially those to light hydrogen atoms) vibrate with periods of only about 10 fs. A common alternative is to hold the bond at its equilibrium length with a constraint solver such as SHAKE/RATTLE (or SETTLE for rigid water), which removes the bond vibration so that the timestep is limited by slower motions such as angle bending. Select the bonded atoms and toggle the constraint to compare the largest usable timestep.
+        '''
+    ], style={'textAlign':'justify'}),
+
+    html.P([
+        '''
+        Conversely, the parameters of a bond can be read from the distances it samples: at temperature T, a harmonic bond fluctuates about bo with a spread of (RT/Kb)^½, and the Boltzmann inversion -RT ln P(b) of the sampled distances recovers the potential. Toggle the sampled distribution to overlay the result of a Monte Carlo simulation at 300 K (points).
+        '''
+    ], style={'textAlign':'justify'}),
+
 ])
 
 ### BONDED INTERACTION FUNCTIONS ###
@@ -149,9 +168,115 @@ bond_kb_slider = dcc.Slider(
     tooltip = { 'always_visible': False },
 )
 
+### TEMPERATURE SLIDER ###
+
+min_t = 0  # units K
+max_t = 1000  # units K
+bond_t_slider = dcc.Slider(
+    min=min_t,
+    max=max_t,
+    step=10,
+    id='bond_t_slider',
+    marks={
+        min_t: str(min_t),
+        max_t: str(max_t),
+    },
+    value=min_t,
+    tooltip = { 'always_visible': False },
+)
+
+### CONSTRAINT CONTROLS ###
+
+# atomic masses (g/mol) of the bonded pair, used for the vibrational period
+bond_pairs = {
+    'C-H': (12.011, 1.008),
+    'O-H': (15.999, 1.008),
+    'C-C': (12.011, 12.011),
+    'C-O': (12.011, 15.999),
+}
+
+bend_kth = 300  # kJ/(mol*rad^2), typical bending constant of a bond about its neighbor
+
+bond_pair_dropdown = dcc.Dropdown(
+    id='bond_pair_dropdown',
+    options=[{'label': pair, 'value': pair} for pair in bond_pairs],
+    value='C-H',
+    clearable=False,
+    style={'color':'#000000'},
+)
+
+bond_constraint_checklist = dcc.Checklist(
+    id='bond_constraint_checklist',
+    options=[
+        {'label': ' constrained bond (SHAKE/RATTLE)', 'value': 'constrained'},
+    ],
+    value=[],
+)
+
+def timestep(bo, kb, pair, constrained):
+
+    """
+    returns the largest usable timestep (fs), a tenth of the period of the
+    fastest motion: the bond vibration, or once the bond is constrained, the
+    bending of the bond about a neighboring atom
+    """
+
+    mu = integrators.reduced_mass(*bond_pairs[pair])
+    if constrained:
+        return integrators.max_timestep(bend_kth, mu * bo**2)
+    return integrators.max_timestep(kb, mu)
+
+### SAMPLED STRUCTURE ###
+
+bond_structure_checklist = dcc.Checklist(
+    id='bond_structure_checklist',
+    options=[
+        {'label': ' sampled bond lengths (Monte Carlo, 300 K)', 'value': 'structure'},
+    ],
+    value=[],
+)
+
+@functools.lru_cache(maxsize=32)
+def sampled_pmf(bo, kb, temperature=300, n_replicas=2000, n_steps=300, seed=0):
+
+    """
+    returns the bond lengths, the Boltzmann-inverted bond length histogram
+    -RT ln(P(b)/b^2) (kJ/mol) and the standard deviation of the lengths,
+    sampled with independent Monte Carlo replicas of the bonded pair
+    """
+
+    spread = np.sqrt(integrators.gas_constant * temperature / kb)
+    lengths = analysis.BondLengths(None, bo - 5*spread, bo + 5*spread, 50)
+    moments = np.zeros(2)
+    for step, b in enumerate(montecarlo.sample_pairs(lambda x: potential(x, bo, kb), bo,
+            temperature, n_replicas, n_steps, spread, seed)):
+        if step >= n_steps // 6:
+            lengths.add(b)
+            moments += [np.sum(b - bo), np.sum((b - bo)**2)]
+    mean, square = moments / lengths.n_samples
+    return lengths.centers, lengths.boltzmann_inversion(temperature), np.sqrt(square - mean**2)
+
+### ENERGY SCAN FIT ###
+
+bond_fit_checklist = dcc.Checklist(
+    id='bond_fit_checklist',
+    options=[
+        {'label': ' fit to an energy scan (Morse C-H reference, or upload one)', 'value': 'fit'},
+    ],
+    value=[],
+)
+
+bond_scan_upload = dcc.Upload(
+    id='bond_scan_upload',
+    children=html.Div(['drop or select a scan file (\u212B, kJ/mol)']),
+    style={'borderWidth':'1px', 'borderStyle':'dashed', 'borderColor':'#c3c3c3',
+        'borderRadius':'5px', 'textAlign':'center', 'padding':'5px'},
+)
+
 ### BOND POTENTIAL PLOT ###
 
-def update_bond_plot(b_value, bo_value, kb_value):
+def update_bond_plot(b_value, bo_value, kb_value, constraint_value=(), pair_value='C-H',
+                     structure_value=(), t_value=0, fit_value=(), scan_contents=None):
 
     b = np.arange(min_b,max_b,0.001)
     if b[0] == 0:
@@ -183,6 +308,69 @@ def update_bond_plot(b_value, bo_value, kb_value):
         )
     )
 
+    ### constrained bond: the distance is held at bo ###
+    constrained = 'constrained' in constraint_value
+    if constrained:
+        b_value = bo_value
+        fig.add_shape(
+            type='line',
+            x0=bo_value,
+            x1=bo_value,
+            y0=0,
+            y1=1,
+            yref='paper',
+            line={'color':'#E6526A','width':3,'dash':'dash'},
+        )
+
+    flexible_dt = timestep(bo_value, kb_value, pair_value, False)
+    text = 'flexible: \u0394t \u2264 {:.1f} fs'.format(flexible_dt)
+    if constrained:
+        constrained_dt = timestep(bo_value, kb_value, pair_value, True)
+        text = 'constrained: \u0394t \u2264 {:.1f} fs ({:.1f}x)'.format(
+            constrained_dt, constrained_dt/flexible_dt)
+    fig.add_annotation(
+        x=0.98,
+        y=0.98,
+        xref='paper',
+        yref='paper',
+        xanchor='right',
+        showarrow=False,
+        text=text,
+        font=dict(
+            color='#E6526A',
+        ),
+    )
+
+    ### Boltzmann-inverted bond length histogram ###
+    if 'structure' in structure_value and not constrained:
+        b_pmf, pmf, spread = sampled_pmf(round(bo_value, 1), round(kb_value, 1))
+        fig.add_trace(
+            go.Scatter(
+                x=b_pmf,
+                y=pmf,
+                mode='markers',
+                marker={'color':'#E6526A', 'size':5},
+            )
+        )
+        fig.add_annotation(
+            x=0.98,
+            y=0.90,
+            xref='paper',
+            yref='paper',
+            xanchor='right',
+            showarrow=False,
+            text='sampled \u03C3<sub>b</sub> = {:.3f} \u212B, (RT/K<sub>b</sub>)<sup>\u00BD</sup> = {:.3f} \u212B'.format(
+                spread, np.sqrt(integrators.gas_constant * 300 / kb_value)),
+            font=dict(
+                color='#E6526A',
+            ),
+        )
+
+    ### Langevin bond length distribution ###
+    if t_value > 0 and not constrained:
+        animation.add_distribution(fig, langevin_ensemble(b_value, bo_value, kb_value,
+            pair_value, t_value), min_b, max_b)
+
     ### distance marker ###
     fig.add_trace(
         go.Scatter(
@@ -293,6 +481,10 @@ def update_bond_plot(b_value, bo_value, kb_value):
         showlegend=False,
     )
 
+    ### fit to an energy scan ###
+    if 'fit' in fit_value:
+        fitting.add_fit(fig, 'bond', scan_contents)
+
     return fig
 
 fig  = update_bond_plot(bond_b_slider.value, bond_bo_slider.value, bond_kb_slider.value)
@@ -300,32 +492,28 @@ bond_plot = dcc.Graph(id='bond_plot',figure=fig)
 
 ### BONDED ATOM-FORCE PLOT ###
 
-def update_bond_force_plot(b_value, bo_value, kb_value):
-
-    fig = go.Figure()
-
-    mid_pt = 1 + 1 + max_b
+bond_play_checklist = dcc.Checklist(
+    id='bond_play_checklist',
+    options=[
+        {'label': ' play (two-atom dynamics)', 'value': 'play'},
+    ],
+    value=[],
+)
 
-    ### atomic markers ###
-    fig.add_trace(
-        go.Scatter(
-            x=[mid_pt - b_value/2, mid_pt + b_value/2],
-            y = [1.5,1.5],
-            mode='markers',
-            hoverinfo='none',
-            marker={'color':'#E6526A', 'size':20}
-        )
-    )
+def spring_traces(b_value, mid_pt, step=0.001):
 
-    ### spring ###
+    """
+    returns the traces (as dicts, for the animation frames) of a spring
+    between atoms b_value apart, drawn with points step apart along each coil
+    """
 
     r = 0.25
     tie_len = 1
 
-    x = np.arange(0,r*2,0.001)
+    x = np.arange(0,r*2,step)
     y = r+np.sqrt(r**2 - (x-r)**2)
 
-    x2 = np.arange(r*2,0,-0.001)
+    x2 = np.arange(r*2,0,-step)
     y2 = r-np.sqrt(r**2 - (x-r)**2)
 
     x = np.hstack((x,x2)) + np.linspace(0,r,len(x)*2)
@@ -351,36 +539,102 @@ def update_bond_force_plot(b_value, bo_value, kb_value):
     xplot = tie_len + xplot*spring_len/max(xplot) + mid_pt - 0.5*spring_len - tie_len
     yplot = yplot - r + 1.5
 
-    fig.add_trace(
-        go.Scatter(
+    return [
+        dict(
+            type='scatter',
             x=xplot,
             y=yplot,
             hoverinfo='none',
             mode='lines',
             line={'color':"#c3c3c3",'width':3},
-        )
-    )
-
-    fig.add_trace(
-        go.Scatter(
+        ),
+        dict(
+            type='scatter',
             x=[mid_pt-b_value/2,mid_pt-b_value/2+tie_len],
             y=[1.5,1.5],
             hoverinfo='none',
             mode='lines',
             line={'color':"#c3c3c3",'width':3},
-        )
-    )
-
-    fig.add_trace(
-        go.Scatter(
+        ),
+        dict(
+            type='scatter',
             x=[mid_pt+b_value/2-tie_len,mid_pt+b_value/2],
             y=[1.5,1.5],
             hoverinfo='none',
             mode='lines',
             line={'color':"#c3c3c3",'width':3},
+        ),
+    ]
+
+def force_label(b_value, bo_value, kb_value):
+
+    "returns the force annotation text"
+
+    return 'Force = ' + str(
+        np.format_float_scientific(
+            force(b_value, bo_value, kb_value),
+            precision=2
+        )
+    ) + ' N/mol'
+
+def frame_time(kb_value, pair_value):
+
+    """
+    returns the time (fs) of an animation frame, a thirtieth of the vibration
+    period, which plays in slow motion at one vibration per second
+    """
+
+    masses = bond_pairs[pair_value]
+    return integrators.harmonic_period(kb_value, integrators.reduced_mass(*masses)) / 30
+
+@functools.lru_cache(maxsize=32)
+def langevin_ensemble(b_value, bo_value, kb_value, pair_value, t_value):
+
+    """
+    returns the bond lengths of 1000 bonded pairs released at b_value and run
+    with Langevin dynamics at t_value (K), at each animation frame
+    """
+
+    return animation.langevin_pairs(lambda b: potential(b, bo_value, kb_value),
+        lambda b: force(b, bo_value, kb_value), b_value, bond_pairs[pair_value], t_value,
+        frame_time(kb_value, pair_value), min_b, max_b)
+
+def play_distances(b_value, bo_value, kb_value, pair_value='C-H', t_value=0):
+
+    """
+    returns the bond length of the bonded atoms released at b_value, at each
+    animation frame: without friction at 0 K, otherwise the first replica of
+    the Langevin ensemble
+    """
+
+    if t_value > 0:
+        return langevin_ensemble(b_value, bo_value, kb_value, pair_value, t_value)[:,0]
+    return animation.two_body(lambda b: potential(b, bo_value, kb_value),
+        lambda b: force(b, bo_value, kb_value), b_value, bond_pairs[pair_value],
+        frame_time(kb_value, pair_value), min_b, max_b)
+
+def update_bond_force_plot(b_value, bo_value, kb_value, play_value=(), pair_value='C-H',
+                           t_value=0):
+
+    fig = go.Figure()
+
+    mid_pt = 1 + 1 + max_b
+
+    ### atomic markers ###
+    fig.add_trace(
+        go.Scatter(
+            x=[mid_pt - b_value/2, mid_pt + b_value/2],
+            y = [1.5,1.5],
+            mode='markers',
+            hoverinfo='none',
+            marker={'color':'#E6526A', 'size':20}
         )
     )
 
+    ### spring ###
+    for trace in spring_traces(b_value, mid_pt):
+        fig.add_trace(trace)
+
     ### graph layout ###
     fig.update_xaxes(
         range=[1,2+1+2*max_b],
@@ -455,12 +709,7 @@ def update_bond_force_plot(b_value, bo_value, kb_value):
                 x=mid_pt,
                 #x=mid_pt-r_value/2-max_force*conversion,
                 y=2,
-                text='Force = ' + str(
-                    np.format_float_scientific(
-                        force(b_value, bo_value, kb_value),
-                        precision=2
-                    )
-                ) + ' N/mol',
+                text=force_label(b_value, bo_value, kb_value),
                 xref="x",
                 yref="y",
                 showarrow=False,
@@ -478,6 +727,13 @@ def update_bond_force_plot(b_value, bo_value, kb_value):
         ],
     )
 
+    ### animation of the two-atom dynamics ###
+    if 'play' in play_value:
+        frames = [spring_traces(b, mid_pt, step=0.025) + animation.pair_traces(mid_pt, b,
+            -1*force(b, bo_value, kb_value)*conversion, force_label(b, bo_value, kb_value), 2)
+            for b in play_distances(b_value, bo_value, kb_value, pair_value, t_value)]
+        fig = animation.animate(fig, frames)
+
     return fig
 
 fig  = update_bond_force_plot(bond_b_slider.value, bond_bo_slider.value, bond_kb_slider.value)
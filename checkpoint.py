@@ -0,0 +1,244 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+import periodic
+import system
+import topology as topo
+
+### CHECKPOINT FORMAT ###
+
+# A checkpoint is a short fixed header, a JSON index and a sequence of raw
+# array blocks:
+#
+#   magic (8 bytes) | index length (uint64, little-endian) | JSON index |
+#   padding | block | padding | block ...
+#
+# The index records the name, dtype, shape and offset of every block (from
+# the end of the index, rounded up to a block boundary) and a dict of JSON
+# metadata (step, time, RNG state, scalar settings). Every block starts on a
+# 64-byte boundary, so a block can be viewed as an array straight from a
+# memory map of the file, with no copy and no parsing.
+
+magic = b'IMDCKPT1'
+alignment = 64
+
+def aligned(offset):
+
+    """
+    returns the first block boundary at or after offset
+    """
+
+    return -(-offset // alignment) * alignment
+
+def write(path, arrays, metadata=None, sync=True):
+
+    """
+    writes a dict of arrays and a dict of JSON metadata to a checkpoint at
+    path, returning its size (bytes)
+
+    the file is written next to path and renamed into place, so a crash
+    never leaves a partial checkpoint behind; with sync, the data are on
+    disk before the rename
+    """
+
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    blocks = []
+    offset = 0
+    for name, a in arrays.items():
+        offset = aligned(offset)
+        blocks.append({'name': name, 'dtype': a.dtype.str, 'shape': a.shape, 'offset': offset})
+        offset += a.nbytes
+    index = json.dumps({'metadata': metadata or {}, 'blocks': blocks}).encode()
+    start = aligned(len(magic) + 8 + len(index))
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(magic + np.uint64(len(index)).astype('<u8').tobytes() + index)
+        for block, a in zip(blocks, arrays.values()):
+            f.write(b'\0' * (start + block['offset'] - f.tell()))
+            f.write(memoryview(a).cast('B') if a.size else b'')
+        size = f.tell()
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return size
+
+def read(path, mmap=True):
+
+    """
+    returns the arrays (dict) and metadata (dict) of a checkpoint
+
+    with mmap, the arrays are read-only views into a memory map of the file,
+    so opening a checkpoint costs the same whatever its size and only the
+    pages that are used are read; otherwise the file is read in one pass
+    """
+
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError('{} is not a checkpoint'.format(path))
+        length = int(np.frombuffer(f.read(8), '<u8')[0])
+        index = json.loads(f.read(length).decode())
+    start = aligned(len(magic) + 8 + length)
+
+    buffer = np.memmap(path, dtype=np.uint8, mode='r') if mmap \
+        else np.fromfile(path, dtype=np.uint8)
+    arrays = {}
+    for block in index['blocks']:
+        dtype = np.dtype(block['dtype'])
+        shape = tuple(block['shape'])
+        n_bytes = dtype.itemsize * int(np.prod(shape))
+        offset = start + block['offset']
+        arrays[block['name']] = buffer[offset:offset + n_bytes] \
+            .view(dtype).reshape(shape)
+    return arrays, index['metadata']
+
+### SIMULATION STATE ###
+
+topology_arrays = ['bonds', 'bo', 'kb', 'angles', 'tho', 'kth', 'dihedrals', 'kphi',
+    'n', 'delta', 'impropers', 'kzeta', 'zetao']
+
+def system_state(force_field, coords, velocities, rng=None, step=0, time=0.0):
+
+    """
+    returns the arrays and metadata of a checkpoint of a system.System and
+    its coordinates (Angstroms), velocities (Angstroms/fs) and, optionally,
+    the state of its numpy random Generator
+    """
+
+    arrays = {
+        'coords': coords,
+        'velocities': velocities,
+        'masses': force_field.masses,
+        'types': force_field.types,
+        'charges': force_field.charges,
+        'sigma_table': force_field.sigma_table,
+        'epsilon_table': force_field.epsilon_table,
+    }
+    for name in topology_arrays:
+        arrays['topology_' + name] = getattr(force_field.topology, name)
+
+    metadata = {
+        'step': step,
+        'time': time,
+        'n_atoms': force_field.n_atoms,
+        'k': force_field.k,
+        'cutoff': force_field.cutoff,
+        'cutoff_mode': force_field.cutoff_mode,
+        'alpha': force_field.alpha,
+        'r_on': force_field.r_on,
+        'tabulate': force_field.tabulate,
+        'skin': force_field.neighbor_list.skin,
+        'box': None if force_field.box is None else force_field.box.matrix.tolist(),
+        'scale14_lj': force_field.topology.scale14_lj,
+        'scale14_coul': force_field.topology.scale14_coul,
+        'rng': None if rng is None else rng.bit_generator.state,
+    }
+    return arrays, metadata
+
+def restore(arrays, metadata):
+
+    """
+    returns the system.System, coordinates, velocities and random Generator
+    (None if none was saved) of a checkpoint read with read
+    """
+
+    topology = topo.Topology(metadata['n_atoms'],
+        *[arrays['topology_' + name] for name in topology_arrays],
+        scale14_lj=metadata['scale14_lj'], scale14_coul=metadata['scale14_coul'])
+    force_field = system.System(metadata['n_atoms'], topology, arrays['types'],
+        charges=arrays['charges'], k=metadata['k'], cutoff=metadata['cutoff'],
+        skin=metadata['skin'], masses=arrays['masses'],
+        box=None if metadata.get('box') is None else periodic.Box.from_vectors(metadata['box']),
+        # older checkpoints truncated undamped interactions at the cutoff
+        cutoff_mode=metadata.get('cutoff_mode', 'cutoff'), alpha=metadata.get('alpha', 0),
+        r_on=metadata.get('r_on'), tabulate=metadata.get('tabulate', False))
+    force_field.sigma_table = np.array(arrays['sigma_table'])
+    force_field.epsilon_table = np.array(arrays['epsilon_table'])
+
+    rng = None
+    if metadata['rng'] is not None:
+        rng = np.random.Generator(getattr(np.random, metadata['rng']['bit_generator'])())
+        rng.bit_generator.state = metadata['rng']
+    return force_field, np.array(arrays['coords']), np.array(arrays['velocities']), rng
+
+### BACKGROUND WRITER ###
+
+class Checkpointer:
+
+    """
+    writes checkpoints to path on a background thread, so a simulation only
+    pauses to copy its arrays and not for the disk
+
+    save takes a snapshot of the arrays and returns; at most one checkpoint
+    waits behind the one being written, so save only blocks when checkpoints
+    are requested faster than the disk can take them; an error in the writer
+    is raised by the next call to save, wait or close
+    """
+
+    def __init__(self, path, sync=True):
+
+        self.path = path
+        self.sync = sync
+        self.queue = queue.Queue(maxsize=1)
+        self.error = None
+        self.n_written = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                write(self.path, *item, sync=self.sync)
+                self.n_written += 1
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, arrays, metadata=None):
+
+        """
+        queues a checkpoint of copies of the arrays and metadata
+        """
+
+        self.check()
+        snapshot = {name: np.array(a, copy=True) for name, a in arrays.items()}
+        self.queue.put((snapshot, json.loads(json.dumps(metadata or {}))))
+
+    def wait(self):
+
+        """
+        returns once every queued checkpoint is written
+        """
+
+        self.queue.join()
+        self.check()
+
+    def close(self):
+
+        self.queue.put(None)
+        self.thread.join()
+        self.check()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
@@ -0,0 +1,264 @@
+import numpy as np
+
+### BOND CONSTRAINTS ###
+
+# Constrained bonds hold atom pairs at a fixed distance instead of a stiff
+# harmonic spring, which removes the fastest vibrations and allows a longer
+# timestep. Each solver corrects the unconstrained positions after a step
+# (SHAKE) and the velocities after the force update (RATTLE).
+
+def color_constraints(bonds):
+
+    """
+    returns a group index for each constraint such that no two constraints
+    in a group share an atom (greedy edge coloring)
+
+    the constraints of one group are independent, so a SHAKE sweep updates a
+    whole group at once with the same result as updating them one by one
+    """
+
+    bonds = np.asarray(bonds).reshape(-1, 2)
+    used = {}
+    colors = np.zeros(len(bonds), dtype=np.int32)
+    for n, (i, j) in enumerate(bonds):
+        taken = used.get(i, set()) | used.get(j, set())
+        color = 0
+        while color in taken:
+            color += 1
+        colors[n] = color
+        used.setdefault(i, set()).add(color)
+        used.setdefault(j, set()).add(color)
+    return colors
+
+class Constraints:
+
+    """
+    SHAKE/RATTLE for a set of distance constraints (Angstroms) between atoms
+    of the given masses (g/mol)
+
+    constraints are split into groups without shared atoms, and each sweep
+    applies the exact pairwise correction to one whole group at a time, so
+    the iteration converges like serial SHAKE while every update is a
+    vectorized operation over many constraints
+    """
+
+    def __init__(self, bonds, lengths, masses, tol=1e-10, max_iter=1000):
+
+        self.bonds = np.ascontiguousarray(np.asarray(bonds, dtype=np.int32).reshape(-1, 2))
+        self.lengths = np.broadcast_to(np.asarray(lengths, dtype=float), len(self.bonds)).copy()
+        self.inv_masses = 1 / np.asarray(masses, dtype=float)
+        self.tol = tol
+        self.max_iter = max_iter
+
+        colors = color_constraints(self.bonds)
+        self.groups = [np.nonzero(colors == c)[0] for c in range(colors.max(initial=-1) + 1)]
+        self.iterations = 0
+
+    @property
+    def n_constraints(self):
+
+        "returns the number of constraints"
+
+        return len(self.bonds)
+
+    def positions(self, reference, coords):
+
+        """
+        returns coords corrected so that every constrained distance has its
+        length (SHAKE), moving each pair along its bond vector in the
+        reference (previous, constrained) positions
+        """
+
+        coords = np.array(coords, dtype=float)
+        if not len(self.bonds):
+            return coords
+        i, j = self.bonds[:,0], self.bonds[:,1]
+        ref = reference[i] - reference[j]
+        d2 = self.lengths**2
+        wi, wj = self.inv_masses[i], self.inv_masses[j]
+
+        for self.iterations in range(1, self.max_iter + 1):
+            for group in self.groups:
+                gi, gj = i[group], j[group]
+                s = coords[gi] - coords[gj]
+                diff = d2[group] - np.einsum('ij,ij->i', s, s)
+                g = diff / (2 * (wi[group] + wj[group]) * np.einsum('ij,ij->i', s, ref[group]))
+                coords[gi] += (g * wi[group])[:,None] * ref[group]
+                coords[gj] -= (g * wj[group])[:,None] * ref[group]
+
+            s = coords[i] - coords[j]
+            if np.max(np.abs(np.einsum('ij,ij->i', s, s) - d2) / d2) < 2*self.tol:
+                return coords
+
+        raise RuntimeError('SHAKE did not converge in {} iterations'.format(self.max_iter))
+
+    def velocities(self, coords, velocities):
+
+        """
+        returns velocities with the components along every constrained bond
+        removed (RATTLE), so that the constrained distances stay fixed
+        """
+
+        velocities = np.array(velocities, dtype=float)
+        if not len(self.bonds):
+            return velocities
+        i, j = self.bonds[:,0], self.bonds[:,1]
+        r = coords[i] - coords[j]
+        d2 = self.lengths**2
+        wi, wj = self.inv_masses[i], self.inv_masses[j]
+
+        for self.iterations in range(1, self.max_iter + 1):
+            for group in self.groups:
+                gi, gj = i[group], j[group]
+                rv = np.einsum('ij,ij->i', r[group], velocities[gi] - velocities[gj])
+                k = rv / (d2[group] * (wi[group] + wj[group]))
+                velocities[gi] -= (k * wi[group])[:,None] * r[group]
+                velocities[gj] += (k * wj[group])[:,None] * r[group]
+
+            rv = np.einsum('ij,ij->i', r, velocities[i] - velocities[j])
+            if np.max(np.abs(rv) / d2) < self.tol:
+                return velocities
+
+        raise RuntimeError('RATTLE did not converge in {} iterations'.format(self.max_iter))
+
+### RIGID WATER ###
+
+def unit_rows(a):
+
+    """
+    returns each row of a divided by its length
+    """
+
+    return a / np.sqrt(np.einsum('ij,ij->i', a, a))[:,None]
+
+class Settle:
+
+    """
+    SETTLE (Miyamoto and Kollman, 1992): the analytic solution of the three
+    constraints of rigid water molecules, given as (O, H, H) index triplets,
+    with O-H distance d_oh and H-H distance d_hh (Angstroms)
+
+    the corrected positions are found in closed form for all molecules at
+    once, with no iteration; velocities are corrected by solving each
+    molecule's 3x3 system of constraint equations in one batched solve
+    """
+
+    def __init__(self, waters, masses, d_oh=1.0, d_hh=1.633):
+
+        self.waters = np.ascontiguousarray(np.asarray(waters, dtype=np.int32).reshape(-1, 3))
+        masses = np.asarray(masses, dtype=float)
+        self.m_o = masses[self.waters[:,0]]
+        self.m_h = masses[self.waters[:,1]]
+        self.d_oh = d_oh
+        self.d_hh = d_hh
+
+        ### canonical geometry: O at ra, H at -rb along the bisector, H-H/2 = rc ###
+        m_total = self.m_o + 2*self.m_h
+        height = np.sqrt(d_oh**2 - (d_hh/2)**2)
+        self.ra = 2 * self.m_h * height / m_total
+        self.rb = height - self.ra
+        self.rc = d_hh / 2
+
+        ### constraint (O-H1, O-H2, H1-H2) atom indices and inverse masses ###
+        self.pairs = np.array([[0, 1], [0, 2], [1, 2]])
+        self.inv_masses = 1 / masses[self.waters]
+
+    @property
+    def n_constraints(self):
+
+        "returns the number of constraints"
+
+        return 3 * len(self.waters)
+
+    def positions(self, reference, coords):
+
+        """
+        returns coords with every water molecule restored to its rigid
+        geometry, keeping its center of mass and, as SHAKE would, rotating it
+        only about the axes set by the reference positions
+        """
+
+        coords = np.array(coords, dtype=float)
+        if not len(self.waters):
+            return coords
+        o, h1, h2 = self.waters.T
+        m_o, m_h = self.m_o[:,None], self.m_h[:,None]
+        ra, rb, rc = self.ra, self.rb, self.rc
+
+        b0 = reference[h1] - reference[o]
+        c0 = reference[h2] - reference[o]
+        com = (m_o*coords[o] + m_h*(coords[h1] + coords[h2])) / (m_o + 2*m_h)
+        a1, b1, c1 = coords[o] - com, coords[h1] - com, coords[h2] - com
+
+        ### frame: z normal to the old plane, x perpendicular to z and a1 ###
+        ez = unit_rows(np.cross(b0, c0))
+        ex = unit_rows(np.cross(a1, ez))
+        ey = np.cross(ez, ex)
+
+        def project(v):
+            return (np.einsum('ij,ij->i', v, ex), np.einsum('ij,ij->i', v, ey),
+                np.einsum('ij,ij->i', v, ez))
+
+        xb0, yb0, _ = project(b0)
+        xc0, yc0, _ = project(c0)
+        _, _, za1 = project(a1)
+        xb1, yb1, zb1 = project(b1)
+        xc1, yc1, zc1 = project(c1)
+
+        ### out-of-plane tilt (phi) and twist (psi) of the canonical molecule ###
+        sinphi = np.clip(za1 / ra, -1, 1)
+        cosphi = np.sqrt(1 - sinphi**2)
+        sinpsi = np.clip((zb1 - zc1) / (2 * rc * cosphi), -1, 1)
+        cospsi = np.sqrt(1 - sinpsi**2)
+
+        ya2 = ra * cosphi
+        xb2 = -rc * cospsi
+        yb2 = -rb * cosphi - rc * sinpsi * sinphi
+        yc2 = -rb * cosphi + rc * sinpsi * sinphi
+
+        ### in-plane rotation (theta) from the zero net torque condition ###
+        alpha = xb2 * (xb0 - xc0) + yb0 * yb2 + yc0 * yc2
+        beta = xb2 * (yc0 - yb0) + xb0 * yb2 + xc0 * yc2
+        gamma = xb0 * yb1 - xb1 * yb0 + xc0 * yc1 - xc1 * yc0
+        a2b2 = alpha**2 + beta**2
+        sintheta = (alpha * gamma - beta * np.sqrt(np.maximum(a2b2 - gamma**2, 0))) / a2b2
+        costheta = np.sqrt(1 - sintheta**2)
+
+        a3 = np.stack([-ya2 * sintheta, ya2 * costheta, za1], axis=1)
+        b3 = np.stack([xb2 * costheta - yb2 * sintheta, xb2 * sintheta + yb2 * costheta, zb1], axis=1)
+        c3 = np.stack([-xb2 * costheta - yc2 * sintheta, -xb2 * sintheta + yc2 * costheta, zc1], axis=1)
+
+        frame = np.stack([ex, ey, ez], axis=1)  # rows are the frame axes
+        coords[o] = com + np.einsum('ij,ijk->ik', a3, frame)
+        coords[h1] = com + np.einsum('ij,ijk->ik', b3, frame)
+        coords[h2] = com + np.einsum('ij,ijk->ik', c3, frame)
+        return coords
+
+    def velocities(self, coords, velocities):
+
+        """
+        returns velocities with the relative motion along the three bonds of
+        each water removed
+        """
+
+        velocities = np.array(velocities, dtype=float)
+        if not len(self.waters):
+            return velocities
+        atoms = self.waters
+        p, q = self.pairs[:,0], self.pairs[:,1]
+        r = coords[atoms[:,p]] - coords[atoms[:,q]]  # (n, 3 constraints, 3)
+        v = velocities[atoms[:,p]] - velocities[atoms[:,q]]
+
+        ### impulses lambda_l along each r_l must cancel r_k . v_k for every k ###
+        side = (np.arange(3)[:,None] == p[None,:]).astype(float) \
+            - (np.arange(3)[:,None] == q[None,:])  # +1/-1 if atom a is in constraint l
+        w = self.inv_masses
+        coupling = w[:,p][:,:,None] * side[p][None] - w[:,q][:,:,None] * side[q][None]
+        a = coupling * np.einsum('nkx,nlx->nkl', r, r)
+        lam = np.linalg.solve(a, -np.einsum('nkx,nkx->nk', r, v)[:,:,None])[:,:,0]
+
+        impulse = lam[:,:,None] * r  # along each constraint, (n, 3, 3)
+        for k in range(3):
+            velocities[atoms[:,p[k]]] += w[:,p[k]][:,None] * impulse[:,k]
+            velocities[atoms[:,q[k]]] -= w[:,q[k]][:,None] * impulse[:,k]
+        return velocities
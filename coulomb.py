@@ -1,10 +1,17 @@
 import dash_core_components as dcc
 import dash_html_components as html
+import functools
 import math
 import numpy as np
 import plotly.graph_objects as go
 import plotly.subplots as psub
 
+import animation
+import cutoffs
+import forces
+import integrators
+import neighbors
+
 ### COLORS ###
 
 #E2C458 yellow
@@ -96,6 +103,12 @@ coulomb_text = html.Div([
         '''
     ], style={'textAlign':'justify'}),
 
+    html.P([
+        '''
+        Because the Coulomb interaction decays so slowly, it cannot simply be cut off at a finite distance. A cheap alternative to a full Ewald sum is the damped shifted-force (Wolf) method, which screens each charge with an error function, and shifts the potential and force so that both go smoothly to zero at a cutoff distance. Only pairs of atoms within the cutoff need to be computed, so the cost grows linearly with the number of atoms. Check the Wolf box to compare the damped curves (dashed) with the bare Coulomb curves, and use the cutoff slider to see how the cutoff changes them.
+        '''
+    ], style={'textAlign':'justify'}),
+
 ])
 
 ### COULOMB FUNCTIONS ###
@@ -124,6 +137,134 @@ def force(q1, q2, r, k):
     coul_force = constant * q1 * q2 / ((r**2)*k)
     return np.array(coul_force)
 
+def potential_cut(q1, q2, r, k, rc, mode='force-shift', r_on=None):
+
+    """
+    returns the Coulomb potential with a cutoff mode (see cutoffs.modes)
+    """
+
+    return cutoffs.potential(
+        lambda x: potential(q1, q2, x, k),
+        lambda x: force(q1, q2, x, k),
+        r, rc, mode, r_on,
+    )
+
+def force_cut(q1, q2, r, k, rc, mode='force-shift', r_on=None):
+
+    "returns the Coulomb force with a cutoff mode (units N)"
+
+    return cutoffs.force(
+        lambda x: potential(q1, q2, x, k),
+        lambda x: force(q1, q2, x, k),
+        r, rc, mode, r_on,
+    )
+
+### DAMPED SHIFTED-FORCE (WOLF) FUNCTIONS ###
+
+wolf_alpha = 0.1  # damping parameter, units 1/Angstroms
+
+erfc_p = 0.3275911
+erfc_a = (0.254829592, -0.284496736, 1.421413741, -1.453152027, 1.061405429)
+
+def erfc(x):
+
+    """
+    returns the complementary error function (Abramowitz and Stegun 7.1.26,
+    absolute error below 1.5e-7), vectorized for x >= 0
+    """
+
+    x = np.asarray(x, dtype=float)
+    t = 1 / (1 + erfc_p*x)
+    poly = t*(erfc_a[0] + t*(erfc_a[1] + t*(erfc_a[2] + t*(erfc_a[3] + t*erfc_a[4]))))
+    return poly * np.exp(-x**2)
+
+def erfc_derivatives(x, second=True):
+
+    """
+    returns erfc(x) and its first and second derivatives (None unless
+    second), differentiated from the approximation itself, so forces and
+    Hessians built on them are the exact derivatives of the energy
+    """
+
+    x = np.asarray(x, dtype=float)
+    t = 1 / (1 + erfc_p*x)
+    a1, a2, a3, a4, a5 = erfc_a
+    poly = t*(a1 + t*(a2 + t*(a3 + t*(a4 + t*a5))))
+    dpoly = a1 + t*(2*a2 + t*(3*a3 + t*(4*a4 + t*5*a5)))
+    dt = -erfc_p * t**2
+    gauss = np.exp(-x**2)
+
+    u, du, dg = poly, dpoly*dt, -2*x*gauss
+    if not second:
+        return u*gauss, du*gauss + u*dg, None
+    d2poly = 2*a2 + t*(6*a3 + t*(12*a4 + t*20*a5))
+    d2u = d2poly*dt**2 - 2*erfc_p*dpoly*t*dt  # d2t/dx2 = -2p t dt/dx
+    d2g = (4*x**2 - 2)*gauss
+    return u*gauss, du*gauss + u*dg, d2u*gauss + 2*du*dg + u*d2g
+
+def wolf_potential(q1, q2, r, k, rc, alpha=wolf_alpha):
+
+    """
+    returns the damped shifted-force (Wolf) Coulomb potential, zero beyond rc
+    """
+
+    constant = 8.988*(10**9)
+    q1 = np.copy(q1) * 1.60218e-19  # unit conversion to Coulombs
+    q2 = np.copy(q2) * 1.60218e-19  # unit conversion to Coulombs
+    r = np.asarray(r, dtype=float)
+    erfc_rc = erfc(alpha*rc)
+    slope = erfc_rc/rc**2 + 2*alpha/np.sqrt(np.pi)*np.exp(-(alpha*rc)**2)/rc
+    shape = erfc(alpha*r)/r - erfc_rc/rc + slope*(r - rc)  # units 1/Angstroms
+    shape = np.where(r < rc, shape, 0)
+    coul_pot = constant * q1 * q2 * shape * 1e10 / k  # unit conversion to 1/m
+    coul_pot *= 0.001  # unit conversion to kJ
+    return np.array(coul_pot)
+
+def wolf_force(q1, q2, r, k, rc, alpha=wolf_alpha):
+
+    "returns the force derived from the Wolf Coulomb potential (units N)"
+
+    constant = 8.988*(10**9)
+    q1 = np.copy(q1) * 1.60218e-19  # unit conversion to Coulombs
+    q2 = np.copy(q2) * 1.60218e-19  # unit conversion to Coulombs
+    r = np.asarray(r, dtype=float)
+    slope = erfc(alpha*rc)/rc**2 + 2*alpha/np.sqrt(np.pi)*np.exp(-(alpha*rc)**2)/rc
+    shape = (erfc(alpha*r)/r**2
+        + 2*alpha/np.sqrt(np.pi)*np.exp(-(alpha*r)**2)/r - slope)  # units 1/Angstroms^2
+    shape = np.where(r < rc, shape, 0)
+    coul_force = constant * q1 * q2 * shape * 1e20 / k  # unit conversion to 1/m^2
+    return np.array(coul_force)
+
+def wolf_energy(coords, charges, k, rc, alpha=wolf_alpha, pairs=None):
+
+    """
+    returns the total Wolf energy (kJ) of a set of charges and the force on
+    each atom (N), including the self term, over a cell-list pair search
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    charges = np.asarray(charges, dtype=float)
+    if pairs is None:
+        pairs = neighbors.cell_pairs(coords, rc)
+    i, j = pairs
+
+    rij = coords[i] - coords[j]
+    r = np.sqrt(np.sum(rij**2, axis=1))
+    pair_pot = wolf_potential(charges[i], charges[j], r, k, rc, alpha)
+    pair_force = wolf_force(charges[i], charges[j], r, k, rc, alpha)
+
+    ### self term ###
+    constant = 8.988*(10**9) * 1.60218e-19**2 * 1e10 * 0.001 / k
+    self_pot = -constant * (erfc(alpha*rc)/(2*rc) + alpha/np.sqrt(np.pi)) * np.sum(charges**2)
+
+    fvec = (pair_force / r)[:,None] * rij
+    coul_forces = np.zeros_like(coords)
+    for axis in range(3):
+        coul_forces[:,axis] += np.bincount(i, fvec[:,axis], minlength=len(coords))
+        coul_forces[:,axis] -= np.bincount(j, fvec[:,axis], minlength=len(coords))
+
+    return np.sum(pair_pot) + self_pot, coul_forces
+
 ### Q1 SLIDER ###
 
 min_q = -1  # units elementary charge
@@ -194,9 +335,54 @@ coul_k_slider = dcc.Slider(
     tooltip = { 'always_visible': False },
 )
 
+### TEMPERATURE SLIDER ###
+
+min_t = 0  # units K
+max_t = 1000  # units K
+coul_t_slider = dcc.Slider(
+    min=min_t,
+    max=max_t,
+    step=10,
+    id='coul_t_slider',
+    marks={
+        min_t: str(min_t),
+        max_t: str(max_t),
+    },
+    value=min_t,
+    tooltip = { 'always_visible': False },
+)
+
+### WOLF CUTOFF SLIDER ###
+
+min_rc = 5  # units Angstroms
+max_rc = 15  # units Angstroms
+coul_rc_slider = dcc.Slider(
+    min=min_rc,
+    max=max_rc,
+    step=0.5,
+    id='coul_rc_slider',
+    marks={
+        min_rc: str(min_rc),
+        max_rc: str(max_rc),
+    },
+    value=10,
+    tooltip = { 'always_visible': False },
+)
+
+### WOLF CHECKLIST ###
+
+coul_wolf_checklist = dcc.Checklist(
+    id='coul_wolf_checklist',
+    options=[
+        {'label': ' damped shifted-force (Wolf)', 'value': 'wolf'},
+    ],
+    value=[],
+)
+
 ### LENNARD-JONES POTENTIAL PLOT ###
 
-def update_coul_plot(q1_value, q2_value, r_value, k_value):
+def update_coul_plot(q1_value, q2_value, r_value, k_value, wolf_value=(), rc_value=coul_rc_slider.value,
+                     t_value=0):
 
     r = np.arange(min_r,max_r,0.001)
 
@@ -229,6 +415,31 @@ def update_coul_plot(q1_value, q2_value, r_value, k_value):
         )
     )
 
+    ### damped shifted-force lines ###
+    if 'wolf' in wolf_value:
+        fig.add_trace(
+            go.Scatter(
+                x=r,
+                y=wolf_force(q1_value, q2_value, r, k_value, rc_value),
+                mode='lines',
+                line={'color':'#E2C458','width':3,'dash':'dash'},
+            ), secondary_y=True,
+        )
+
+        fig.add_trace(
+            go.Scatter(
+                x=r,
+                y=wolf_potential(q1_value, q2_value, r, k_value, rc_value),
+                mode='lines',
+                line={'color':'#B09ADB','width':3,'dash':'dash'},
+            )
+        )
+
+    ### Langevin distance distribution ###
+    if t_value > 0:
+        animation.add_distribution(fig, langevin_ensemble(q1_value, q2_value, r_value, k_value,
+            t_value), min_r, max_r)
+
     ### distance marker ###
     fig.add_trace(
         go.Scatter(
@@ -349,20 +560,96 @@ coul_plot = dcc.Graph(id='coul_plot',figure=fig)
 
 ### COULOMB ATOM-FORCE PLOT ###
 
-def update_coul_force_plot(q1_value, q2_value, r_value, k_value):
+coul_play_checklist = dcc.Checklist(
+    id='coul_play_checklist',
+    options=[
+        {'label': ' play (two-ion dynamics)', 'value': 'play'},
+    ],
+    value=[],
+)
 
-    fig = go.Figure()
+coul_masses = (22.990, 35.453)  # sodium and chloride, units g/mol
 
-    ### setting length of force vector relative to plot area and sigma
+def force_vector(q1_value, q2_value, r_value, k_value):
+
+    """
+    returns the length of the drawn force vectors, relative to the plot area
+    """
 
     max_force = np.abs(force(min_q, max_q, min_r, k_value))
 
     conversion = max_r/max_force
-    mid_pt = 1 + 1 + max_r
     force_length = -conversion*force(q1_value, q2_value, r_value, k_value)
     if force(q1_value, q2_value, r_value, k_value) < 0:
         if force_length*2 > r_value:
             force_length = r_value/2
+    return force_length
+
+def force_label(q1_value, q2_value, r_value, k_value):
+
+    "returns the force annotation text"
+
+    return 'Force = ' + str(
+        np.format_float_scientific(
+            force(q1_value, q2_value, r_value, k_value),
+            precision=2
+        )
+    ) + ' N'
+
+def pair_energy_force(q1_value, q2_value, k_value):
+
+    """
+    returns the pair energy (kJ/mol) and force (N/mol) functions of distance
+    """
+
+    return (lambda r: potential(q1_value, q2_value, r, k_value) * forces.avogadro,
+        lambda r: force(q1_value, q2_value, r, k_value) * forces.avogadro)
+
+def frame_time(q1_value, q2_value, r_value, k_value):
+
+    """
+    returns the time (fs) of an animation frame, a thirtieth of the time the
+    initial force takes to move the ions by about half their distance
+    """
+
+    pair_force = pair_energy_force(q1_value, q2_value, k_value)[1]
+    return animation.release_time(pair_force, r_value, integrators.reduced_mass(*coul_masses)) / 30
+
+@functools.lru_cache(maxsize=32)
+def langevin_ensemble(q1_value, q2_value, r_value, k_value, t_value):
+
+    """
+    returns the distances of 1000 ion pairs released at r_value and run with
+    Langevin dynamics at t_value (K), at each animation frame; the ends of
+    the plot act as walls
+    """
+
+    return animation.langevin_pairs(*pair_energy_force(q1_value, q2_value, k_value), r_value,
+        coul_masses, t_value, frame_time(q1_value, q2_value, r_value, k_value), min_r, max_r)
+
+def play_distances(q1_value, q2_value, r_value, k_value, t_value=0):
+
+    """
+    returns the distance between a sodium and a chloride ion carrying the
+    given charges and released at r_value, at each animation frame: without
+    friction at 0 K, where the animation stops if the ions leave the plot
+    (there is no repulsive core, so opposite charges collapse), otherwise the
+    first replica of the Langevin ensemble
+    """
+
+    if t_value > 0:
+        return langevin_ensemble(q1_value, q2_value, r_value, k_value, t_value)[:,0]
+    return animation.two_body(*pair_energy_force(q1_value, q2_value, k_value), r_value,
+        coul_masses, frame_time(q1_value, q2_value, r_value, k_value), min_r, max_r)
+
+def update_coul_force_plot(q1_value, q2_value, r_value, k_value, play_value=(), t_value=0):
+
+    fig = go.Figure()
+
+    ### setting length of force vector relative to plot area and sigma
+
+    mid_pt = 1 + 1 + max_r
+    force_length = force_vector(q1_value, q2_value, r_value, k_value)
 
     ### atomic markers ###
     fig.add_trace(
@@ -459,12 +746,7 @@ def update_coul_force_plot(q1_value, q2_value, r_value, k_value):
                 x=mid_pt,
                 #x=mid_pt-r_value/2-max_force*conversion,
                 y=1.8,
-                text='Force = ' + str(
-                    np.format_float_scientific(
-                        force(q1_value, q2_value, r_value, k_value),
-                        precision=2
-                    )
-                ) + ' N',
+                text=force_label(q1_value, q2_value, r_value, k_value),
                 xref="x",
                 yref="y",
                 showarrow=False,
@@ -522,6 +804,13 @@ def update_coul_force_plot(q1_value, q2_value, r_value, k_value):
         ],
     )
 
+    ### animation of the two-ion dynamics ###
+    if 'play' in play_value:
+        frames = [animation.pair_traces(mid_pt, r, force_vector(q1_value, q2_value, r, k_value),
+            force_label(q1_value, q2_value, r, k_value), 1.8, [q1_sign, q2_sign])
+            for r in play_distances(q1_value, q2_value, r_value, k_value, t_value)]
+        fig = animation.animate(fig, frames)
+
     return fig
 
 fig  = update_coul_force_plot(coul_q1_slider.value, coul_q2_slider.value, coul_r_slider.value, coul_k_slider.value)
@@ -0,0 +1,67 @@
+import numpy as np
+
+### CUTOFF MODES ###
+
+# 'none'         full interaction
+# 'cutoff'       truncated at rc (energy and force jump to zero)
+# 'shift'        potential shifted to zero at rc (force still jumps)
+# 'force-shift'  potential and force both shifted to zero at rc
+# 'switch'       potential smoothly switched off between r_on and rc
+modes = ['none', 'cutoff', 'shift', 'force-shift', 'switch']
+
+def switch(r, r_on, rc):
+
+    """
+    returns the quintic switching function S(r), which goes from 1 at r_on to
+    0 at rc with zero first and second derivatives at both ends, and dS/dr
+    """
+
+    r = np.asarray(r, dtype=float)
+    x = np.clip((r - r_on) / (rc - r_on), 0, 1)
+    s = 1 - x**3*(10 - 15*x + 6*x**2)
+    ds = -30*x**2*(1 - x)**2 / (rc - r_on)
+    return s, ds
+
+def potential(pot_func, force_func, r, rc, mode, r_on=None, force_scale=1e13):
+
+    """
+    returns pot_func(r) modified by the cutoff mode
+
+    force_func is the matching force (-dE/dr * force_scale) and r_on is the
+    start of the switching region (0.8 rc by default)
+    """
+
+    r = np.asarray(r, dtype=float)
+    pot = pot_func(r)
+    if mode == 'none':
+        return pot
+    if mode == 'cutoff':
+        pass
+    elif mode == 'shift':
+        pot = pot - pot_func(rc)
+    elif mode == 'force-shift':
+        pot = pot - pot_func(rc) + (r - rc) * force_func(rc) / force_scale
+    elif mode == 'switch':
+        pot = pot * switch(r, 0.8*rc if r_on is None else r_on, rc)[0]
+    else:
+        raise ValueError('unknown cutoff mode: {}'.format(mode))
+    return np.where(r < rc, pot, 0)
+
+def force(pot_func, force_func, r, rc, mode, r_on=None, force_scale=1e13):
+
+    "returns force_func(r) modified by the cutoff mode (see potential)"
+
+    r = np.asarray(r, dtype=float)
+    cut_force = force_func(r)
+    if mode == 'none':
+        return cut_force
+    if mode in ('cutoff', 'shift'):
+        pass
+    elif mode == 'force-shift':
+        cut_force = cut_force - force_func(rc)
+    elif mode == 'switch':
+        s, ds = switch(r, 0.8*rc if r_on is None else r_on, rc)
+        cut_force = cut_force*s - pot_func(r)*ds*force_scale
+    else:
+        raise ValueError('unknown cutoff mode: {}'.format(mode))
+    return np.where(r < rc, cut_force, 0)
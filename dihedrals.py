@@ -0,0 +1,583 @@
+import dash_core_components as dcc
+import dash_html_components as html
+import math
+import numpy as np
+import plotly.graph_objects as go
+import plotly.subplots as psub
+
+### COLORS ###
+
+#E2C458 yellow
+#B09ADB purple
+#E6526A pink
+#c3c3c3 text
+
+### DESCRIPTION ###
+
+dihedral_text = html.Div([
+
+    ### header ###
+    html.H2(['Dihedral Potential']),
+    html.Hr(),
+
+    html.P([
+        '''
+        The dihedral (torsion) potential describes the energy of rotating about the middle bond of four linearly bonded atoms. Because a full rotation brings the atoms back to where they started, it takes the form of a periodic cosine:
+        '''
+    ], style={'textAlign':'justify'}),
+
+    ### equation ###
+    html.Div([
+
+        html.P([
+            html.Font([
+                'V = \u00BD K', html.Sub('\u03D5'),
+                ' (1 + cos(n\u03D5 \u2212 \u03B4))',
+            ], style={'fontFamily':'serif', 'fontSize':'24px'}),
+        ]),
+
+        html.P([
+
+            html.I('where:'),
+
+            ### phi ###
+            html.P([
+
+                html.Font('\u03D5', style={'fontFamily':'serif'}),
+                ' = dihedral angle between the planes of atoms 1-2-3 and 2-3-4, degrees',
+
+            ], style={'textIndent':'50px'}),
+
+            ### Kphi ###
+            html.P([
+
+                html.Font(['K', html.Sub('\u03D5')], style={'fontFamily':'serif'}),
+                ' = dihedral constant related to the height of the rotational barrier, energy units',
+
+            ], style={'textIndent':'50px'}),
+
+            ### n ###
+            html.P([
+
+                html.Font('n', style={'fontFamily':'serif'}),
+                ' = multiplicity, the number of minima in a full rotation',
+
+            ], style={'textIndent':'50px'}),
+
+            ### delta ###
+            html.P([
+
+                html.Font('\u03B4', style={'fontFamily':'serif'}),
+                ' = phase shift, degrees',
+
+            ], style={'textIndent':'50px'}),
+
+        ], style={'textAlign':'left', 'lineHeight':0.5}),
+
+    ], style={'textAlign':'center'}),
+
+    html.Br(),
+
+    html.P([
+        '''
+        Improper dihedrals use the same four-atom angle, \u03B6, but with a harmonic potential, \u00BD K\u03B6 (\u03B6 \u2212 \u03B6o)\u00B2, to keep groups of atoms planar (such as aromatic rings) or to keep the correct handedness of a chiral center.
+        '''
+    ], style={'textAlign':'justify'}),
+
+    html.P([
+        '''
+        The dihedral potential energy and force are shown in the graph below, along with a Newman projection looking down the middle bond. Use the sliders to rotate the back atom, and to change the barrier height, multiplicity and phase. Note how the force is zero at the bottom of each well and at the top of each barrier, and pushes the atoms towards the nearest minimum in between.
+        '''
+    ], style={'textAlign':'justify'}),
+
+])
+
+### DIHEDRAL INTERACTION FUNCTIONS ###
+
+def potential(phi, kphi, n, delta):
+
+    """
+    returns the dihedral potential
+    """
+
+    phi = np.deg2rad(phi)
+    delta = np.deg2rad(delta)
+    dihedral_pot = 0.5 * kphi * (1 + np.cos(n*phi - delta))
+    return np.array(dihedral_pot)
+
+def force(phi, kphi, n, delta):
+
+    "returns the dihedral force (units N)"
+
+    phi = np.deg2rad(phi)
+    delta = np.deg2rad(delta)
+    dihedral_force = 0.5 * kphi * n * np.sin(n*phi - delta) * np.pi/180  # per degree
+    dihedral_force *= 1e13 # change kj/mol-Ang to N/mol
+    return np.array(dihedral_force)
+
+def improper_potential(zeta, kzeta, zetao):
+
+    """
+    returns the improper dihedral potential
+    """
+
+    dzeta = (np.asarray(zeta) - zetao + 180) % 360 - 180  # shortest way around
+    improper_pot = 0.5 * kzeta * dzeta**2
+    return np.array(improper_pot)
+
+def improper_force(zeta, kzeta, zetao):
+
+    "returns the improper dihedral force (units N)"
+
+    dzeta = (np.asarray(zeta) - zetao + 180) % 360 - 180  # shortest way around
+    improper_force = -kzeta * dzeta
+    improper_force *= 1e13 # change kj/mol-Ang to N/mol
+    return np.array(improper_force)
+
+### VECTORIZED KERNELS ###
+
+def quad_geometry(coords, quads):
+
+    """
+    returns the dihedral angles (degrees, -180 to 180) of atom quadruplets
+    (i, j, k, l) and the vectors rij, rkj, rkl and normals m, n that
+    quad_terms needs, so the geometry is computed once for both
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    i, j, k, l = np.asarray(quads).T
+    xi, xj, xk, xl = (np.take(coords, index, axis=0) for index in (i, j, k, l))
+    rij = xi - xj
+    rkj = xk - xj
+    rkl = xk - xl
+    m = np.cross(rij, rkj)
+    n = np.cross(rkj, rkl)
+    lkj = np.sqrt(np.einsum('ij,ij->i', rkj, rkj))
+    y = lkj * np.einsum('ij,ij->i', rij, n)
+    x = np.einsum('ij,ij->i', m, n)
+    return np.degrees(np.arctan2(y, x)), (rij, rkj, rkl, m, n)
+
+def dihedral_angles(coords, quads):
+
+    """
+    returns the dihedral angles (degrees, -180 to 180) of atom quadruplets
+    (i, j, k, l), using the atan2 form, which stays accurate near 0 and 180
+    """
+
+    return quad_geometry(coords, quads)[0]
+
+def quad_terms(coords, quads, torque, geometry=None):
+
+    """
+    returns the per-atom force contributions (index, vectors) from torques
+    (-dV/dphi per degree, times 1e13 as returned by force) acting on the
+    dihedral angles of quads, reusing geometry from quad_geometry if given
+
+    uses the cross-product form of Blondel and Karplus, which has no division
+    by sin(phi) and so no singularity at 0 or 180 degrees
+    """
+
+    i, j, k, l = np.asarray(quads).T
+    rij, rkj, rkl, m, n = quad_geometry(coords, quads)[1] if geometry is None else geometry
+    m2 = np.einsum('ij,ij->i', m, m)
+    n2 = np.einsum('ij,ij->i', n, n)
+    lkj2 = np.einsum('ij,ij->i', rkj, rkj)
+    lkj = np.sqrt(lkj2)
+
+    torque = np.degrees(torque)  # per radian
+    fi = (torque * lkj / m2)[:,None] * m
+    fl = (-torque * lkj / n2)[:,None] * n
+    p = np.einsum('ij,ij->i', rij, rkj) / lkj2
+    q = np.einsum('ij,ij->i', rkl, rkj) / lkj2
+    s = p[:,None]*fi - q[:,None]*fl
+    return np.concatenate([i, j, k, l]), np.concatenate([fi, s - fi, -s - fl, fl])
+
+def quad_forces(coords, quads, torque, geometry=None):
+
+    """
+    returns the forces on each atom from torques acting on the dihedral
+    angles of quads (see quad_terms)
+    """
+
+    index, vectors = quad_terms(coords, quads, torque, geometry)
+    quad_forces = np.zeros((len(coords), 3))
+    for axis in range(3):
+        quad_forces[:,axis] = np.bincount(index, vectors[:,axis], minlength=len(coords))
+    return quad_forces
+
+def dihedral_forces(coords, quads, kphi, n, delta):
+
+    """
+    returns the dihedral energy and the forces on each atom
+    """
+
+    phi, geometry = quad_geometry(coords, quads)
+    return (np.sum(potential(phi, kphi, n, delta)),
+        quad_forces(coords, quads, force(phi, kphi, n, delta), geometry))
+
+def improper_forces(coords, quads, kzeta, zetao):
+
+    """
+    returns the improper dihedral energy and the forces on each atom
+    """
+
+    zeta, geometry = quad_geometry(coords, quads)
+    return (np.sum(improper_potential(zeta, kzeta, zetao)),
+        quad_forces(coords, quads, improper_force(zeta, kzeta, zetao), geometry))
+
+### phi SLIDER ###
+
+min_phi = -180  # units degrees
+max_phi = 180 # units degrees
+dihedral_phi_slider = dcc.Slider(
+    min=min_phi,
+    max=max_phi,
+    step=1,
+    id='dihedral_phi_slider',
+    marks={
+        min_phi: str(min_phi),
+        0: '0',
+        max_phi: str(max_phi),
+    },
+    value=60,
+    tooltip = { 'always_visible': False },
+)
+
+### Kphi SLIDER ###
+
+min_kphi = 0  # units kJ/mol
+max_kphi = 40 # units kJ/mol
+dihedral_kphi_slider = dcc.Slider(
+    min=min_kphi,
+    max=max_kphi,
+    step=0.5,
+    id='dihedral_kphi_slider',
+    marks={
+        min_kphi: str(min_kphi),
+        max_kphi: str(max_kphi),
+    },
+    value=20,
+    tooltip = { 'always_visible': False },
+)
+
+### n SLIDER ###
+
+min_n = 1
+max_n = 6
+dihedral_n_slider = dcc.Slider(
+    min=min_n,
+    max=max_n,
+    step=1,
+    id='dihedral_n_slider',
+    marks={n: str(n) for n in range(min_n, max_n + 1)},
+    value=3,
+    tooltip = { 'always_visible': False },
+)
+
+### delta SLIDER ###
+
+min_delta = 0  # units degrees
+max_delta = 360 # units degrees
+dihedral_delta_slider = dcc.Slider(
+    min=min_delta,
+    max=max_delta,
+    step=15,
+    id='dihedral_delta_slider',
+    marks={
+        min_delta: str(min_delta),
+        180: '180',
+        max_delta: str(max_delta),
+    },
+    value=0,
+    tooltip = { 'always_visible': False },
+)
+
+### DIHEDRAL POTENTIAL PLOT ###
+
+def update_dihedral_plot(phi_value, kphi_value, n_value, delta_value):
+
+    phi = np.arange(min_phi,max_phi,0.01)
+
+    dihedral_pot = potential(phi, kphi_value, n_value, delta_value) # kJ/mol
+    dihedral_force = force(phi, kphi_value, n_value, delta_value) # N/mol
+
+    fig = psub.make_subplots(specs=[[{"secondary_y": True}]])
+
+    ### force line ###
+    fig.add_trace(
+        go.Scatter(
+            x=phi,
+            y=dihedral_force,
+            mode='lines',
+            line={'color':'#E2C458','width':5},
+        ), secondary_y=True,
+    )
+
+    ### potential line ###
+    fig.add_trace(
+        go.Scatter(
+            x=phi,
+            y=dihedral_pot,
+            mode='lines',
+            line={'color':'#B09ADB','width':5},
+        )
+    )
+
+    ### angle marker ###
+    fig.add_trace(
+        go.Scatter(
+            x=[phi_value],
+            y = potential(phi_value, kphi_value, n_value, delta_value),
+            mode='markers',
+            marker={'color':'#E6526A', 'size':12},
+        )
+    )
+
+    ### angle marker 2 ###
+    fig.add_trace(
+        go.Scatter(
+            x=[phi_value],
+            y = force(phi_value, kphi_value, n_value, delta_value),
+            mode='markers',
+            marker={'color':'#E6526A', 'size':12},
+        ), secondary_y=True,
+    )
+
+    ### graph layout ###
+    fig.update_xaxes(
+        range=[min_phi,max_phi],
+        showline=True,
+        mirror=True,
+        dtick=60,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+    )
+
+    max_pot = max_kphi
+    dtick = max_pot/4
+
+    fig.update_yaxes(
+        secondary_y=False,
+        range=[-dtick, dtick*5],
+        showline=True,
+        mirror=True,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+        dtick=dtick,
+        title=dict(
+            text='Potential Energy (kJ/mol)',
+            font=dict(
+                color='#B09ADB',
+            ),
+        ),
+        tickfont=dict(
+            color='#B09ADB'
+        ),
+    )
+
+    max_force = np.max(force(phi, max_kphi, max_n, 0))
+    dtick2 = [float(x) for x in
+        np.format_float_scientific(max_force).split('e')]
+    dtick2 = math.ceil(dtick2[0]) * 10**int(dtick2[1])/2
+
+    fig.update_yaxes(
+        range=[-dtick2*2, dtick2*2],
+        secondary_y=True,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+        dtick=dtick2,
+        exponentformat='e',
+        title=dict(
+            text='Force (N/mol)',
+            font=dict(
+                color='#E2C458'
+            ),
+        ),
+        tickfont=dict(
+            color='#E2C458'
+        )
+    )
+
+    fig.update_layout(
+        title='Dihedral Potential',
+        xaxis_title="\u03D5 (degrees)",
+        font=dict(
+            color="#c3c3c3"
+        ),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=False,
+    )
+
+    return fig
+
+fig  = update_dihedral_plot(dihedral_phi_slider.value, dihedral_kphi_slider.value, dihedral_n_slider.value, dihedral_delta_slider.value)
+dihedral_plot = dcc.Graph(id='dihedral_plot',figure=fig)
+
+### DIHEDRAL ATOM-FORCE PLOT ###
+
+def update_dihedral_force_plot(phi_value, kphi_value, n_value, delta_value):
+
+    fig = go.Figure()
+
+    ### Newman projection: front atom bond points up, back atom bond rotated by phi ###
+
+    mid_pt = 2
+    mid_height = 2
+    length = 0.8
+    radius = 0.35
+
+    front = np.deg2rad(90)
+    back = np.deg2rad(90 - phi_value)
+
+    circle = np.linspace(0, 2*np.pi, 200)
+
+    ### back atom ###
+    fig.add_trace(
+        go.Scatter(
+            x=mid_pt + radius*np.cos(circle),
+            y=mid_height + radius*np.sin(circle),
+            hoverinfo='none',
+            mode='lines',
+            line={'color':"#c3c3c3",'width':3},
+        )
+    )
+
+    fig.add_trace(
+        go.Scatter(
+            x=[mid_pt + radius*np.cos(back), mid_pt + length*np.cos(back)],
+            y=[mid_height + radius*np.sin(back), mid_height + length*np.sin(back)],
+            hoverinfo='none',
+            mode='lines',
+            line={'color':"#c3c3c3",'width':3},
+        )
+    )
+
+    ### front atom ###
+    fig.add_trace(
+        go.Scatter(
+            x=[mid_pt, mid_pt + length*np.cos(front)],
+            y=[mid_height, mid_height + length*np.sin(front)],
+            hoverinfo='none',
+            mode='lines',
+            line={'color':"#c3c3c3",'width':3},
+        )
+    )
+
+    ### atomic markers ###
+    fig.add_trace(
+        go.Scatter(
+            x=[mid_pt, mid_pt + length*np.cos(front), mid_pt + length*np.cos(back)],
+            y=[mid_height, mid_height + length*np.sin(front), mid_height + length*np.sin(back)],
+            mode='markers',
+            hoverinfo='none',
+            marker={'color':'#E6526A', 'size':20}
+        )
+    )
+
+    ### graph layout ###
+    fig.update_xaxes(
+        range=[0.5,3.5],
+        showline=False,
+        mirror=False,
+        nticks=0,
+        showgrid=False,
+        showticklabels=False,
+    )
+
+    fig.update_yaxes(
+        range=[1,3],
+        showline=False,
+        mirror=False,
+        nticks=0,
+        showgrid=False,
+        showticklabels=False,
+        scaleanchor='x',
+    )
+
+    ### force vector, tangent to the rotation of the back atom ###
+
+    max_force = 0.5 * max_kphi * max_n * np.pi/180 * 1e13
+    force_length = 0.6*force(phi_value, kphi_value, n_value, delta_value)/max_force
+
+    # positive force increases phi, which turns the back atom clockwise here
+    tip_x = mid_pt + length*np.cos(back) + force_length*np.sin(back)
+    tip_y = mid_height + length*np.sin(back) - force_length*np.cos(back)
+
+    fig.update_layout(
+        showlegend=False,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=300,
+        font=dict(
+            color="#c3c3c3",
+        ),
+        title='Dihedral Interaction',
+        annotations=[
+
+            ### force vector ###
+            dict(
+                x=tip_x,
+                y=tip_y,
+                xref="x",
+                yref="y",
+                showarrow=True,
+                arrowhead=1,
+                axref="x",
+                ayref="y",
+                ax=mid_pt + length*np.cos(back),
+                ay=mid_height + length*np.sin(back),
+                arrowwidth=3,
+                arrowcolor='#E2C458',
+                arrowsize=1.2,
+            ),
+
+            ### force annotation ###
+            dict(
+                x=mid_pt,
+                y=2.95,
+                text='Force = ' + str(
+                    np.format_float_scientific(
+                        force(phi_value, kphi_value, n_value, delta_value),
+                        precision=2
+                    )
+                ) + ' N/mol',
+                xref="x",
+                yref="y",
+                showarrow=False,
+                arrowhead=1,
+                ax=0,
+                ay=0,
+                arrowwidth=3,
+                arrowcolor='#E2C458',
+                arrowsize=1.2,
+                font=dict(
+                    color='#E2C458',
+                    size=16,
+                ),
+            ),
+        ],
+    )
+
+    return fig
+
+fig  = update_dihedral_force_plot(dihedral_phi_slider.value, dihedral_kphi_slider.value, dihedral_n_slider.value, dihedral_delta_slider.value)
+dihedral_force_plot = dcc.Graph(id='dihedral_force_plot',figure=fig)
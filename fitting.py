@@ -0,0 +1,418 @@
+import argparse
+import base64
+import collections
+import functools
+import io
+import multiprocessing as mp
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+import angles
+import bonds
+import integrators
+import lennard_jones as lj
+
+### FUNCTIONAL FORMS ###
+
+# Force-field parameters are fitted to energy scans, (coordinate, energy)
+# pairs such as a quantum calculation at a series of bond lengths, angles or
+# dimer distances. Each functional form is evaluated with the interaction
+# module's vectorized potential and differentiated analytically with respect
+# to its parameters, so a whole batch of candidate parameter sets is fitted
+# at once with array operations.
+
+def bond_potential(b, bo, kb):
+
+    return bonds.potential(b, bo, kb)
+
+def harmonic_gradient(x, xo, k):
+
+    """
+    returns the derivatives of 0.5*k*(x-xo)^2 with respect to xo and k
+    """
+
+    return [-k * (x - xo), 0.5 * (x - xo)**2]
+
+def angle_potential(th, tho, kth):
+
+    return angles.potential(th, tho, kth)
+
+def lj_potential(r, sigma, epsilon):
+
+    return lj.potential(r, sigma, epsilon)
+
+def lj_gradient(r, sigma, epsilon):
+
+    """
+    returns the derivatives of the Lennard-Jones potential with respect to
+    sigma and epsilon
+    """
+
+    s6 = (sigma / r)**6
+    return [24 * epsilon / sigma * (2*s6**2 - s6), 4 * (s6**2 - s6)]
+
+def harmonic_starts(x, energy, n, rng):
+
+    """
+    returns n starting (xo, k) spread over the scan, with force constants
+    within a decade of a parabola that spans the scan's energies
+    """
+
+    k = 8 * max(np.ptp(energy), 1e-12) / max(np.ptp(x), 1e-12)**2
+    return np.stack([rng.uniform(x.min(), x.max(), n), k * 10**rng.uniform(-1, 1, n)], axis=1)
+
+def lj_starts(x, energy, n, rng):
+
+    """
+    returns n starting (sigma, epsilon) around the scan's lowest point, with
+    well depths within a decade of its depth
+    """
+
+    sigma = x[np.argmin(energy)] * 2**(-1/6)
+    depth = max(-energy.min(), 1e-3 * max(np.ptp(energy), 1e-12))
+    return np.stack([sigma * rng.uniform(0.7, 1.3, n), depth * 10**rng.uniform(-1, 1, n)], axis=1)
+
+Model = collections.namedtuple('Model',
+    ['params', 'potential', 'gradient', 'lower', 'offset', 'starts', 'labels'])
+
+# offset: whether a constant energy shift is fitted as well by default (scans
+# of bonds and angles have an arbitrary zero, dimer scans go to zero apart)
+models = {
+    'bond': Model(('bo', 'kb'), bond_potential, harmonic_gradient, (1e-3, 0), True,
+        harmonic_starts, ('b<sub>o</sub> = {:.3f} \u212B',
+        'K<sub>b</sub> = {:.0f} kJ/(mol*\u212B<sup>2</sup>)')),
+    'angle': Model(('tho', 'kth'), angle_potential, harmonic_gradient, (1e-3, 0), True,
+        harmonic_starts, ('\u03B8<sub>o</sub> = {:.1f}\u00B0',
+        'K<sub>\u03B8</sub> = {:.4f} kJ/(mol*degrees<sup>2</sup>)')),
+    'lennard_jones': Model(('sigma', 'epsilon'), lj_potential, lj_gradient, (1e-3, 0), False,
+        lj_starts, ('\u03C3 = {:.3f} \u212B', '\u025B = {:.3f} kJ/mol')),
+}
+
+### BATCHED LEVENBERG-MARQUARDT ###
+
+def residuals(model, x, energy, p, offset):
+
+    """
+    returns the residuals (kJ/mol) of each parameter set, rows of p with the
+    energy offset last if fitted, shape (sets, len(x))
+    """
+
+    columns = [p[:, i, None] for i in range(len(model.params))]
+    with np.errstate(all='ignore'):
+        r = model.potential(x[None,:], *columns) - energy
+    return r + p[:, -1, None] if offset else r
+
+def jacobian(model, x, p, offset):
+
+    """
+    returns the derivatives of the residuals with respect to each parameter,
+    shape (sets, len(x), parameters)
+    """
+
+    columns = [p[:, i, None] for i in range(len(model.params))]
+    with np.errstate(all='ignore'):
+        grads = model.gradient(x[None,:], *columns)
+    if offset:
+        grads.append(np.ones(len(x)))
+    return np.stack([np.broadcast_to(g, (len(p), len(x))) for g in grads], axis=-1)
+
+def levenberg_marquardt(model, x, energy, weights, starts, offset, max_iter=500, tol=1e-12):
+
+    """
+    returns the fitted parameter sets and their costs 0.5*sum(w*r^2) for a
+    batch of starting sets, all iterated together
+
+    each set keeps its own damping; a set stops once a step improves its
+    cost by less than tol relative, or the damping shows it is at a minimum,
+    and parameters are held at or above the model's lower bounds
+    """
+
+    p = np.array(starts, dtype=float)
+    lower = np.array(model.lower + ((-np.inf,) if offset else ()))
+    r = residuals(model, x, energy, p, offset)
+    cost = 0.5 * np.sum(weights * r**2, axis=1)
+    cost[~np.isfinite(cost)] = np.inf
+    damping = np.full(len(p), 1e-3)
+    active = np.isfinite(cost)
+
+    for _ in range(max_iter):
+        rows = np.nonzero(active)[0]
+        if not len(rows):
+            break
+        J = jacobian(model, x, p[rows], offset)
+        A = np.einsum('spi,p,spj->sij', J, weights, J)
+        g = np.einsum('spi,sp->si', J, weights * r[rows])
+
+        ### Marquardt scaling, with a floor so flat directions stay solvable ###
+        d = np.einsum('sii->si', A)
+        d = np.maximum(d, 1e-12 * d.max(axis=1, keepdims=True) + 1e-300)
+        lhs = A + damping[rows,None,None] * d[:,:,None] * np.eye(p.shape[1])
+        with np.errstate(all='ignore'):
+            step = np.linalg.solve(lhs, -g[...,None])[...,0]
+        trial = np.maximum(p[rows] + step, lower)
+        trial_r = residuals(model, x, energy, trial, offset)
+        trial_cost = 0.5 * np.sum(weights * trial_r**2, axis=1)
+
+        better = np.isfinite(trial_cost) & (trial_cost < cost[rows])
+        done = better & (cost[rows] - trial_cost <= tol * cost[rows]) | (damping[rows] > 1e10)
+        accept = rows[better]
+        p[accept], r[accept], cost[accept] = trial[better], trial_r[better], trial_cost[better]
+        damping[rows] *= np.where(better, 0.1, 10)
+        active[rows[done]] = False
+
+    return p, cost
+
+def fit_batch(task):
+
+    """
+    returns the fitted parameter sets and costs of one batch of starts
+    """
+
+    name, x, energy, weights, starts, offset = task
+    model = models[name]
+    if offset:
+        ### start from the best offset for each starting set ###
+        r = residuals(model, x, energy, starts, False)
+        shift = -np.sum(weights * r, axis=1) / np.sum(weights)
+        starts = np.column_stack([starts, np.nan_to_num(shift)])
+    return levenberg_marquardt(model, x, energy, weights, starts, offset)
+
+### MULTISTART FITS ###
+
+Fit = collections.namedtuple('Fit', ['model', 'params', 'offset', 'rmse', 'costs'])
+
+# A worker costs about 15 ms to start and a start about 0.2 ms to fit, so a
+# pool only pays off with a few hundred starts per worker, and never with
+# more workers than cores; below that, fit runs the batches serially
+min_pool_starts = 256  # starts per worker
+
+def boltzmann_weights(energy, temperature):
+
+    """
+    returns weights exp(-(E - Emin)/RT) that favor the low-energy part of a
+    scan, where the force field is used at temperature (K)
+    """
+
+    return np.exp(-(energy - energy.min()) / (integrators.gas_constant * temperature))
+
+def fit(model, x, energy, weights=None, n_starts=64, offset=None, n_workers=1,
+        batch_size=16, seed=0):
+
+    """
+    returns the best Fit of a functional form ('bond', 'angle' or
+    'lennard_jones') to a scan of energies (kJ/mol) at coordinates x
+    (Angstroms or degrees), with optional weights per point
+
+    n_starts random starting sets are fitted with Levenberg-Marquardt in
+    batches of batch_size; with several workers (None for every core) the
+    batches run on a process pool, with no more workers than cores or than
+    n_starts / min_pool_starts; costs are the final costs of every start, so
+    the fraction that reached the best fit shows how rugged the fit is
+    """
+
+    spec = models[model]
+    x = np.asarray(x, dtype=float).ravel()
+    energy = np.asarray(energy, dtype=float).ravel()
+    weights = np.ones(len(x)) if weights is None else np.asarray(weights, dtype=float).ravel()
+    offset = spec.offset if offset is None else offset
+    if not len(x) == len(energy) == len(weights):
+        raise ValueError('the scan needs one energy and weight per coordinate')
+    if len(x) < len(spec.params) + offset:
+        raise ValueError('a {} fit needs at least {} scan points'.format(
+            model, len(spec.params) + offset))
+
+    starts = spec.starts(x, energy, n_starts, np.random.default_rng(seed))
+    tasks = [(model, x, energy, weights, starts[i:i + batch_size], offset)
+        for i in range(0, n_starts, batch_size)]
+    n_workers = min(n_workers or os.cpu_count(), os.cpu_count(),
+        n_starts // min_pool_starts, len(tasks))
+    if n_workers <= 1:
+        results = [fit_batch(task) for task in tasks]
+    else:
+        with mp.Pool(n_workers) as pool:
+            results = pool.map(fit_batch, tasks)
+
+    params = np.concatenate([p for p, _ in results])
+    costs = np.concatenate([c for _, c in results])
+    best = np.argmin(costs)
+    return Fit(model, dict(zip(spec.params, params[best].tolist())),
+        float(params[best, -1]) if offset else 0.0,
+        float(np.sqrt(2 * costs[best] / np.sum(weights))), costs)
+
+def fitted_energy(result, x):
+
+    """
+    returns the fitted potential (kJ/mol), with its offset, at x
+    """
+
+    return models[result.model].potential(np.asarray(x, dtype=float),
+        **result.params) + result.offset
+
+### SCAN DATA ###
+
+def read_scan(source):
+
+    """
+    returns the coordinates and energies of a scan from a text file (or file
+    object) with two columns, separated by whitespace or commas; lines
+    starting with # are comments
+    """
+
+    if isinstance(source, str):
+        with open(source) as f:
+            text = f.read()
+    else:
+        text = source.read()
+    data = np.loadtxt(io.StringIO(text.replace(',', ' ')), ndmin=2)
+    if data.shape[1] < 2:
+        raise ValueError('a scan needs two columns: coordinate and energy')
+    order = np.argsort(data[:,0])
+    return data[order, 0], data[order, 1]
+
+def morse_scan(n=25):
+
+    """
+    returns a Morse potential C-H bond scan (Angstroms, kJ/mol), a stand-in
+    for a quantum scan with the anharmonicity of a real bond
+    """
+
+    de, a, re = 440.0, 1.85, 1.09
+    b = np.linspace(0.85, 1.45, n)
+    return b, de * (1 - np.exp(-a * (b - re)))**2
+
+def bend_scan(n=29):
+
+    """
+    returns a water bend scan (degrees, kJ/mol), harmonic in the cosine of
+    the angle rather than in the angle
+    """
+
+    th = np.linspace(70, 140, n)
+    return th, 0.5 * 410 * (np.cos(np.radians(th)) - np.cos(np.radians(104.5)))**2
+
+def dimer_scan(n=40):
+
+    """
+    returns an argon dimer scan (Angstroms, kJ/mol) of an exp-6 potential,
+    whose repulsion is softer than the r^-12 wall
+    """
+
+    eps, rm, alpha = 1.19, 3.76, 13.5
+    r = np.linspace(3.2, 8.0, n)
+    return r, eps / (1 - 6/alpha) * (6/alpha * np.exp(alpha * (1 - r/rm)) - (rm/r)**6)
+
+reference_scans = {
+    'bond': ('Morse C-H', morse_scan),
+    'angle': ('water bend', bend_scan),
+    'lennard_jones': ('exp-6 Ar\u2082', dimer_scan),
+}
+
+### PLOTS ###
+
+def upload_scan(contents):
+
+    """
+    returns the scan of the contents of a dcc.Upload (a base64 data URL)
+    """
+
+    data = contents.split(',', 1)[1]
+    return read_scan(io.StringIO(base64.b64decode(data).decode('utf-8', 'replace')))
+
+@functools.lru_cache(maxsize=16)
+def scan_fit(model, contents=None):
+
+    """
+    returns the scan, its name, its Fit and any error reading it, for an
+    uploaded scan or, without one (or if it cannot be read or fitted), the
+    model's reference scan
+
+    the fits run in the callback's process; the pool is for batch fits
+    """
+
+    error = None
+    if contents is not None:
+        try:
+            x, energy = upload_scan(contents)
+            return x, energy, 'uploaded scan', fit(model, x, energy), error
+        except Exception as exc:
+            error = 'could not fit the upload: {}'.format(exc)
+    name, scan = reference_scans[model]
+    x, energy = scan()
+    return x, energy, name, fit(model, x, energy), error
+
+def add_fit(fig, model, contents=None):
+
+    """
+    adds a scan and the curve fitted to it to fig, with the fitted parameters
+    in an annotation, and zooms the plot to the scan
+    """
+
+    x, energy, name, result, error = scan_fit(model, contents)
+    pad = 0.1 * np.ptp(x)
+    curve = np.linspace(x.min() - pad, x.max() + pad, 400)
+
+    fig.add_trace(
+        go.Scatter(
+            x=curve,
+            y=fitted_energy(result, curve),
+            mode='lines',
+            line={'color':'#E6526A','width':3,'dash':'dash'},
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=x,
+            y=energy,
+            mode='markers',
+            marker={'color':'#E6526A', 'size':7, 'symbol':'circle-open'},
+        )
+    )
+
+    labels = models[model].labels
+    text = '{} fit: {}<br>rms error {:.3g} kJ/mol'.format(name, ', '.join(
+        label.format(value) for label, value in zip(labels, result.params.values())), result.rmse)
+    if error:
+        text += '<br>' + error
+    fig.add_annotation(
+        x=0.02,
+        y=0.98,
+        xref='paper',
+        yref='paper',
+        xanchor='left',
+        align='left',
+        showarrow=False,
+        text=text,
+        font=dict(
+            color='#E6526A',
+        ),
+    )
+
+    lo, hi = energy.min(), energy.max()
+    span = max(hi - lo, 1e-12)
+    fig.update_xaxes(range=[x.min() - pad, x.max() + pad])
+    fig.update_yaxes(secondary_y=False, range=[lo - 0.3*span, hi + 0.3*span],
+        dtick=float('{:.0e}'.format(span / 4)))
+    return fig
+
+# usage: python fitting.py bond scan.txt --starts 256 --workers 4
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='fit force-field parameters to an energy scan')
+    parser.add_argument('model', choices=sorted(models))
+    parser.add_argument('path', help='two-column scan: coordinate, energy (kJ/mol)')
+    parser.add_argument('--starts', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--temperature', type=float, default=None,
+        help='Boltzmann-weight the scan points at this temperature (K)')
+    args = parser.parse_args()
+
+    x, energy = read_scan(args.path)
+    weights = None if args.temperature is None else boltzmann_weights(energy, args.temperature)
+    result = fit(args.model, x, energy, weights, args.starts, n_workers=args.workers)
+    for name, value in result.params.items():
+        print('{} = {:.6g}'.format(name, value))
+    print('offset = {:.6g} kJ/mol'.format(result.offset))
+    print('rms error = {:.6g} kJ/mol'.format(result.rmse))
+    print('{} of {} starts reached the best fit'.format(
+        np.sum(result.costs <= result.costs.min() * (1 + 1e-6) + 1e-12), len(result.costs)))
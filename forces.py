@@ -0,0 +1,139 @@
+import numpy as np
+
+import angles as angle
+import bonds as bond
+import coulomb as coul
+import lennard_jones as lj
+import periodic
+
+### COORDINATE KERNELS ###
+
+# The kernels below evaluate the interaction modules over whole systems:
+# coordinates (n_atoms, 3) in Angstroms plus index arrays of bonds (i, j),
+# angles (i, j, k) with j at the vertex, or nonbonded pairs (i, j). Each
+# returns the total energy (kJ/mol) and the force on every atom (N/mol).
+# Per-term parameters may be scalars or arrays with one value per term.
+# Atoms are gathered with np.take, several times faster than coords[i] for
+# an (n_atoms, 3) array.
+
+avogadro = 6.02214076e23  # 1/mol
+
+def scatter(forces, index, vectors):
+
+    """
+    adds each row of vectors to the row of forces given by index
+    """
+
+    for axis in range(3):
+        forces[:,axis] += np.bincount(index, vectors[:,axis], minlength=len(forces))
+
+def accumulate(n_atoms, terms):
+
+    """
+    returns the forces on each atom from a list of (index, vectors) per-atom
+    contributions, each scattered onto the same array (concatenating them
+    first for a single bincount costs more than it saves)
+    """
+
+    forces = np.zeros((n_atoms, 3))
+    for index, vectors in terms:
+        scatter(forces, index, vectors)
+    return forces
+
+def bond_terms(coords, bonds, bo, kb):
+
+    """
+    returns the harmonic energy of each bond and the per-atom force
+    contributions (index, vectors)
+    """
+
+    i, j = np.asarray(bonds).T
+    rij = np.take(coords, i, axis=0) - np.take(coords, j, axis=0)
+    b = np.sqrt(np.einsum('ij,ij->i', rij, rij))
+
+    fvec = (bond.force(b, bo, kb) / b)[:,None] * rij
+    return bond.potential(b, bo, kb), (np.concatenate([i, j]), np.concatenate([fvec, -fvec]))
+
+def angle_terms(coords, angles, tho, kth):
+
+    """
+    returns the harmonic energy of each angle and the per-atom force
+    contributions (index, vectors)
+    """
+
+    i, j, k = np.asarray(angles).T
+    xj = np.take(coords, j, axis=0)
+    u = np.take(coords, i, axis=0) - xj
+    v = np.take(coords, k, axis=0) - xj
+    lu = np.sqrt(np.einsum('ij,ij->i', u, u))
+    lv = np.sqrt(np.einsum('ij,ij->i', v, v))
+    cos = np.clip(np.einsum('ij,ij->i', u, v) / (lu*lv), -1, 1)
+    th = np.degrees(np.arccos(cos))
+
+    ### d(theta)/dx in degrees per Angstrom, guarded at linear angles ###
+    sin = np.maximum(np.sqrt(1 - cos**2), 1e-8)
+    scale = angle.force(th, tho, kth) * -np.degrees(1) / sin
+    fi = scale[:,None] * (v/(lu*lv)[:,None] - (cos/lu**2)[:,None]*u)
+    fk = scale[:,None] * (u/(lu*lv)[:,None] - (cos/lv**2)[:,None]*v)
+    return angle.potential(th, tho, kth), (np.concatenate([i, k, j]),
+        np.concatenate([fi, fk, -fi - fk]))
+
+def bond_forces(coords, bonds, bo, kb):
+
+    """
+    returns the harmonic bond energy and the forces on each atom
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    energy, terms = bond_terms(coords, bonds, bo, kb)
+    return np.sum(energy), accumulate(len(coords), [terms])
+
+def angle_forces(coords, angles, tho, kth):
+
+    """
+    returns the harmonic angle energy and the forces on each atom
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    energy, terms = angle_terms(coords, angles, tho, kth)
+    return np.sum(energy), accumulate(len(coords), [terms])
+
+def lj_forces(coords, pairs, sigma, epsilon, scale=1, box=None):
+
+    """
+    returns the Lennard-Jones energy and the forces on each atom, with an
+    optional scale factor per pair (e.g. for 1-4 pairs), by the minimum image
+    in a periodic Box if given
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    i, j = pairs
+    rij = periodic.displacements(coords, i, j, box)
+    r = np.sqrt(np.sum(rij**2, axis=1))
+
+    fvec = (scale * lj.force(r, sigma, epsilon) / r)[:,None] * rij
+    lj_forces = np.zeros_like(coords)
+    scatter(lj_forces, i, fvec)
+    scatter(lj_forces, j, -fvec)
+    return np.sum(scale * lj.potential(r, sigma, epsilon)), lj_forces
+
+def coulomb_forces(coords, pairs, charges, k, scale=1, box=None):
+
+    """
+    returns the Coulomb energy and the forces on each atom, converted from
+    the per-pair units of the coulomb module to kJ/mol and N/mol, with an
+    optional scale factor per pair (e.g. for 1-4 pairs), by the minimum image
+    in a periodic Box if given
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    charges = np.asarray(charges, dtype=float)
+    i, j = pairs
+    rij = periodic.displacements(coords, i, j, box)
+    r = np.sqrt(np.sum(rij**2, axis=1))
+
+    fvec = (scale * coul.force(charges[i], charges[j], r, k) * avogadro / r)[:,None] * rij
+    coul_forces = np.zeros_like(coords)
+    scatter(coul_forces, i, fvec)
+    scatter(coul_forces, j, -fvec)
+    return np.sum(scale * coul.potential(charges[i], charges[j], r, k)) * avogadro, coul_forces
@@ -0,0 +1,357 @@
+import collections
+
+import numpy as np
+
+import angles as angle
+import bonds as bond
+import dihedrals as dihedral
+import integrators
+import nonbonded
+import periodic
+
+### BLOCK-SPARSE HESSIAN ###
+
+# The Hessian is the matrix of second derivatives of the energy with
+# respect to the 3N coordinates, in kJ/(mol*Angstroms^2). Each term only
+# couples its own two to four atoms, so the matrix is stored as the 3x3
+# blocks of the atom pairs that interact. Its memory grows with the number
+# of terms rather than with N^2, and products with a vector cost one pass
+# over the blocks.
+
+class BlockHessian:
+
+    """
+    a symmetric 3N x 3N matrix stored as 3x3 blocks (n_blocks, 3, 3) at atom
+    pairs (n_blocks, 2) sorted by row, with both (i, j) and (j, i) present
+    """
+
+    def __init__(self, n_atoms, pairs, blocks):
+
+        self.n_atoms = n_atoms
+        self.pairs = pairs
+        self.blocks = blocks
+
+        ### pairs are sorted by row: the blocks of each row are contiguous ###
+        self.columns = np.ascontiguousarray(pairs[:,1], dtype=np.intp)
+        self.row_starts = np.searchsorted(pairs[:,0], np.arange(n_atoms))
+        self.empty_rows = np.diff(np.append(self.row_starts, len(pairs))) == 0
+
+    @classmethod
+    def assemble(cls, n_atoms, terms):
+
+        """
+        returns the sum of per-term Hessians, a list of (atoms, blocks) with
+        the atoms of each term (n_terms, m) and its Hessian (n_terms, 3m, 3m)
+
+        blocks of the same atom pair are summed after a sort of the pair
+        keys, with one bincount per block element
+        """
+
+        rows, cols, values = [], [], []
+        for atoms, hess in terms:
+            m = atoms.shape[1]
+            hess = hess.reshape(len(atoms), m, 3, m, 3).transpose(0, 1, 3, 2, 4)
+            for a in range(m):
+                for b in range(m):
+                    rows.append(atoms[:,a])
+                    cols.append(atoms[:,b])
+                    values.append(hess[:,a,b].reshape(-1, 9))
+        if not rows:
+            return cls(n_atoms, np.zeros((0, 2), dtype=np.int64), np.zeros((0, 3, 3)))
+
+        keys = np.concatenate(rows).astype(np.int64) * n_atoms + np.concatenate(cols)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        values = np.concatenate(values)
+        blocks = np.stack([np.bincount(inverse, values[:,c], minlength=len(unique))
+            for c in range(9)], axis=1).reshape(-1, 3, 3)
+        pairs = np.stack([unique // n_atoms, unique % n_atoms], axis=1)
+        return cls(n_atoms, pairs, blocks)
+
+    @property
+    def density(self):
+
+        "returns the fraction of the 3x3 blocks that are stored"
+
+        return len(self.blocks) / max(self.n_atoms**2, 1)
+
+    def dense(self):
+
+        """
+        returns the Hessian as a dense (3N, 3N) array
+        """
+
+        hess = np.zeros((self.n_atoms, 3, self.n_atoms, 3))
+        hess[self.pairs[:,0], :, self.pairs[:,1], :] = self.blocks
+        return hess.reshape(3*self.n_atoms, 3*self.n_atoms)
+
+    def matvec(self, x):
+
+        """
+        returns the product of the Hessian with a vector of 3N coordinates
+        """
+
+        x = np.asarray(x, dtype=float).reshape(-1, 3)
+        if not len(self.blocks):
+            return np.zeros(x.size)
+        products = np.einsum('nab,nb->na', self.blocks, np.take(x, self.columns, axis=0))
+        sums = np.add.reduceat(products, np.minimum(self.row_starts, len(products) - 1), axis=0)
+        sums[self.empty_rows] = 0
+        return sums.ravel()
+
+### TERM HESSIANS ###
+
+def radial_blocks(rij, d1, d2):
+
+    """
+    returns the Hessian (n, 6, 6) of pair potentials U(r) over atoms (i, j)
+    with displacements rij = ri - rj, from dU/dr (d1) and d2U/dr2 (d2)
+    """
+
+    r = np.sqrt(np.einsum('ij,ij->i', rij, rij))
+    unit = rij / r[:,None]
+    outer = unit[:,:,None] * unit[:,None,:]
+    k = d2[:,None,None] * outer + (d1 / r)[:,None,None] * (np.eye(3) - outer)
+    return np.block([[k, -k], [-k, k]])
+
+def bond_hessian(coords, bonds, bo, kb):
+
+    """
+    returns the atoms and Hessian of each harmonic bond
+    """
+
+    bonds = np.asarray(bonds).reshape(-1, 2)
+    i, j = bonds.T
+    rij = coords[i] - coords[j]
+    b = np.sqrt(np.einsum('ij,ij->i', rij, rij))
+    d1 = -bond.force(b, bo, kb) / integrators.force_scale
+    d2 = np.broadcast_to(np.asarray(kb, dtype=float), len(b))
+    return bonds, radial_blocks(rij, d1, d2)
+
+# (u, v) = (ri - rj, rk - rj) in terms of the coordinates of atoms (i, j, k)
+angle_map = np.kron(np.array([[1, -1, 0], [0, -1, 1]]), np.eye(3))
+
+def angle_hessian(coords, angles, tho, kth):
+
+    """
+    returns the atoms and Hessian of each harmonic angle (kth per
+    degree^2), from the first and second derivatives of theta with respect
+    to the bond vectors u and v, guarded at linear angles as in the forces
+    """
+
+    angles = np.asarray(angles).reshape(-1, 3)
+    i, j, k = angles.T
+    u = coords[i] - coords[j]
+    v = coords[k] - coords[j]
+    lu = np.sqrt(np.einsum('ij,ij->i', u, u))
+    lv = np.sqrt(np.einsum('ij,ij->i', v, v))
+    uh, vh = u / lu[:,None], v / lv[:,None]
+    cos = np.clip(np.einsum('ij,ij->i', uh, vh), -1, 1)
+    sin = np.maximum(np.sqrt(1 - cos**2), 1e-8)
+    th = np.degrees(np.arccos(cos))
+
+    ### derivatives of cos(theta) ###
+    eye = np.eye(3)
+    c = cos[:,None,None]
+    outer = lambda a, b: a[:,:,None] * b[:,None,:]
+    grad = np.concatenate([(vh - cos[:,None]*uh) / lu[:,None],
+        (uh - cos[:,None]*vh) / lv[:,None]], axis=1)
+    h_uu = (-outer(vh, uh) - outer(uh, vh) + c*(3*outer(uh, uh) - eye)) / (lu**2)[:,None,None]
+    h_vv = (-outer(uh, vh) - outer(vh, uh) + c*(3*outer(vh, vh) - eye)) / (lv**2)[:,None,None]
+    h_uv = (eye - outer(vh, vh) - outer(uh, uh) + c*outer(uh, vh)) / (lu*lv)[:,None,None]
+    hess_cos = np.block([[h_uu, h_uv], [h_uv.transpose(0, 2, 1), h_vv]])
+
+    ### chain rule through theta = arccos(cos), in radians ###
+    grad_th = -grad / sin[:,None]
+    hess_th = -hess_cos / sin[:,None,None] \
+        - (cos / sin**3)[:,None,None] * outer(grad, grad)
+    d1 = -angle.force(th, tho, kth) / integrators.force_scale * np.degrees(1)
+    d2 = np.broadcast_to(np.asarray(kth, dtype=float), len(th)) * np.degrees(1)**2
+    hess = d2[:,None,None] * outer(grad_th, grad_th) + d1[:,None,None] * hess_th
+    return angles, np.einsum('ai,nab,bj->nij', angle_map, hess, angle_map)
+
+def quad_hessian(coords, quads, torque, h=1e-5):
+
+    """
+    returns the atoms and Hessian of each dihedral (or improper) term, by
+    central differences of its analytic forces; torque(phi) returns the
+    force of the term as the dihedrals module does
+
+    the four atoms of every term are displaced together along each of their
+    12 coordinates, so this is 24 vectorized force evaluations
+    """
+
+    quads = np.asarray(quads).reshape(-1, 4)
+    n = len(quads)
+    local = coords[quads].reshape(-1, 3)
+    index = np.arange(4*n).reshape(n, 4)
+    hess = np.zeros((n, 12, 12))
+    for dof in range(12):
+        columns = []
+        for sign in (1, -1):
+            moved = local.reshape(n, 12).copy()
+            moved[:,dof] += sign * h
+            moved = moved.reshape(-1, 3)
+            atoms, vectors = dihedral.quad_terms(moved, index,
+                torque(dihedral.dihedral_angles(moved, index)))
+            f = np.zeros((4*n, 3))
+            for axis in range(3):
+                f[:,axis] = np.bincount(atoms, vectors[:,axis], minlength=4*n)
+            columns.append(f.reshape(n, 12))
+        hess[:,:,dof] = -(columns[0] - columns[1]) / (2 * h * integrators.force_scale)
+    return quads, 0.5 * (hess + hess.transpose(0, 2, 1))
+
+def pair_hessian(coords, pairs, sigma, epsilon, charges, k, lj_scale=1, coul_scale=1,
+                 cutoff=None, box=None, cutoff_mode='force-shift', alpha=0.0,
+                 r_on=None):
+
+    """
+    returns the atoms and Hessian of the Lennard-Jones and Coulomb
+    interaction of each nonbonded pair, with the parameters, scale factors,
+    cutoff and cutoff mode (and periodic box) of nonbonded.pair_terms
+    """
+
+    i, j = pairs
+    rij = periodic.displacements(coords, i, j, box)
+    r = np.sqrt(np.einsum('ij,ij->i', rij, rij))
+    eps = 4 * epsilon * lj_scale
+    qq = (nonbonded.coulomb_constant / k) * coul_scale * charges[i] * charges[j]
+    if cutoff is None:
+        _, d1_lj, d2_lj = nonbonded.lj_radial(r, sigma, eps)
+        _, d1_coul, d2_coul = nonbonded.coulomb_radial(r, qq, 0)
+        d1, d2 = d1_lj + d1_coul, d2_lj + d2_coul
+    else:
+        _, _, d1, d2 = nonbonded.radial_terms(r, sigma, eps, qq, cutoff, cutoff_mode, alpha, r_on,
+            second=True)
+    return np.stack([i, j], axis=1), radial_blocks(rij, d1, d2)
+
+def topology_terms(topology, coords):
+
+    """
+    returns the (atoms, Hessian) of every kind of bonded term of a Topology
+    """
+
+    terms = []
+    if len(topology.bonds):
+        terms.append(bond_hessian(coords, topology.bonds, topology.bo, topology.kb))
+    if len(topology.angles):
+        terms.append(angle_hessian(coords, topology.angles, topology.tho, topology.kth))
+    if len(topology.dihedrals):
+        terms.append(quad_hessian(coords, topology.dihedrals,
+            lambda phi: dihedral.force(phi, topology.kphi, topology.n, topology.delta)))
+    if len(topology.impropers):
+        terms.append(quad_hessian(coords, topology.impropers,
+            lambda zeta: dihedral.improper_force(zeta, topology.kzeta, topology.zetao)))
+    return terms
+
+def system_hessian(force_field, coords):
+
+    """
+    returns the BlockHessian of a system.System at coords (Angstroms): the
+    bonded terms and the nonbonded pairs of its neighbor list
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    force_field.update_pairs(coords)
+    terms = topology_terms(force_field.topology, coords)
+    if len(force_field.pairs[0]):
+        terms.append(pair_hessian(coords, force_field.pairs, force_field.sigma,
+            force_field.epsilon, force_field.charges, force_field.k,
+            force_field.lj_scale, force_field.coul_scale, force_field.cutoff,
+            force_field.box, force_field.cutoff_mode, force_field.alpha, force_field.r_on))
+    return BlockHessian.assemble(force_field.n_atoms, terms)
+
+### NORMAL MODES ###
+
+speed_of_light = 2.99792458e-5  # cm/fs
+
+Modes = collections.namedtuple('Modes', ['frequencies', 'displacements'])
+
+def wavenumbers(eigenvalues):
+
+    """
+    returns the wavenumbers (1/cm) of mass-weighted Hessian eigenvalues
+    (kJ/(mol*Angstroms^2) per g/mol), negative for imaginary frequencies
+    """
+
+    omega = np.sqrt(np.abs(eigenvalues) * integrators.accel_scale)  # rad/fs
+    return np.sign(eigenvalues) * omega / (2 * np.pi * speed_of_light)
+
+def rigid_body_basis(coords, masses):
+
+    """
+    returns an orthonormal basis (3N, 6) of the mass-weighted translations
+    and rotations, (3N, 5) for a linear molecule
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    sqrt_m = np.sqrt(masses)[:,None]
+    centered = coords - np.average(coords, axis=0, weights=masses)
+    vectors = [np.broadcast_to(sqrt_m * e, coords.shape) for e in np.eye(3)]
+    vectors += [sqrt_m * np.cross(e, centered) for e in np.eye(3)]
+    u, s, _ = np.linalg.svd(np.stack([v.ravel() for v in vectors], axis=1), full_matrices=False)
+    return u[:, s > 1e-6 * s[0]]
+
+def normal_modes(hessian, coords, masses):
+
+    """
+    returns the vibrational Modes of a molecule at a minimum: frequencies in
+    1/cm, lowest first, and the Cartesian displacement (N, 3) of each mode,
+    normalized to unit length
+
+    the mass-weighted Hessian (dense, so for molecules of up to a few
+    thousand atoms) is diagonalized in the space orthogonal to the
+    translations and rotations, which leaves 3N - 6 (or 3N - 5) modes
+    """
+
+    masses = np.asarray(masses, dtype=float)
+    hess = hessian.dense() if isinstance(hessian, BlockHessian) else np.asarray(hessian)
+    weight = 1 / np.sqrt(np.repeat(masses, 3))
+    hess = weight[:,None] * hess * weight[None,:]
+
+    rigid = rigid_body_basis(coords, masses)
+    complement = np.linalg.qr(np.concatenate([rigid, np.eye(len(hess))], axis=1))[0]
+    complement = complement[:, rigid.shape[1]:len(hess)]
+    values, vectors = np.linalg.eigh(complement.T @ hess @ complement)
+
+    displacements = (weight[:,None] * (complement @ vectors)).T
+    displacements /= np.linalg.norm(displacements, axis=1)[:,None]
+    return Modes(wavenumbers(values), displacements.reshape(len(values), -1, 3))
+
+def highest_frequency(hessian, masses, n_iter=30, seed=0):
+
+    """
+    returns the highest vibrational frequency (1/cm) of a BlockHessian from
+    a Lanczos iteration (with full reorthogonalization) on its mass-weighted
+    products, never forming the dense matrix; the extreme eigenvalues
+    converge within a few tens of products even for large systems
+    """
+
+    weight = 1 / np.sqrt(np.repeat(np.asarray(masses, dtype=float), 3))
+    n = len(weight)
+    n_iter = min(n_iter, n)
+    basis = np.zeros((n_iter, n))
+    alpha, beta = np.zeros(n_iter), np.zeros(n_iter)
+    q = np.random.default_rng(seed).standard_normal(n)
+    q /= np.linalg.norm(q)
+    for step in range(n_iter):
+        basis[step] = q
+        w = weight * hessian.matvec(weight * q)
+        alpha[step] = w @ q
+        w -= basis[:step+1].T @ (basis[:step+1] @ w)
+        beta[step] = np.linalg.norm(w)
+        if beta[step] < 1e-10 * abs(alpha[step]) or step == n_iter - 1:
+            break
+        q = w / beta[step]
+
+    m = step + 1
+    tridiagonal = np.diag(alpha[:m]) + np.diag(beta[:m-1], 1) + np.diag(beta[:m-1], -1)
+    return wavenumbers(np.linalg.eigvalsh(tridiagonal)[-1])
+
+def max_timestep(frequency, fraction=0.1):
+
+    """
+    returns the largest timestep (fs) that resolves a vibration of the given
+    frequency (1/cm), a fraction of its period as in integrators.max_timestep
+    """
+
+    return fraction / (frequency * speed_of_light)
@@ -0,0 +1,247 @@
+import collections
+
+import numpy as np
+
+### UNITS ###
+
+# Positions in Angstroms, velocities in Angstroms/fs, time in fs, masses in
+# g/mol and forces in N/mol as returned by the force-field kernels.
+
+force_scale = 1e13  # kJ/(mol*Angstroms) to N/mol
+accel_scale = 1e-4  # kJ/(mol*Angstroms) per g/mol to Angstroms/fs^2
+gas_constant = 0.0083144626  # kJ/(mol*K)
+
+def kinetic_energy(velocities, masses):
+
+    """
+    returns the kinetic energy (kJ/mol)
+    """
+
+    return 0.5 * np.sum(masses[:,None] * velocities**2) / accel_scale
+
+def temperature(velocities, masses, n_constraints=0):
+
+    """
+    returns the instantaneous temperature (K), counting three degrees of
+    freedom per atom minus one per constraint
+    """
+
+    n_dof = 3*len(masses) - n_constraints
+    return 2 * kinetic_energy(velocities, masses) / (n_dof * gas_constant)
+
+def maxwell_boltzmann(masses, temp, seed=None):
+
+    """
+    returns random velocities (Angstroms/fs) drawn at temperature temp (K),
+    with no net momentum
+    """
+
+    masses = np.asarray(masses, dtype=float)
+    rng = np.random.default_rng(seed)
+    sigma = np.sqrt(gas_constant * temp * accel_scale / masses)
+    velocities = rng.normal(size=(len(masses), 3)) * sigma[:,None]
+    return velocities - np.sum(masses[:,None] * velocities, axis=0) / np.sum(masses)
+
+### TIMESTEP ###
+
+def reduced_mass(m1, m2):
+
+    """
+    returns the reduced mass of two atoms (g/mol)
+    """
+
+    return m1 * m2 / (m1 + m2)
+
+def harmonic_period(kb, mu):
+
+    """
+    returns the vibrational period (fs) of a harmonic bond with force
+    constant kb (kJ/(mol*Angstroms^2)) and reduced mass mu (g/mol)
+    """
+
+    return 2 * np.pi / np.sqrt(kb * accel_scale / mu)
+
+def max_timestep(kb, mu, fraction=0.1):
+
+    """
+    returns the largest timestep (fs) that resolves a harmonic bond, taken
+    as a fraction of its period (Verlet itself is unstable beyond 1/pi)
+    """
+
+    return fraction * harmonic_period(kb, mu)
+
+### VELOCITY VERLET ###
+
+Trajectory = collections.namedtuple('Trajectory',
+    ['coords', 'velocities', 'potential', 'kinetic', 'time'])
+
+def velocity_verlet(energy_forces, coords, velocities, masses, dt, n_steps,
+                    constraints=(), sample=1, observers=()):
+
+    """
+    returns the final Trajectory state after n_steps of velocity Verlet with
+    timestep dt (fs), with the potential and kinetic energy (kJ/mol) every
+    sample steps
+
+    energy_forces(coords) returns (energy in kJ/mol, forces in N/mol), such
+    as a system.System; each of constraints (e.g. constraints.Constraints or
+    constraints.Settle) corrects the positions after the drift (SHAKE) and
+    the velocities after the kick (RATTLE); each of observers (e.g. the
+    analysis histograms) is updated with the coordinates every sample steps
+    """
+
+    coords = np.array(coords, dtype=float)
+    velocities = np.array(velocities, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    inv_m = accel_scale / force_scale / masses[:,None]
+
+    for constraint in constraints:
+        velocities = constraint.velocities(coords, velocities)
+    energy, forces = energy_forces(coords)
+    potential = [energy]
+    kinetic = [kinetic_energy(velocities, masses)]
+
+    for step in range(1, n_steps + 1):
+        velocities += 0.5 * dt * forces * inv_m
+        new = coords + dt * velocities
+        if constraints:
+            for constraint in constraints:
+                new = constraint.positions(coords, new)
+            velocities = (new - coords) / dt
+        coords = new
+
+        energy, forces = energy_forces(coords)
+        velocities += 0.5 * dt * forces * inv_m
+        for constraint in constraints:
+            velocities = constraint.velocities(coords, velocities)
+
+        if step % sample == 0:
+            for observer in observers:
+                observer.update(coords)
+            potential.append(energy)
+            kinetic.append(kinetic_energy(velocities, masses))
+
+    return Trajectory(coords, velocities, np.array(potential), np.array(kinetic),
+        dt * sample * np.arange(len(potential)))
+
+### MULTIPLE TIME STEP (r-RESPA) ###
+
+def respa(fast, slow, coords, velocities, masses, dt, n_inner, n_steps,
+          constraints=(), sample=1, observers=()):
+
+    """
+    returns the final Trajectory state after n_steps outer steps of the
+    reversible RESPA integrator (Tuckerman, Berne and Martyna, 1992)
+
+    fast(coords) and slow(coords) each return (energy in kJ/mol, forces in
+    N/mol), e.g. the bonded and nonbonded parts of a system.System; the slow
+    forces are applied as half kicks every outer step of dt (fs), and the fast
+    forces drive n_inner velocity Verlet steps of dt/n_inner in between, so
+    the expensive nonbonded forces are evaluated once per outer step
+
+    the outer step must stay below about half the period of the fastest
+    vibration to avoid resonance; constraints and observers are as in
+    velocity_verlet
+    """
+
+    coords = np.array(coords, dtype=float)
+    velocities = np.array(velocities, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    inv_m = accel_scale / force_scale / masses[:,None]
+    h = dt / n_inner
+
+    for constraint in constraints:
+        velocities = constraint.velocities(coords, velocities)
+    e_fast, f_fast = fast(coords)
+    e_slow, f_slow = slow(coords)
+    potential = [e_fast + e_slow]
+    kinetic = [kinetic_energy(velocities, masses)]
+
+    for step in range(1, n_steps + 1):
+        velocities += 0.5 * dt * f_slow * inv_m
+
+        for _ in range(n_inner):
+            velocities += 0.5 * h * f_fast * inv_m
+            new = coords + h * velocities
+            if constraints:
+                for constraint in constraints:
+                    new = constraint.positions(coords, new)
+                velocities = (new - coords) / h
+            coords = new
+            e_fast, f_fast = fast(coords)
+            velocities += 0.5 * h * f_fast * inv_m
+            for constraint in constraints:
+                velocities = constraint.velocities(coords, velocities)
+
+        e_slow, f_slow = slow(coords)
+        velocities += 0.5 * dt * f_slow * inv_m
+        for constraint in constraints:
+            velocities = constraint.velocities(coords, velocities)
+
+        if step % sample == 0:
+            for observer in observers:
+                observer.update(coords)
+            potential.append(e_fast + e_slow)
+            kinetic.append(kinetic_energy(velocities, masses))
+
+    return Trajectory(coords, velocities, np.array(potential), np.array(kinetic),
+        dt * sample * np.arange(len(potential)))
+
+### LANGEVIN DYNAMICS ###
+
+def langevin(energy_forces, coords, velocities, masses, dt, n_steps, temp,
+             friction=0.01, seed=None, sample=1, observers=()):
+
+    """
+    returns the final Trajectory state after n_steps of Langevin dynamics at
+    temperature temp (K) with timestep dt (fs) and friction (1/fs), using the
+    BAOAB splitting (Leimkuhler and Matthews, 2013), which samples
+    configurations accurately even at large timesteps
+
+    coords and velocities may carry leading replica axes, shape
+    (..., n_atoms, 3), for an energy_forces that is vectorized over them, so
+    many independent copies of a small system run at once; the energies are
+    then totals over the replicas
+    """
+
+    coords = np.array(coords, dtype=float)
+    velocities = np.array(velocities, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    inv_m = accel_scale / force_scale / masses[:,None]
+    rng = np.random.default_rng(seed)
+    c1 = np.exp(-friction * dt)
+    c2 = np.sqrt((1 - c1**2) * gas_constant * temp * accel_scale / masses)[:,None]
+
+    energy, forces = energy_forces(coords)
+    potential = [energy]
+    kinetic = [kinetic_energy(velocities, masses)]
+
+    for step in range(1, n_steps + 1):
+        velocities += 0.5 * dt * forces * inv_m
+        coords += 0.5 * dt * velocities
+        velocities = c1 * velocities + c2 * rng.standard_normal(velocities.shape)
+        coords += 0.5 * dt * velocities
+        energy, forces = energy_forces(coords)
+        velocities += 0.5 * dt * forces * inv_m
+
+        if step % sample == 0:
+            for observer in observers:
+                observer.update(coords)
+            potential.append(energy)
+            kinetic.append(kinetic_energy(velocities, masses))
+
+    return Trajectory(coords, velocities, np.array(potential), np.array(kinetic),
+        dt * sample * np.arange(len(potential)))
+
+def energy_drift(trajectory):
+
+    """
+    returns the drift of the total energy (kJ/mol per ps, from a linear fit)
+    and its fluctuation relative to that of the kinetic energy, a common
+    measure of whether a timestep is small enough (well below 0.1)
+    """
+
+    total = trajectory.potential + trajectory.kinetic
+    slope = np.polyfit(trajectory.time, total, 1)[0] * 1000
+    ratio = np.std(total) / max(np.std(trajectory.kinetic), 1e-300)
+    return slope, ratio
@@ -1,10 +1,18 @@
 import dash_core_components as dcc
 import dash_html_components as html
+import functools
 import math
 import numpy as np
 import plotly.graph_objects as go
 import plotly.subplots as psub
 
+import analysis
+import animation
+import cutoffs
+import fitting
+import integrators
+import montecarlo
+
 ### COLORS ###
 
 #E2C458 yellow
@@ -83,6 +91,24 @@ lj_text = html.Div([
         '''
     ], style={'textAlign':'justify'}),
 
+    html.P([
+        '''
+        In a mixture, every pair of atom types needs its own \u03C3 and \u025B. Rather than fitting every pair, force fields combine the parameters of the two types with a mixing rule: the Lorentz-Berthelot rule takes the arithmetic mean of \u03C3 and the geometric mean of \u025B, while the geometric rule takes the geometric mean of both. Simulations combine them once into a table with one entry per pair of types, and look up each pair's parameters by type. The second graph below compares atom type A (the sliders above) with a second atom type B and the mixed A-B interaction.
+        '''
+    ], style={'textAlign':'justify'}),
+
+    html.P([
+        '''
+        Because the interaction decays quickly, simulations only compute it for atoms closer than a cutoff distance. Simply truncating the potential makes the energy and force jump at the cutoff, which breaks energy conservation, so the potential is usually shifted to zero at the cutoff, the force is shifted as well, or the potential is smoothly switched off over a short range. The missing energy beyond the cutoff can be added back with an analytic tail correction. Pick a cutoff mode to overlay the modified curves (dashed), and move the cutoff slider to see the error it introduces at the current distance.
+        '''
+    ], style={'textAlign':'justify'}),
+
+    html.P([
+        '''
+        In a liquid, the probability of finding two atoms at a distance r is given by the radial distribution function g(r), and inverting it, -RT ln g(r), gives the potential of mean force: the pair potential plus the averaged effect of all the other atoms. Toggle the sampled structure to overlay the potential of mean force of a Lennard-Jones liquid simulated with Monte Carlo at 300 K (points). Its well follows the pair potential, while the bumps beyond it come from the shells of neighbouring atoms.
+        '''
+    ], style={'textAlign':'justify'}),
+
 ])
 
 ### LENNARD-JONES FUNCTIONS ###
@@ -104,6 +130,84 @@ def force(r, sigma, epsilon):
     lj_force *= 1e13 # change kj/mol-Ang to N/mol
     return np.array(lj_force)
 
+def potential_cut(r, sigma, epsilon, rc, mode='shift', r_on=None):
+
+    """
+    returns the Lennard-Jones potential with a cutoff mode (see cutoffs.modes)
+    """
+
+    return cutoffs.potential(
+        lambda x: potential(x, sigma, epsilon),
+        lambda x: force(x, sigma, epsilon),
+        r, rc, mode, r_on,
+    )
+
+def force_cut(r, sigma, epsilon, rc, mode='shift', r_on=None):
+
+    "returns the Lennard-Jones force with a cutoff mode (units N/mol)"
+
+    return cutoffs.force(
+        lambda x: potential(x, sigma, epsilon),
+        lambda x: force(x, sigma, epsilon),
+        r, rc, mode, r_on,
+    )
+
+def tail_energy(sigma, epsilon, rc, n_atoms, volume):
+
+    """
+    returns the long-range correction to the total energy (kJ/mol) of n_atoms
+    in volume (Angstroms^3) for the interactions neglected beyond rc, assuming
+    a uniform density there
+    """
+
+    density = n_atoms / volume
+    sr3 = (sigma/rc)**3
+    return 8/3 * np.pi * n_atoms * density * epsilon * sigma**3 * (sr3**3/3 - sr3)
+
+def tail_pressure(sigma, epsilon, rc, n_atoms, volume):
+
+    """
+    returns the long-range correction to the pressure (kJ/(mol*Angstroms^3))
+    for the interactions neglected beyond rc
+    """
+
+    density = n_atoms / volume
+    sr3 = (sigma/rc)**3
+    return 16/3 * np.pi * density**2 * epsilon * sigma**3 * (2*sr3**3/3 - sr3)
+
+def mixing_table(sigmas, epsilons, rule='lorentz-berthelot'):
+
+    """
+    returns the type x type tables of combined sigma and epsilon for atom
+    types with the given per-type parameters
+
+    'lorentz-berthelot' uses the arithmetic mean of sigma, 'geometric' the
+    geometric mean; both use the geometric mean of epsilon
+    """
+
+    sigmas = np.asarray(sigmas, dtype=float)
+    epsilons = np.asarray(epsilons, dtype=float)
+    if rule == 'lorentz-berthelot':
+        sigma_table = (sigmas[:,None] + sigmas[None,:]) / 2
+    elif rule == 'geometric':
+        sigma_table = np.sqrt(sigmas[:,None] * sigmas[None,:])
+    else:
+        raise ValueError('unknown mixing rule: {}'.format(rule))
+    epsilon_table = np.sqrt(epsilons[:,None] * epsilons[None,:])
+    return sigma_table, epsilon_table
+
+def pair_parameters(types, pairs, sigma_table, epsilon_table):
+
+    """
+    returns the sigma and epsilon of each pair, gathered from the mixing
+    tables by atom type index
+    """
+
+    types = np.asarray(types)
+    i, j = pairs
+    index = types[i] * len(sigma_table) + types[j]
+    return sigma_table.ravel().take(index), epsilon_table.ravel().take(index)
+
 ### SIGMA SLIDER ###
 
 min_s = 1  # units Angstroms
@@ -155,9 +259,111 @@ lj_e_slider = dcc.Slider(
     tooltip = { 'always_visible': False },
 )
 
+### CUTOFF SLIDER ###
+
+min_rc = 2  # units Angstroms
+max_rc = 15 # units Angstroms
+lj_rc_slider = dcc.Slider(
+    min=min_rc,
+    max=max_rc,
+    step=0.1,
+    id='lj_rc_slider',
+    marks={
+        min_rc: str(min_rc),
+        max_rc: str(max_rc),
+    },
+    value=12,
+    tooltip = { 'always_visible': False },
+)
+
+### CUTOFF MODE DROPDOWN ###
+
+lj_cut_dropdown = dcc.Dropdown(
+    id='lj_cut_dropdown',
+    options=[
+        {'label': 'no cutoff', 'value': 'none'},
+        {'label': 'plain cutoff', 'value': 'cutoff'},
+        {'label': 'potential shift', 'value': 'shift'},
+        {'label': 'force shift', 'value': 'force-shift'},
+        {'label': 'switching function', 'value': 'switch'},
+    ],
+    value='none',
+    clearable=False,
+    style={'color':'#000000'},
+)
+
+### TEMPERATURE SLIDER ###
+
+min_t = 0  # units K
+max_t = 1000  # units K
+lj_t_slider = dcc.Slider(
+    min=min_t,
+    max=max_t,
+    step=10,
+    id='lj_t_slider',
+    marks={
+        min_t: str(min_t),
+        max_t: str(max_t),
+    },
+    value=min_t,
+    tooltip = { 'always_visible': False },
+)
+
+### SAMPLED STRUCTURE ###
+
+lj_structure_checklist = dcc.Checklist(
+    id='lj_structure_checklist',
+    options=[
+        {'label': ' sampled structure (Monte Carlo, 300 K)', 'value': 'structure'},
+    ],
+    value=[],
+)
+
+@functools.lru_cache(maxsize=32)
+def sampled_pmf(sigma, epsilon, temperature=300, n_atoms=64, n_sweeps=60, seed=0):
+
+    """
+    returns the distances and the potential of mean force -RT ln g(r)
+    (kJ/mol) of a Lennard-Jones liquid (reduced density 0.7), sampled with
+    Monte Carlo and accumulated in a streaming g(r)
+    """
+
+    box = (n_atoms * sigma**3 / 0.7)**(1/3)
+    side = int(np.ceil(n_atoms**(1/3)))
+    coords = np.stack(np.unravel_index(np.arange(n_atoms), (side,)*3), axis=1)
+    coords = (coords + 0.5) * (box / side)
+
+    sampler = montecarlo.MonteCarlo(coords, box, temperature, sigmas=(sigma,),
+        epsilons=(epsilon,), cutoff=2.5*sigma, seed=seed)
+    sampler.tune(n_atoms, n_rounds=5)
+    rdf = analysis.RDF(min(max_r, box/2), 75, box=box)
+    for sweep in range(n_sweeps):
+        sampler.run(n_atoms)
+        if sweep >= n_sweeps // 6:
+            rdf.update(sampler.coords)
+    return rdf.centers, rdf.boltzmann_inversion(temperature)
+
+### ENERGY SCAN FIT ###
+
+lj_fit_checklist = dcc.Checklist(
+    id='lj_fit_checklist',
+    options=[
+        {'label': ' fit to an energy scan (exp-6 Ar\u2082 reference, or upload one)', 'value': 'fit'},
+    ],
+    value=[],
+)
+
+lj_scan_upload = dcc.Upload(
+    id='lj_scan_upload',
+    children=html.Div(['drop or select a scan file (\u212B, kJ/mol)']),
+    style={'borderWidth':'1px', 'borderStyle':'dashed', 'borderColor':'#c3c3c3',
+        'borderRadius':'5px', 'textAlign':'center', 'padding':'5px'},
+)
+
 ### LENNARD-JONES POTENTIAL PLOT ###
 
-def update_lj_plot(e_value, s_value, r_value):
+def update_lj_plot(e_value, s_value, r_value, cut_value='none', rc_value=lj_rc_slider.value,
+                   structure_value=(), t_value=0, fit_value=(), scan_contents=None):
 
     r = np.arange(min_r,max_r,0.001)
     if r[0] == 0:
@@ -189,6 +395,58 @@ def update_lj_plot(e_value, s_value, r_value):
         )
     )
 
+    ### cutoff lines ###
+    if cut_value != 'none':
+        fig.add_trace(
+            go.Scatter(
+                x=r,
+                y=force_cut(r, s_value, e_value, rc_value, cut_value),
+                mode='lines',
+                line={'color':'#E2C458','width':3,'dash':'dash'},
+            ), secondary_y=True,
+        )
+
+        fig.add_trace(
+            go.Scatter(
+                x=r,
+                y=potential_cut(r, s_value, e_value, rc_value, cut_value),
+                mode='lines',
+                line={'color':'#B09ADB','width':3,'dash':'dash'},
+            )
+        )
+
+        error = potential_cut(r_value, s_value, e_value, rc_value, cut_value) \
+            - potential(r_value, s_value, e_value)
+        fig.add_annotation(
+            x=0.98,
+            y=0.98,
+            xref='paper',
+            yref='paper',
+            xanchor='right',
+            showarrow=False,
+            text='\u0394U(r) = ' + np.format_float_scientific(error, precision=2) + ' kJ/mol',
+            font=dict(
+                color='#B09ADB',
+            ),
+        )
+
+    ### Boltzmann-inverted g(r) ###
+    if 'structure' in structure_value:
+        r_pmf, pmf = sampled_pmf(round(s_value, 1), round(e_value, 2))
+        fig.add_trace(
+            go.Scatter(
+                x=r_pmf,
+                y=pmf,
+                mode='markers',
+                marker={'color':'#E6526A', 'size':5},
+            )
+        )
+
+    ### Langevin distance distribution ###
+    if t_value > 0:
+        animation.add_distribution(fig, langevin_ensemble(e_value, s_value, r_value, t_value),
+            min_r, max_r)
+
     ### distance marker ###
     fig.add_trace(
         go.Scatter(
@@ -299,30 +557,219 @@ def update_lj_plot(e_value, s_value, r_value):
         showlegend=False,
     )
 
+    ### fit to an energy scan ###
+    if 'fit' in fit_value:
+        fitting.add_fit(fig, 'lennard_jones', scan_contents)
+
     return fig
 
 fig  = update_lj_plot(lj_e_slider.value, lj_s_slider.value, lj_r_slider.value)
 lj_plot = dcc.Graph(id='lj_plot',figure=fig)
 
-### LENNARD-JONES ATOM-FORCE PLOT ###
+### SECOND ATOM TYPE SLIDERS ###
 
-def update_lj_force_plot(e_value, s_value, r_value):
+lj_s2_slider = dcc.Slider(
+    min=min_s,
+    max=max_s,
+    step=0.1,
+    id='lj_s2_slider',
+    marks={
+        min_s: str(min_s),
+        max_s: str(max_s),
+    },
+    value=4,
+    tooltip = { 'always_visible': False },
+)
+
+lj_e2_slider = dcc.Slider(
+    min=min_e,
+    max=max_e,
+    step=0.0001,
+    id='lj_e2_slider',
+    marks={
+        min_e: str(min_e),
+        max_e: str(max_e),
+    },
+    value=1,
+    tooltip = { 'always_visible': False },
+)
+
+### MIXING RULE DROPDOWN ###
+
+lj_mix_dropdown = dcc.Dropdown(
+    id='lj_mix_dropdown',
+    options=[
+        {'label': 'Lorentz-Berthelot', 'value': 'lorentz-berthelot'},
+        {'label': 'geometric', 'value': 'geometric'},
+    ],
+    value='lorentz-berthelot',
+    clearable=False,
+    style={'color':'#000000'},
+)
+
+### MIXED LENNARD-JONES POTENTIAL PLOT ###
+
+def update_lj_mix_plot(e_value, s_value, e2_value, s2_value, mix_value):
+
+    r = np.arange(min_r,max_r,0.001)
+
+    sigma_table, epsilon_table = mixing_table(
+        [s_value, s2_value], [e_value, e2_value], mix_value)
 
     fig = go.Figure()
 
-    ### setting length of force vector relative to plot area and sigma
+    for (a, b), color, dash, name in [
+        ((0, 0), '#B09ADB', 'solid', 'A-A'),
+        ((1, 1), '#E6526A', 'solid', 'B-B'),
+        ((0, 1), '#E2C458', 'dash', 'A-B'),
+    ]:
+        fig.add_trace(
+            go.Scatter(
+                x=r,
+                y=potential(r, sigma_table[a, b], epsilon_table[a, b]),
+                mode='lines',
+                name=name,
+                line={'color':color,'width':4,'dash':dash},
+            )
+        )
+
+    ### graph layout ###
+    fig.update_xaxes(
+        range=[0,max(r)],
+        showline=True,
+        mirror=True,
+        nticks=5,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+    )
+
+    fig.update_yaxes(
+        range=[-max_e*1.2, max_e*1.2],
+        showline=True,
+        mirror=True,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+        title=dict(
+            text='Potential Energy (kJ/mol)',
+        ),
+    )
+
+    fig.update_layout(
+        title='Mixed Lennard-Jones Potentials',
+        xaxis_title="r (\u212B)",
+        font=dict(
+            color="#c3c3c3"
+        ),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=True,
+    )
+
+    return fig
+
+fig  = update_lj_mix_plot(lj_e_slider.value, lj_s_slider.value, lj_e2_slider.value, lj_s2_slider.value, lj_mix_dropdown.value)
+lj_mix_plot = dcc.Graph(id='lj_mix_plot',figure=fig)
+
+### LENNARD-JONES ATOM-FORCE PLOT ###
+
+lj_play_checklist = dcc.Checklist(
+    id='lj_play_checklist',
+    options=[
+        {'label': ' play (two-atom dynamics)', 'value': 'play'},
+    ],
+    value=[],
+)
+
+lj_masses = (39.948, 39.948)  # argon, units g/mol
+
+def force_vector(r_value, s_value):
+
+    """
+    returns the length of the drawn force vectors, relative to the plot
+    area and sigma
+    """
 
     opt_r = 1.122*s_value       # optimal atomic distance
     new_r = r_value - opt_r     # relative distance compared to optimal
-    mid_pt = 2 + max_r          # mid-distance between atoms
 
     if new_r < 0:
-        force_length = -max_r*(-new_r/(opt_r - min_r))
+        return -max_r*(-new_r/(opt_r - min_r))
     elif new_r > 0:
-        #force_length = (max_r-opt_r)*(new_r/(max_r - opt_r))/2
-        force_length = (max_r)*(new_r/(max_r - opt_r))/2
+        #return (max_r-opt_r)*(new_r/(max_r - opt_r))/2
+        return (max_r)*(new_r/(max_r - opt_r))/2
     else:
-        force_length = 0
+        return 0
+
+def force_label(r_value, s_value, e_value):
+
+    "returns the force annotation text"
+
+    return 'Force = ' + str(
+        np.format_float_scientific(
+            force(r_value, s_value, e_value),
+            precision=2
+        )
+    ) + ' N/mol'
+
+def frame_time(e_value, s_value, r_value):
+
+    """
+    returns the time (fs) of an animation frame: a thirtieth of the vibration
+    period at the bottom of the well, or of the release time without a well
+    """
+
+    mu = integrators.reduced_mass(*lj_masses)
+    if e_value > 0:
+        r_opt = 2**(1/6) * s_value
+        return integrators.harmonic_period(72*e_value/r_opt**2, mu) / 30
+    return animation.release_time(lambda r: force(r, s_value, e_value), r_value, mu) / 30
+
+@functools.lru_cache(maxsize=32)
+def langevin_ensemble(e_value, s_value, r_value, t_value):
+
+    """
+    returns the distances of 1000 argon pairs released at r_value and run
+    with Langevin dynamics at t_value (K), at each animation frame
+    """
+
+    return animation.langevin_pairs(lambda r: potential(r, s_value, e_value),
+        lambda r: force(r, s_value, e_value), r_value, lj_masses, t_value,
+        frame_time(e_value, s_value, r_value), min_r, max_r)
+
+def play_distances(e_value, s_value, r_value, t_value=0):
+
+    """
+    returns the distance between two argon atoms released at r_value, at
+    each animation frame: without friction at 0 K, otherwise the first
+    replica of the Langevin ensemble
+    """
+
+    if t_value > 0:
+        return langevin_ensemble(e_value, s_value, r_value, t_value)[:,0]
+    return animation.two_body(lambda r: potential(r, s_value, e_value),
+        lambda r: force(r, s_value, e_value), r_value, lj_masses,
+        frame_time(e_value, s_value, r_value), min_r, max_r)
+
+def update_lj_force_plot(e_value, s_value, r_value, play_value=(), t_value=0):
+
+    fig = go.Figure()
+
+    ### setting length of force vector relative to plot area and sigma
+
+    mid_pt = 2 + max_r          # mid-distance between atoms
+    force_length = force_vector(r_value, s_value)
 
     ### atomic markers ###
     fig.add_trace(
@@ -405,12 +852,7 @@ def update_lj_force_plot(e_value, s_value, r_value):
                 x=mid_pt,
                 #x=mid_pt-r_value/2-max_force*conversion,
                 y=1.8,
-                text='Force = ' + str(
-                    np.format_float_scientific(
-                        force(r_value, s_value, e_value),
-                        precision=2
-                    )
-                ) + ' N/mol',
+                text=force_label(r_value, s_value, e_value),
                 xref="x",
                 yref="y",
                 showarrow=False,
@@ -428,6 +870,13 @@ def update_lj_force_plot(e_value, s_value, r_value):
         ],
     )
 
+    ### animation of the two-atom dynamics ###
+    if 'play' in play_value:
+        frames = [animation.pair_traces(mid_pt, r, force_vector(r, s_value),
+            force_label(r, s_value, e_value), 1.8)
+            for r in play_distances(e_value, s_value, r_value, t_value)]
+        fig = animation.animate(fig, frames)
+
     return fig
 
 fig  = update_lj_force_plot(lj_e_slider.value, lj_s_slider.value, lj_r_slider.value)
@@ -0,0 +1,174 @@
+import collections
+
+import numpy as np
+
+from integrators import force_scale
+
+### ENERGY MINIMIZATION ###
+
+# Each minimizer takes energy_forces(coords) -> (energy in kJ/mol, forces in
+# N/mol), such as a system.System, and the starting coordinates (Angstroms).
+# Convergence is reached when the largest force on any atom is below fmax
+# (kJ/(mol*Angstroms)), the usual criterion in MD packages.
+
+Result = collections.namedtuple('Result',
+    ['coords', 'energy', 'max_force', 'steps', 'evaluations', 'converged'])
+
+def max_force(forces):
+
+    """
+    returns the largest force on any atom in kJ/(mol*Angstroms)
+    """
+
+    return np.sqrt(np.max(np.sum(forces**2, axis=1), initial=0)) / force_scale
+
+def steepest_descent(energy_forces, coords, fmax=1.0, max_steps=10000, step=0.01):
+
+    """
+    returns the minimized Result from steepest descent with an adaptive step:
+    the atom with the largest force moves by step (Angstroms), which grows by
+    20% after a downhill move and shrinks by 80% after an uphill one
+    """
+
+    coords = np.array(coords, dtype=float)
+    energy, forces = energy_forces(coords)
+    evaluations = 1
+
+    for steps in range(max_steps):
+        fm = max_force(forces)
+        if fm < fmax:
+            return Result(coords, energy, fm, steps, evaluations, True)
+
+        trial = coords + step * forces / (fm * force_scale)
+        trial_energy, trial_forces = energy_forces(trial)
+        evaluations += 1
+        if trial_energy < energy:
+            coords, energy, forces = trial, trial_energy, trial_forces
+            step *= 1.2
+        else:
+            step *= 0.2
+
+    return Result(coords, energy, max_force(forces), max_steps, evaluations, False)
+
+def fire(energy_forces, coords, fmax=1.0, max_steps=10000, dt=0.01, dt_max=0.1,
+         max_move=0.2, n_min=5, f_inc=1.1, f_dec=0.5, alpha_start=0.1, f_alpha=0.99):
+
+    """
+    returns the minimized Result from the Fast Inertial Relaxation Engine
+    (Bitzek et al., 2006): damped dynamics with unit masses whose velocity is
+    steered towards the force, speeding up while the motion stays downhill
+    and stopping as soon as it goes uphill; max_move caps the displacement of
+    any atom per step (Angstroms)
+    """
+
+    coords = np.array(coords, dtype=float)
+    energy, forces = energy_forces(coords)
+    evaluations = 1
+    velocity = np.zeros_like(coords)
+    alpha = alpha_start
+    downhill = 0
+
+    for steps in range(max_steps):
+        fm = max_force(forces)
+        if fm < fmax:
+            return Result(coords, energy, fm, steps, evaluations, True)
+
+        accel = forces / force_scale
+        power = np.sum(accel * velocity)
+        if power > 0:
+            vnorm = np.sqrt(np.sum(velocity**2))
+            fnorm = np.sqrt(np.sum(accel**2))
+            velocity = (1 - alpha)*velocity + alpha*vnorm*accel/fnorm
+            downhill += 1
+            if downhill > n_min:
+                dt = min(dt*f_inc, dt_max)
+                alpha *= f_alpha
+        else:
+            velocity[...] = 0
+            dt *= f_dec
+            alpha = alpha_start
+            downhill = 0
+
+        ### semi-implicit Euler step with a capped displacement ###
+        velocity += dt * accel
+        move = dt * velocity
+        longest = np.sqrt(np.max(np.sum(move**2, axis=1)))
+        if longest > max_move:
+            move *= max_move / longest
+        coords = coords + move
+        energy, forces = energy_forces(coords)
+        evaluations += 1
+
+    return Result(coords, energy, max_force(forces), max_steps, evaluations, False)
+
+def lbfgs(energy_forces, coords, fmax=1.0, max_steps=10000, memory=10, max_move=0.2):
+
+    """
+    returns the minimized Result from limited-memory BFGS: the last memory
+    position and gradient changes approximate the inverse Hessian, and each
+    step is a backtracking (Armijo) line search along that quasi-Newton
+    direction, capped at max_move Angstroms for any atom
+    """
+
+    coords = np.array(coords, dtype=float)
+    energy, forces = energy_forces(coords)
+    evaluations = 1
+    grad = -forces.ravel() / force_scale
+    s_list = collections.deque(maxlen=memory)
+    y_list = collections.deque(maxlen=memory)
+
+    for steps in range(max_steps):
+        fm = max_force(forces)
+        if fm < fmax:
+            return Result(coords, energy, fm, steps, evaluations, True)
+
+        ### two-loop recursion for the direction -H*g ###
+        q = grad.copy()
+        alphas = []
+        for s, y in reversed(list(zip(s_list, y_list))):
+            a = np.dot(s, q) / np.dot(y, s)
+            alphas.append(a)
+            q -= a * y
+        if s_list:
+            q *= np.dot(s_list[-1], y_list[-1]) / np.dot(y_list[-1], y_list[-1])
+        for (s, y), a in zip(zip(s_list, y_list), reversed(alphas)):
+            b = np.dot(y, q) / np.dot(y, s)
+            q += s * (a - b)
+        direction = -q
+
+        slope = np.dot(direction, grad)
+        if slope >= 0:
+            # not a descent direction; restart from steepest descent
+            s_list.clear()
+            y_list.clear()
+            direction = -grad
+            slope = np.dot(direction, grad)
+
+        longest = np.sqrt(np.max(np.sum(direction.reshape(-1, 3)**2, axis=1)))
+        t = min(1.0, max_move / longest)
+
+        ### backtracking line search ###
+        while True:
+            trial = coords + t * direction.reshape(-1, 3)
+            trial_energy, trial_forces = energy_forces(trial)
+            evaluations += 1
+            if trial_energy <= energy + 1e-4 * t * slope or t < 1e-10:
+                break
+            t *= 0.5
+
+        trial_grad = -trial_forces.ravel() / force_scale
+        s = (trial - coords).ravel()
+        y = trial_grad - grad
+        if np.dot(s, y) > 1e-12:
+            s_list.append(s)
+            y_list.append(y)
+
+        coords, energy, forces, grad = trial, trial_energy, trial_forces, trial_grad
+
+    return Result(coords, energy, max_force(forces), max_steps, evaluations, False)
+
+methods = {
+    'steepest_descent': steepest_descent,
+    'fire': fire,
+    'lbfgs': lbfgs,
+}
@@ -0,0 +1,253 @@
+import itertools
+import time
+
+import numpy as np
+
+import coulomb as coul
+import forces
+import lennard_jones as lj
+import neighbors
+from integrators import gas_constant
+
+### METROPOLIS MONTE CARLO ###
+
+# Canonical (NVT) sampling of Lennard-Jones and Coulomb particles in a box
+# with hard walls. A move displaces one particle, so only that particle's
+# interactions change: its neighbors are gathered from the 27 surrounding
+# cells of a cell list that is updated in place, and the cost of a move does
+# not grow with the number of particles.
+
+def cell_neighbors(n_cells):
+
+    """
+    returns the flat ids of the (up to 27) cells around each cell of a grid
+    """
+
+    n_cells = np.asarray(n_cells)
+    cells = np.stack(np.unravel_index(np.arange(np.prod(n_cells)), n_cells), axis=1)
+    result = []
+    for cell in cells:
+        nb = cell + np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+        nb = nb[np.all((nb >= 0) & (nb < n_cells), axis=1)]
+        result.append(np.ravel_multi_index(nb.T, n_cells))
+    return result
+
+class MonteCarlo:
+
+    """
+    Metropolis Monte Carlo of particles in the box [0, box) at a fixed
+    temperature (K), with truncated Lennard-Jones and Coulomb interactions
+    (kJ/mol) between atom types
+
+    the cell list keeps the particles of each cell in a row of a members
+    array; a move that crosses into another cell swaps the particle out of
+    its old row and appends it to the new one
+    """
+
+    def __init__(self, coords, box, temperature=300, types=None, sigmas=(3.4,),
+                 epsilons=(1.0,), charges=None, k=1, cutoff=10.0, max_move=0.5,
+                 rule='lorentz-berthelot', seed=None):
+
+        self.coords = np.array(coords, dtype=float)
+        self.n_atoms = len(self.coords)
+        self.box = np.broadcast_to(np.asarray(box, dtype=float), 3).copy()
+        if np.any(self.coords < 0) or np.any(self.coords >= self.box):
+            raise ValueError('coordinates outside the box')
+
+        self.temperature = temperature
+        self.types = np.zeros(self.n_atoms, dtype=np.int32) if types is None \
+            else np.asarray(types, dtype=np.int32)
+        self.sigma_table, self.epsilon_table = lj.mixing_table(sigmas, epsilons, rule)
+        self.charges = np.zeros(self.n_atoms) if charges is None \
+            else np.asarray(charges, dtype=float)
+        self.k = k
+        self.cutoff = cutoff
+        self.max_move = max_move
+        self.rng = np.random.default_rng(seed)
+
+        ### cell list, with cells at least as wide as the cutoff ###
+        self.n_cells = np.maximum((self.box // cutoff).astype(int), 1)
+        self.cell_size = self.box / self.n_cells
+        self.neighbor_cells = cell_neighbors(self.n_cells)
+        n_total = int(np.prod(self.n_cells))
+        self.cell = self.cell_of(self.coords)
+        self.count = np.bincount(self.cell, minlength=n_total)
+        self.members = np.full((n_total, max(2*self.count.max(), 8)), -1, dtype=np.int64)
+        self.slot = np.zeros(self.n_atoms, dtype=np.int64)
+        for c in range(n_total):
+            atoms = np.nonzero(self.cell == c)[0]
+            self.members[c,:len(atoms)] = atoms
+            self.slot[atoms] = np.arange(len(atoms))
+
+        self.energy = self.total_energy()
+        self.attempted = 0
+        self.accepted = 0
+
+    @property
+    def beta(self):
+
+        "returns 1/RT (mol/kJ)"
+
+        return 1 / (gas_constant * self.temperature)
+
+    def cell_of(self, coords):
+
+        """
+        returns the flat cell id of each position
+        """
+
+        index = np.minimum((coords // self.cell_size).astype(int), self.n_cells - 1)
+        return np.ravel_multi_index(index.T, self.n_cells)
+
+    def pair_energy(self, i, j, r):
+
+        """
+        returns the interaction energy (kJ/mol) of atom i with atoms j at
+        distances r
+        """
+
+        index = self.types[i] * len(self.sigma_table) + self.types[j]
+        sigma = self.sigma_table.ravel().take(index)
+        epsilon = self.epsilon_table.ravel().take(index)
+        energy = lj.potential(r, sigma, epsilon)
+        energy += coul.potential(self.charges[i], self.charges[j], r, self.k) * forces.avogadro
+        return energy
+
+    def particle_energy(self, i, position):
+
+        """
+        returns the energy (kJ/mol) of atom i at position with every other
+        atom within the cutoff, found from the surrounding cells
+        """
+
+        nb_cells = self.neighbor_cells[self.cell_of(position[None])[0]]
+        rows = self.members[nb_cells]
+        j = rows[np.arange(rows.shape[1]) < self.count[nb_cells][:,None]]
+        j = j[j != i]
+        d2 = np.sum((self.coords[j] - position)**2, axis=1)
+        close = d2 < self.cutoff**2
+        return np.sum(self.pair_energy(i, j[close], np.sqrt(d2[close])))
+
+    def total_energy(self):
+
+        """
+        returns the total energy (kJ/mol) of the current configuration
+        """
+
+        i, j = neighbors.cell_pairs(self.coords, self.cutoff)
+        if len(i) == 0:
+            return 0.0
+        r = np.sqrt(np.sum((self.coords[i] - self.coords[j])**2, axis=1))
+        return float(np.sum(self.pair_energy(i, j, r)))
+
+    def move_to_cell(self, i, new_cell):
+
+        """
+        moves atom i from its cell's row of members to the row of new_cell
+        """
+
+        old_cell = self.cell[i]
+        last = self.members[old_cell, self.count[old_cell] - 1]
+        self.members[old_cell, self.slot[i]] = last
+        self.slot[last] = self.slot[i]
+        self.count[old_cell] -= 1
+
+        if self.count[new_cell] == self.members.shape[1]:
+            grown = np.full((len(self.members), 2*self.members.shape[1]), -1, dtype=np.int64)
+            grown[:,:self.members.shape[1]] = self.members
+            self.members = grown
+        self.members[new_cell, self.count[new_cell]] = i
+        self.slot[i] = self.count[new_cell]
+        self.count[new_cell] += 1
+        self.cell[i] = new_cell
+
+    def run(self, n_moves):
+
+        """
+        attempts n_moves single-particle displacements, uniform in a cube of
+        half-width max_move (Angstroms), and returns the acceptance statistics
+        and throughput of the run
+
+        the random numbers for all moves are drawn up front; a move leaving
+        the box is rejected
+        """
+
+        atoms = self.rng.integers(self.n_atoms, size=n_moves)
+        steps = self.rng.uniform(-self.max_move, self.max_move, (n_moves, 3))
+        thresholds = np.log(self.rng.uniform(size=n_moves)) / -self.beta
+        accepted = 0
+
+        start = time.perf_counter()
+        for i, step, threshold in zip(atoms, steps, thresholds):
+            trial = self.coords[i] + step
+            if np.any(trial < 0) or np.any(trial >= self.box):
+                continue
+            delta = self.particle_energy(i, trial) - self.particle_energy(i, self.coords[i])
+            if delta < threshold:  # exp(-beta*delta) > uniform
+                self.coords[i] = trial
+                self.energy += delta
+                accepted += 1
+                new_cell = self.cell_of(trial[None])[0]
+                if new_cell != self.cell[i]:
+                    self.move_to_cell(i, new_cell)
+        elapsed = time.perf_counter() - start
+
+        self.attempted += n_moves
+        self.accepted += accepted
+        return {
+            'moves': n_moves,
+            'accepted': accepted,
+            'acceptance': accepted / max(n_moves, 1),
+            'moves_per_second': n_moves / elapsed if elapsed > 0 else np.inf,
+            'energy': float(self.energy),
+        }
+
+    def tune(self, n_moves=1000, target=0.4, n_rounds=10):
+
+        """
+        returns the acceptance of the last of n_rounds short runs, each
+        followed by scaling max_move towards the target acceptance ratio
+        """
+
+        for _ in range(n_rounds):
+            acceptance = self.run(n_moves)['acceptance']
+            self.max_move *= np.clip(acceptance / target, 0.5, 2.0)
+            self.max_move = min(self.max_move, self.cell_size.min() / 2)
+        return acceptance
+
+    @property
+    def acceptance(self):
+
+        "returns the acceptance ratio over all runs so far"
+
+        return self.accepted / max(self.attempted, 1)
+
+### INDEPENDENT PAIRS ###
+
+def sample_pairs(potential, r0, temperature=300, n_replicas=2000, n_steps=500,
+                 max_move=None, seed=None):
+
+    """
+    yields the distances (Angstroms) of n_replicas independent pairs of atoms
+    after each of n_steps Metropolis moves, all replicas moved at once
+
+    each replica is the 3D separation vector of the pair, so the distances
+    sample exp(-U/RT) with its r^2 volume factor; potential(r) is in kJ/mol
+    """
+
+    rng = np.random.default_rng(seed)
+    beta = 1 / (gas_constant * temperature)
+    if max_move is None:
+        max_move = 0.1 * r0
+    vectors = np.zeros((n_replicas, 3))
+    vectors[:,2] = r0
+    energy = potential(np.full(n_replicas, float(r0)))
+
+    for _ in range(n_steps):
+        trial = vectors + rng.uniform(-max_move, max_move, vectors.shape)
+        trial_energy = potential(np.sqrt(np.sum(trial**2, axis=1)))
+        accept = rng.uniform(size=n_replicas) < np.exp(-beta * (trial_energy - energy))
+        vectors[accept] = trial[accept]
+        energy[accept] = trial_energy[accept]
+        yield np.sqrt(np.sum(vectors**2, axis=1))
+
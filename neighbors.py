@@ -0,0 +1,171 @@
+import numpy as np
+
+import periodic
+
+### NEIGHBOR SEARCH ###
+
+# half shell of neighboring cells: each pair of cells is visited once
+half_shell = np.array([
+    (dx, dy, dz)
+    for dx in (-1, 0, 1)
+    for dy in (-1, 0, 1)
+    for dz in (-1, 0, 1)
+    if (dx, dy, dz) > (0, 0, 0)
+], dtype=int)
+
+def ragged_arange(start, count):
+
+    """
+    returns the concatenation of arange(start[k], start[k] + count[k]) for all k
+    """
+
+    count = np.asarray(count)
+    total = count.sum()
+    first = np.cumsum(count) - count
+    return np.arange(total) - np.repeat(first - start, count)
+
+def brute_force_pairs(coords, cutoff, box=None):
+
+    """
+    returns the atom pairs (i < j) closer than the cutoff, checking every pair
+    (by the minimum image in a periodic Box, if given)
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    i, j = np.triu_indices(len(coords), k=1)
+    d2 = np.sum(periodic.displacements(coords, i, j, box)**2, axis=1)
+    mask = d2 < cutoff**2
+    return i[mask].astype(np.int32), j[mask].astype(np.int32)
+
+def cell_pairs(coords, cutoff, box=None):
+
+    """
+    returns the atom pairs (i < j) closer than the cutoff using a cell list
+
+    atoms are binned into cubic cells with an edge of at least the cutoff, so
+    only atoms in the same or adjacent cells are compared and the cost scales
+    linearly with the number of atoms
+
+    in a periodic Box, the cells instead divide the box along its vectors
+    (widths of at least the cutoff) and neighboring cells wrap around its
+    faces; the atoms of a wrapped cell are compared with the image of the
+    cell next to the atom, one box vector shift per cell rather than a
+    minimum image per pair, so a bulk system is searched at about the same
+    cost per pair as an isolated one
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) < 2:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+    if box is None:
+        x = coords
+        cell = ((coords - coords.min(axis=0)) // cutoff).astype(np.int64)
+        ncell = cell.max(axis=0) + 1
+        offsets = half_shell
+    else:
+        box.check_cutoff(cutoff)
+        ncell = (box.widths // cutoff).astype(np.int64)
+        ncell[ncell < 3] = 1  # the cells on both sides would be the same one
+        s = box.fractional(coords)
+        s -= np.floor(s)
+        x = s @ box.matrix
+        cell = np.minimum((s * ncell).astype(np.int64), ncell - 1)
+        offsets = half_shell[np.all((half_shell == 0) | (ncell > 1), axis=1)]
+    ### along a single-cell axis, images are only found by the minimum image ###
+    per_pair_image = box is not None and np.any(ncell == 1)
+
+    def flat(c):
+        return (c[:,0]*ncell[1] + c[:,1])*ncell[2] + c[:,2]
+
+    order = np.argsort(flat(cell), kind='stable')
+    sorted_id = flat(cell)[order]
+
+    def close(i, j, rij):
+        if per_pair_image:
+            rij = box.minimum_image(rij)
+        mask = np.einsum('ij,ij->i', rij, rij) < cutoff**2
+        return i[mask], j[mask]
+
+    pair_i = []
+    pair_j = []
+
+    ### same cell ###
+    start = np.searchsorted(sorted_id, flat(cell), side='left')
+    stop = np.searchsorted(sorted_id, flat(cell), side='right')
+    i = np.repeat(np.arange(len(coords)), stop - start)
+    j = order[ragged_arange(start, stop - start)]
+    mask = i < j
+    i, j = close(i[mask], j[mask], x[i[mask]] - x[j[mask]])
+    pair_i.append(i)
+    pair_j.append(j)
+
+    ### adjacent cells ###
+    for offset in offsets:
+        nb = cell + offset
+        xi = x
+        if box is not None:
+            shift = nb // ncell  # box vectors from the wrapped cell to its image
+            nb -= shift * ncell
+            if np.any(shift):
+                xi = x - shift @ box.matrix
+        valid = np.all((nb >= 0) & (nb < ncell), axis=1)
+        atoms = np.nonzero(valid)[0]
+        nb_id = flat(nb[valid])
+        start = np.searchsorted(sorted_id, nb_id, side='left')
+        count = np.searchsorted(sorted_id, nb_id, side='right') - start
+        j = order[ragged_arange(start, count)]
+        i, j = close(np.repeat(atoms, count), j,
+            np.repeat(xi[atoms], count, axis=0) - x[j])
+        pair_i.append(i)
+        pair_j.append(j)
+
+    i = np.concatenate(pair_i)
+    j = np.concatenate(pair_j)
+
+    ### order as i < j, sorted by i for memory locality ###
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    order = np.lexsort((j, i))
+    return i[order].astype(np.int32), j[order].astype(np.int32)
+
+### VERLET NEIGHBOR LIST ###
+
+class NeighborList:
+
+    """
+    Verlet neighbor list: pairs within cutoff + skin, rebuilt with a cell
+    list only once some atom has moved more than half the skin since the last
+    build, so the list can be reused across many steps or iterations
+
+    with a periodic Box, pairs are found by the minimum image, and atoms
+    wrapped back into the box do not count as moved
+    """
+
+    def __init__(self, cutoff, skin=2.0, box=None):
+
+        self.cutoff = cutoff
+        self.skin = skin
+        self.box = box
+        self.pairs = None
+        self.reference = None
+        self.n_builds = 0
+
+    def update(self, coords):
+
+        """
+        returns True if the list had to be rebuilt for coords
+        """
+
+        coords = np.asarray(coords, dtype=float)
+        if self.reference is not None and self.reference.shape == coords.shape:
+            moved = coords - self.reference
+            if self.box is not None:
+                moved = self.box.minimum_image(moved)
+            moved = np.max(np.sum(moved**2, axis=1), initial=0)
+            if moved < (self.skin/2)**2:
+                return False
+
+        self.pairs = cell_pairs(coords, self.cutoff + self.skin, self.box)
+        self.reference = coords.copy()
+        self.n_builds += 1
+        return True
@@ -0,0 +1,200 @@
+import functools
+
+import numpy as np
+
+import coulomb as coul
+import cutoffs
+import forces
+import periodic
+import tables
+from integrators import force_scale
+
+### FUSED NONBONDED KERNEL ###
+
+# Coulomb constant with the unit conversions of the coulomb module folded in:
+# 8.988e9 N*m^2/C^2 * (1.60218e-19 C/e)^2 * 1e10 Angstroms/m * 0.001 kJ/J * N_A,
+# so that coulomb_constant * q1 * q2 / (k * r) is in kJ/mol for q in e and r
+# in Angstroms
+coulomb_constant = 8.988e9 * 1.60218e-19**2 * 1e10 * 0.001 * forces.avogadro
+
+### CUTOFF MODES ###
+
+# With a cutoff, the interactions are brought to zero at rc as in cutoffs.py.
+# Plain truncation ('cutoff') makes the energy jump whenever a pair crosses
+# rc and 'shift' still leaves a jump in the force, and both make
+# constant-energy dynamics drift, so the default is 'force-shift', which
+# takes both the energy and the force to zero at rc. With alpha > 0,
+# Coulomb is also damped by erfc(alpha r), and force-shift is then the
+# damped shifted-force (Wolf) form of coulomb.wolf_potential (minus its
+# constant self term), a condensed-phase approximation to opt into (e.g.
+# alpha=coulomb.wolf_alpha for periodic bulk systems); the default alpha=0
+# keeps plain Coulomb, as for isolated molecules and clusters.
+cutoff_modes = ['cutoff', 'shift', 'force-shift', 'switch']
+
+# The radial functions return an energy and its first and second
+# derivatives with r; the second is None unless asked for (Hessians only).
+
+def lj_radial(r, sigma, eps, second=True):
+
+    """
+    returns the Lennard-Jones energy (kJ/mol) at r for eps = 4*epsilon and its
+    derivatives with r
+    """
+
+    inv_r2 = 1 / r**2
+    s6 = (sigma**2 * inv_r2)**3
+    energy = eps * s6 * (s6 - 1)
+    d2 = eps*(156*s6**2 - 42*s6) * inv_r2 if second else None
+    return energy, -6*eps*s6*(2*s6 - 1) / r, d2
+
+def coulomb_radial(r, qq, alpha, second=True):
+
+    """
+    returns the Coulomb energy qq*erfc(alpha*r)/r (kJ/mol, qq in
+    kJ/mol*Angstroms) and its derivatives with r
+    """
+
+    if alpha == 0:
+        energy = qq / r
+        return energy, -energy / r, 2*energy / r**2 if second else None
+    c, dc, d2c = coul.erfc_derivatives(alpha * r, second)
+    d2 = qq * (alpha**2*d2c - 2*alpha*dc/r + 2*c/r**2) / r if second else None
+    return qq * c / r, qq * (alpha*dc - c/r) / r, d2
+
+def apply_cutoff(terms, r, at_cutoff, cutoff, mode, r_on=None):
+
+    """
+    returns an energy and its derivatives with r, given as terms and
+    at_cutoff (their values at the cutoff), brought to zero at the cutoff as
+    set by the mode
+    """
+
+    energy, d1, d2 = terms
+    if mode == 'shift':
+        energy = energy - at_cutoff[0]
+    elif mode == 'force-shift':
+        energy = energy - at_cutoff[0] - (r - cutoff) * at_cutoff[1]
+        d1 = d1 - at_cutoff[1]
+    elif mode == 'switch':
+        r_on = 0.8*cutoff if r_on is None else r_on
+        s, ds = cutoffs.switch(r, r_on, cutoff)
+        if d2 is not None:
+            x = np.clip((r - r_on) / (cutoff - r_on), 0, 1)
+            d2s = -60*x*(1 - x)*(1 - 2*x) / (cutoff - r_on)**2
+            d2 = d2*s + 2*d1*ds + energy*d2s
+        energy, d1 = energy*s, d1*s + energy*ds
+    elif mode != 'cutoff':
+        raise ValueError('unknown cutoff mode: {}'.format(mode))
+    inside = r < cutoff
+    return (np.where(inside, energy, 0), np.where(inside, d1, 0),
+        None if d2 is None else np.where(inside, d2, 0))
+
+### TABULATED DAMPED COULOMB ###
+
+# The erfc of damped Coulomb (alpha > 0) makes it the most expensive radial
+# function, and a cubic Hermite table (tables.py) of its cut-off shape for
+# a unit qq, scaled by each pair's qq, evaluates about 1.8x faster. The
+# table is opt-in (tabulate=True) and used only there: plain Coulomb and
+# Lennard-Jones are cheaper to evaluate directly than to look up, and the
+# modes that leave a jump at the cutoff ('cutoff', 'shift') cannot be
+# tabulated to a tolerance. Pairs closer than table_r_min (far inside any
+# real repulsive wall) get the values at table_r_min.
+
+tabulated_modes = ['force-shift', 'switch']
+table_r_min = 1.0  # units Angstroms
+table_tolerance = 1e-6
+
+@functools.lru_cache(maxsize=64)
+def coulomb_table(cutoff, cutoff_mode, alpha, r_on=None):
+
+    """
+    returns a cached table of the damped Coulomb energy of a unit qq (kJ/mol
+    per kJ/mol*Angstroms) with the cutoff applied, and of minus its
+    derivative with r
+    """
+
+    def terms(r):
+        return apply_cutoff(coulomb_radial(r, 1, alpha, False), r,
+            coulomb_radial(cutoff, 1, alpha), cutoff, cutoff_mode, r_on)
+
+    return tables.build(lambda r: terms(r)[0], lambda r: -terms(r)[1],
+        table_r_min, cutoff, table_tolerance, force_scale=1)
+
+def radial_terms(r, sigma, eps, qq, cutoff, cutoff_mode='force-shift',
+                 alpha=0.0, r_on=None, second=False, tabulate=False):
+
+    """
+    returns the Lennard-Jones and Coulomb energies (kJ/mol) of pairs at r
+    (Angstroms) with a cutoff, and the first and (if second) second
+    derivatives of their sum with r; eps = 4*epsilon and
+    qq = coulomb_constant*q1*q2/k, both with their scale factors, and r_on
+    starts the switching region (0.8 cutoff by default)
+
+    with tabulate, damped Coulomb is looked up in coulomb_table where that
+    applies (see above)
+    """
+
+    e_lj, d1_lj, d2_lj = apply_cutoff(lj_radial(r, sigma, eps, second), r,
+        lj_radial(cutoff, sigma, eps), cutoff, cutoff_mode, r_on)
+    if tabulate and alpha and cutoff_mode in tabulated_modes and not second:
+        energy, force = coulomb_table(cutoff, cutoff_mode, alpha, r_on).evaluate(r)
+        e_coul, d1_coul, d2_coul = qq * energy, -qq * force, None
+    else:
+        e_coul, d1_coul, d2_coul = apply_cutoff(coulomb_radial(r, qq, alpha, second), r,
+            coulomb_radial(cutoff, qq, alpha), cutoff, cutoff_mode, r_on)
+    return e_lj, e_coul, d1_lj + d1_coul, d2_lj + d2_coul if second else None
+
+def pair_terms(coords, pairs, sigma, epsilon, charges, k, lj_scale=1, coul_scale=1,
+               cutoff=None, box=None, cutoff_mode='force-shift', alpha=0.0,
+               r_on=None, tabulate=False):
+
+    """
+    returns the Lennard-Jones and Coulomb energy of each pair and the per-atom
+    force contributions (index, vectors) in one pass
+
+    r^2 is computed once per pair; sigma and epsilon may be scalars or
+    per-pair arrays and charges has one value per atom; with a periodic Box,
+    each pair interacts through its minimum image
+
+    without a cutoff, both interactions are evaluated in full from 1/r^2
+    without a power function; with one, they go to zero at the cutoff as set
+    by cutoff_mode and alpha (see above), and pairs beyond it (e.g. the skin
+    of a Verlet list) are dropped; tabulate looks up damped Coulomb in a
+    table
+    """
+
+    i, j = pairs
+    rij = periodic.displacements(coords, i, j, box)
+    r2 = np.einsum('ij,ij->i', rij, rij)
+    eps = 4 * epsilon * lj_scale
+    qq = (coulomb_constant / k) * coul_scale * charges[i] * charges[j]
+
+    if cutoff is None:
+        inv_r2 = 1 / r2
+        s6 = (sigma**2 * inv_r2)**3
+        e_lj = eps * s6 * (s6 - 1)
+        e_coul = qq * np.sqrt(inv_r2)
+        fr = (6*eps*s6*(2*s6 - 1) + e_coul) * inv_r2 * force_scale  # force / r
+    else:
+        r = np.sqrt(r2)
+        e_lj, e_coul, d1, _ = radial_terms(r, sigma, eps, qq, cutoff, cutoff_mode, alpha, r_on,
+            tabulate=tabulate)
+        fr = -d1 / r * force_scale
+
+    fvec = fr[:,None] * rij
+    return e_lj, e_coul, (np.concatenate([i, j]), np.concatenate([fvec, -fvec]))
+
+def pair_forces(coords, pairs, sigma, epsilon, charges, k, lj_scale=1, coul_scale=1,
+                cutoff=None, box=None, cutoff_mode='force-shift', alpha=0.0,
+                r_on=None, tabulate=False):
+
+    """
+    returns the Lennard-Jones and Coulomb energies (kJ/mol) and the total
+    nonbonded force on each atom (N/mol) over a pair list
+    """
+
+    coords = np.asarray(coords, dtype=float)
+    charges = np.asarray(charges, dtype=float)
+    e_lj, e_coul, terms = pair_terms(coords, pairs, sigma, epsilon, charges, k,
+        lj_scale, coul_scale, cutoff, box, cutoff_mode, alpha, r_on, tabulate)
+    return np.sum(e_lj), np.sum(e_coul), forces.accumulate(len(coords), [terms])
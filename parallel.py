@@ -0,0 +1,199 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import forces
+import nonbonded
+
+### SHARED MEMORY ###
+
+def share(array):
+
+    """
+    returns a shared memory block holding a copy of array and its layout
+    (name, shape, dtype), which is all a worker needs to attach to it
+    """
+
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+# blocks attached by this worker process, by name
+attached = {}
+
+def attach(layout):
+
+    """
+    returns a numpy view of the shared memory block described by layout
+    """
+
+    name, shape, dtype = layout
+    if name not in attached:
+        attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype, buffer=attached[name].buf)
+
+def partition(n_terms, n_parts):
+
+    """
+    returns n_parts contiguous (start, stop) ranges covering n_terms
+    """
+
+    edges = np.linspace(0, n_terms, n_parts + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+### WORKER ###
+
+def evaluate_part(task):
+
+    """
+    evaluates one worker's share of every term and writes its energies and
+    forces into that worker's rows of the shared output buffers
+    """
+
+    worker, layouts, ranges = task
+
+    ### release blocks that were replaced since the last step ###
+    current = {layout[0] for layout in layouts.values()}
+    for name in list(attached):
+        if name not in current:
+            attached.pop(name).close()
+
+    arrays = {key: attach(layout) for key, layout in layouts.items()}
+    coords = arrays['coords']
+    out_forces = arrays['forces'][worker]
+    out_energy = arrays['energy'][worker]
+    out_forces[...] = 0
+
+    start, stop = ranges['bonds']
+    if stop > start:
+        s = slice(start, stop)
+        e, f = forces.bond_forces(coords, arrays['bonds'][s],
+            arrays['bo'][s], arrays['kb'][s])
+        out_energy[0] = e
+        out_forces += f
+
+    start, stop = ranges['angles']
+    if stop > start:
+        s = slice(start, stop)
+        e, f = forces.angle_forces(coords, arrays['angles'][s],
+            arrays['tho'][s], arrays['kth'][s])
+        out_energy[1] = e
+        out_forces += f
+
+    start, stop = ranges['pairs']
+    if stop > start:
+        s = slice(start, stop)
+        e_lj, e_coul, f = nonbonded.pair_forces(coords, arrays['pairs'][s].T,
+            arrays['sigma'][s], arrays['epsilon'][s],
+            arrays['charges'], arrays['k'][0])
+        out_energy[2] = e_lj
+        out_energy[3] = e_coul
+        out_forces += f
+
+    return worker
+
+### PARALLEL EVALUATOR ###
+
+class ParallelForces:
+
+    """
+    evaluates bonds, angles, Lennard-Jones and Coulomb forces on a process pool
+
+    coordinates, index arrays and parameters live in shared memory, so each
+    step only copies the new coordinates into the shared block and sends every
+    worker its id and the (tiny) block layouts; each worker writes its partial
+    forces to its own buffer, and the buffers are summed at the end
+    """
+
+    def __init__(self, n_atoms, bonds, bo, kb, angles, tho, kth,
+                 pairs, sigma, epsilon, charges, k, n_workers=None):
+
+        self.n_workers = n_workers or mp.cpu_count()
+        self.blocks = {}
+        self.layouts = {}
+
+        bonds = np.asarray(bonds, dtype=np.int32).reshape(-1, 2)
+        angles = np.asarray(angles, dtype=np.int32).reshape(-1, 3)
+        self.store('coords', np.zeros((n_atoms, 3)))
+        self.store('forces', np.zeros((self.n_workers, n_atoms, 3)))
+        self.store('energy', np.zeros((self.n_workers, 4)))
+        self.store('bonds', bonds)
+        self.store('bo', np.broadcast_to(bo, len(bonds)).astype(float))
+        self.store('kb', np.broadcast_to(kb, len(bonds)).astype(float))
+        self.store('angles', angles)
+        self.store('tho', np.broadcast_to(tho, len(angles)).astype(float))
+        self.store('kth', np.broadcast_to(kth, len(angles)).astype(float))
+        self.store('charges', np.asarray(charges, dtype=float))
+        self.store('k', np.array([k], dtype=float))
+        self.set_pairs(pairs, sigma, epsilon)
+
+        self.pool = mp.Pool(self.n_workers)
+
+    def store(self, key, array):
+
+        """
+        moves array into a new shared block, freeing any previous one
+        """
+
+        if key in self.blocks:
+            self.blocks[key].close()
+            self.blocks[key].unlink()
+        self.blocks[key], self.layouts[key] = share(array)
+
+    def set_pairs(self, pairs, sigma, epsilon):
+
+        """
+        replaces the nonbonded pair list, e.g. after a neighbor list rebuild
+        """
+
+        pairs = np.stack([np.asarray(p, dtype=np.int32) for p in pairs], axis=1)
+        self.store('pairs', pairs)
+        self.store('sigma', np.broadcast_to(sigma, len(pairs)).astype(float))
+        self.store('epsilon', np.broadcast_to(epsilon, len(pairs)).astype(float))
+
+    def view(self, key):
+        return np.ndarray(self.layouts[key][1], self.layouts[key][2],
+            buffer=self.blocks[key].buf)
+
+    def __call__(self, coords):
+
+        """
+        returns the energy terms (bond, angle, Lennard-Jones, Coulomb; kJ/mol)
+        and the total force on each atom (N/mol)
+        """
+
+        self.view('coords')[...] = coords
+        self.view('energy')[...] = 0
+
+        ranges = {
+            key: partition(len(self.view(key)), self.n_workers)
+            for key in ('bonds', 'angles', 'pairs')
+        }
+        tasks = [
+            (worker, self.layouts, {key: ranges[key][worker] for key in ranges})
+            for worker in range(self.n_workers)
+        ]
+        self.pool.map(evaluate_part, tasks)
+
+        return self.view('energy').sum(axis=0), self.view('forces').sum(axis=0)
+
+    def close(self):
+
+        """
+        stops the workers and frees the shared memory
+        """
+
+        self.pool.terminate()
+        self.pool.join()
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
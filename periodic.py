@@ -0,0 +1,144 @@
+import numpy as np
+
+### PERIODIC BOXES ###
+
+# Box vectors a, b, c are the rows of a lower-triangular matrix: a along x,
+# b in the xy plane. With this form, rounding the components of a
+# displacement against c, then b, then a (each changes only the components
+# before it) leaves it in [-ax/2, ax/2) x [-by/2, by/2) x [-cz/2, cz/2),
+# a cell holding exactly one image of every displacement. So it is the
+# minimum image whenever that is shorter than half of min(ax, by, cz), which
+# covers any cutoff up to half the narrowest width of the box, orthorhombic
+# or triclinic, at the cost of a few multiply-adds per pair.
+
+class Box:
+
+    """
+    a periodic simulation box of edge lengths a, b, c (Angstroms) and angles
+    alpha (b, c), beta (a, c) and gamma (a, b) in degrees, orthorhombic by
+    default
+
+    coordinates need not be wrapped into the box: bonded terms use them as
+    they are, so molecules stay whole, and only nonbonded pairs and the
+    neighbor search take the minimum image
+    """
+
+    def __init__(self, lengths, angles=(90, 90, 90)):
+
+        a, b, c = np.broadcast_to(np.asarray(lengths, dtype=float), 3)
+        cos_alpha, cos_beta, cos_gamma = np.cos(np.radians(angles))
+        sin_gamma = np.sin(np.radians(angles[2]))
+        cx = c * cos_beta
+        cy = c * (cos_alpha - cos_beta * cos_gamma) / sin_gamma
+        cz2 = c**2 - cx**2 - cy**2
+        if min(a, b, c) <= 0 or cz2 <= 0:
+            raise ValueError('box lengths must be positive and its angles form a cell')
+
+        matrix = np.array([[a, 0, 0], [b * cos_gamma, b * sin_gamma, 0], [cx, cy, np.sqrt(cz2)]])
+        matrix[np.abs(matrix) < 1e-12 * max(a, b, c)] = 0  # exact zeros at right angles
+        self.set_matrix(matrix)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+
+        """
+        returns the Box with the given box vectors as rows, which must be
+        lower triangular (a along x, b in the xy plane)
+        """
+
+        vectors = np.asarray(vectors, dtype=float)
+        if vectors.shape != (3, 3) or np.any(np.triu(vectors, 1) != 0):
+            raise ValueError('box vectors must be the rows of a lower-triangular 3x3 matrix')
+        if np.any(np.diag(vectors) <= 0):
+            raise ValueError('box vectors must have positive diagonal components')
+        box = cls.__new__(cls)
+        box.set_matrix(vectors)
+        return box
+
+    def set_matrix(self, matrix):
+
+        self.matrix = matrix
+        self.inverse = np.linalg.inv(matrix)
+        self.diagonal = np.diag(matrix).copy()
+        self.volume = float(np.prod(self.diagonal))
+        ### distance between opposite faces, across each box vector ###
+        self.widths = self.volume / np.linalg.norm(np.cross(matrix[[1, 2, 0]], matrix[[2, 0, 1]]), axis=1)
+
+    def __repr__(self):
+
+        return 'Box.from_vectors({})'.format(self.matrix.tolist())
+
+    def check_cutoff(self, cutoff):
+
+        """
+        raises a ValueError if an atom could interact with two images of
+        another within the cutoff
+        """
+
+        if 2 * cutoff > self.widths.min():
+            raise ValueError('cutoff {:.3g} is over half the narrowest box width ({:.3g} Angstroms)'
+                .format(cutoff, self.widths.min()))
+
+    def fractional(self, coords):
+
+        """
+        returns coords (..., 3) in units of the box vectors
+        """
+
+        return np.asarray(coords, dtype=float) @ self.inverse
+
+    def wrap(self, coords):
+
+        """
+        returns coords (..., 3) translated by box vectors into the box
+        """
+
+        s = self.fractional(coords)
+        return (s - np.floor(s)) @ self.matrix
+
+    def minimum_image(self, d):
+
+        """
+        returns the displacements d (..., 3) translated by box vectors to
+        their shortest image (see above)
+        """
+
+        ### one contiguous row per component: (n, 3) rows are slow to broadcast ###
+        d = np.array(np.moveaxis(np.asarray(d, dtype=float), -1, 0), order='C')
+        for axis in (2, 1, 0):
+            shift = d[axis] * (1 / self.matrix[axis, axis])
+            np.rint(shift, out=shift)
+            for k in range(axis + 1):
+                if self.matrix[axis, k]:
+                    d[k] -= shift * self.matrix[axis, k]
+        return np.moveaxis(d, 0, -1)
+
+def displacements(coords, i, j, box=None):
+
+    """
+    returns coords[i] - coords[j] for a pair list, as the minimum image if a
+    Box is given
+    """
+
+    rij = coords[i] - coords[j]
+    return rij if box is None else box.minimum_image(rij)
+
+### EXAMPLE SYSTEMS ###
+
+def lattice_fluid(n_atoms, density=0.03, jitter=0.2, box_angles=(90, 90, 90), seed=0):
+
+    """
+    returns coordinates of n_atoms in a periodic Box of the given number
+    density (atoms/Angstroms^3) and angles, on a perturbed lattice wrapped into
+    the box, and the Box
+    """
+
+    cos_a, cos_b, cos_g = np.cos(np.radians(box_angles))
+    shape = np.sqrt(1 - cos_a**2 - cos_b**2 - cos_g**2 + 2*cos_a*cos_b*cos_g)
+    box = Box((n_atoms / density / shape)**(1/3), box_angles)
+
+    side = int(np.ceil(n_atoms**(1/3)))
+    sites = np.stack(np.unravel_index(np.arange(n_atoms), (side,)*3), axis=1) / side
+    rng = np.random.default_rng(seed)
+    s = sites + rng.uniform(-jitter, jitter, (n_atoms, 3)) / side
+    return box.wrap(s @ box.matrix), box
@@ -0,0 +1,145 @@
+import dash_core_components as dcc
+import dash_html_components as html
+import os
+import numpy as np
+import plotly.graph_objects as go
+
+import system
+import trajectory
+
+### COLORS ###
+
+#E2C458 yellow
+#B09ADB purple
+#E6526A pink
+#c3c3c3 text
+
+### DESCRIPTION ###
+
+simulation_text = html.Div([
+
+    ### header ###
+    html.H2(['Energy Decomposition']),
+    html.Hr(),
+
+    html.P([
+        '''
+        In a simulation, all of the interactions above act at once, and the total potential energy is the sum of the bonded (bond and angle) and nonbonded (Lennard-Jones and Coulomb) terms. Splitting the energy of each frame of a trajectory into these contributions shows how energy flows between them. The graph below decomposes a short trajectory of 27 flexible water molecules that start from an idealized arrangement: as the molecules reorient, Coulomb energy is released and shows up as bond and angle vibrations.
+        '''
+    ], style={'textAlign':'justify'}),
+
+    html.P([
+        '''
+        Trajectories are read frame by frame (or memory-mapped, for DCD files), so the same analysis works for trajectories far larger than the available memory.
+        '''
+    ], style={'textAlign':'justify'}),
+
+])
+
+### EXAMPLE TRAJECTORY ###
+
+example_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'assets', 'trajectories', 'water.xyz')
+example_interval = 5  # fs between frames
+
+def example_system():
+
+    """
+    returns the force field of the example water trajectory
+    """
+
+    water = system.water_cluster(3)
+    return system.System(len(water['coords']), water['flexible'], water['types'],
+        water['sigmas'], water['epsilons'], water['charges'], cutoff=40.0)
+
+### ENERGY DECOMPOSITION PLOT ###
+
+term_colors = {
+    'bonds': '#E2C458',
+    'angles': '#B09ADB',
+    'lennard_jones': '#E6526A',
+    'coulomb': '#7FB8D4',
+}
+
+term_names = {
+    'bonds': 'bonds',
+    'angles': 'angles',
+    'lennard_jones': 'Lennard-Jones',
+    'coulomb': 'Coulomb',
+}
+
+def update_energy_plot(path=example_path, interval=example_interval):
+
+    energies = trajectory.decompose(trajectory.open_trajectory(path),
+        example_system().energy_forces)
+    t = interval * np.arange(len(energies['bonds']))
+
+    fig = go.Figure()
+
+    ### one line per term, relative to the first frame ###
+    for term, values in energies.items():
+        fig.add_trace(
+            go.Scatter(
+                x=t,
+                y=values - values[0],
+                mode='lines',
+                name=term_names.get(term, term),
+                line={'color':term_colors.get(term, '#c3c3c3'),'width':3},
+            )
+        )
+
+    ### total potential ###
+    total = sum(energies.values())
+    fig.add_trace(
+        go.Scatter(
+            x=t,
+            y=total - total[0],
+            mode='lines',
+            name='total potential',
+            line={'color':'#c3c3c3','width':3,'dash':'dash'},
+        )
+    )
+
+    ### graph layout ###
+    fig.update_xaxes(
+        showline=True,
+        mirror=True,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+    )
+
+    fig.update_yaxes(
+        showline=True,
+        mirror=True,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+        title='Change in Energy (kJ/mol)',
+    )
+
+    fig.update_layout(
+        title='Energy Decomposition',
+        xaxis_title="t (fs)",
+        font=dict(
+            color="#c3c3c3"
+        ),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=True,
+    )
+
+    return fig
+
+fig = update_energy_plot()
+energy_plot = dcc.Graph(id='energy_plot',figure=fig)
@@ -0,0 +1,237 @@
+import argparse
+import collections
+import multiprocessing as mp
+import os
+import zipfile
+
+import numpy as np
+
+import angles
+import bonds
+import coulomb as coul
+import forces
+import lennard_jones as lj
+
+### DERIVED QUANTITIES ###
+
+# Each quantity takes one column per parameter (1D arrays of the same length)
+# and returns named result columns, evaluating the interaction modules'
+# potential/force functions broadcast over the whole chunk at once.
+
+def lj_well(sigma, epsilon, n_r=400):
+
+    """
+    returns the depth (kJ/mol) and position (Angstroms) of the Lennard-Jones
+    well, found on a grid of n_r distances per point and refined with a
+    parabola through the lowest point and its neighbors
+    """
+
+    x = np.linspace(0.9, 1.5, n_r)
+    r = sigma[:,None] * x[None,:]
+    pot = lj.potential(r, sigma[:,None], epsilon[:,None])
+
+    m = np.clip(np.argmin(pot, axis=1), 1, n_r - 2)
+    rows = np.arange(len(sigma))
+    left, mid, right = pot[rows, m-1], pot[rows, m], pot[rows, m+1]
+    curve = left - 2*mid + right
+    shift = 0.5 * (left - right) / np.where(curve > 0, curve, 1)
+    return {
+        'well_depth': mid - 0.25 * (left - right) * shift,
+        'well_position': sigma * (x[m] + shift * (x[1] - x[0])),
+    }
+
+def bond_curvature(bo, kb, h=1e-3):
+
+    """
+    returns the curvature (kJ/(mol*Angstroms^2)) of the bond potential at its
+    equilibrium length and the force (N/mol) at a 0.1 Angstrom stretch
+    """
+
+    b = bo[:,None] + h * np.array([-1, 0, 1])
+    pot = bonds.potential(b, bo[:,None], kb[:,None])
+    return {
+        'curvature': (pot[:,0] - 2*pot[:,1] + pot[:,2]) / h**2,
+        'force_stretched': bonds.force(bo + 0.1, bo, kb),
+    }
+
+def angle_curvature(tho, kth, h=1e-2):
+
+    """
+    returns the curvature (kJ/(mol*degree^2)) of the angle potential at its
+    equilibrium angle and the force at a 5 degree bend
+    """
+
+    th = tho[:,None] + h * np.array([-1, 0, 1])
+    pot = angles.potential(th, tho[:,None], kth[:,None])
+    return {
+        'curvature': (pot[:,0] - 2*pot[:,1] + pot[:,2]) / h**2,
+        'force_bent': angles.force(tho + 5, tho, kth),
+    }
+
+def coulomb_contact(q1, q2, k, r):
+
+    """
+    returns the Coulomb energy (kJ/mol) and force (N/mol) of two charges at
+    contact distance r
+    """
+
+    return {
+        'contact_energy': coul.potential(q1, q2, r, k) * forces.avogadro,
+        'contact_force': coul.force(q1, q2, r, k) * forces.avogadro,
+    }
+
+quantities = {
+    'lj_well': (lj_well, ['sigma', 'epsilon']),
+    'bond_curvature': (bond_curvature, ['bo', 'kb']),
+    'angle_curvature': (angle_curvature, ['tho', 'kth']),
+    'coulomb_contact': (coulomb_contact, ['q1', 'q2', 'k', 'r']),
+}
+
+# Values per point in the widest intermediate array of each quantity (n_r
+# distances for lj_well, three stencil points for the curvatures), which set
+# its memory per point; chunks hold about chunk_values of them, so lj_well
+# runs in chunks of ~10000 points and the cheap quantities in larger ones
+point_values = {'lj_well': 400, 'bond_curvature': 3, 'angle_curvature': 3, 'coulomb_contact': 1}
+chunk_values = 4000000
+
+### PARAMETER GRIDS ###
+
+def grid_size(grid):
+
+    """
+    returns the number of points of a grid given as {name: values}
+    """
+
+    return int(np.prod([len(values) for values in grid.values()]))
+
+def grid_points(grid, start, stop):
+
+    """
+    returns the parameter columns of points start to stop of the grid, in
+    C order over the grid's parameters, without building the full grid
+    """
+
+    shape = [len(values) for values in grid.values()]
+    index = np.unravel_index(np.arange(start, stop), shape)
+    return {name: np.asarray(values, dtype=float)[i]
+        for (name, values), i in zip(grid.items(), index)}
+
+def evaluate_chunk(task):
+
+    """
+    returns the parameter and result columns of one chunk of a sweep
+    """
+
+    quantity, grid, start, stop = task
+    func, names = quantities[quantity]
+    columns = grid_points(grid, start, stop)
+    columns.update(func(*[columns[name] for name in names]))
+    return start, columns
+
+### STREAMING OUTPUT ###
+
+def write_array(archive, name, array):
+
+    """
+    writes one array as name.npy into an open zip archive
+    """
+
+    with archive.open(name + '.npy', 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, np.asarray(array), allow_pickle=False)
+
+def default_chunk_size(quantity):
+
+    """
+    returns the number of points per chunk holding about chunk_values values
+    in the quantity's widest intermediate array
+    """
+
+    return max(1, chunk_values // point_values[quantity])
+
+def run(quantity, grid, path, chunk_size=None, n_workers=None, compress=False):
+
+    """
+    evaluates a quantity over every point of a parameter grid and streams the
+    results to an npz archive at path; returns the number of points
+
+    chunks of chunk_size points (by default sized to the quantity, see
+    above) are evaluated on a process pool and written in order as they
+    complete, one npy member per column per chunk; with at
+    most two chunks per worker in flight, memory stays flat whatever the grid
+    size; the archive is written to a temporary file and renamed into place
+    at the end (npz rather than Parquet, which would need pyarrow)
+    """
+
+    func, names = quantities[quantity]
+    chunk_size = chunk_size or default_chunk_size(quantity)
+    grid = {name: np.asarray(grid[name], dtype=float).ravel() for name in names}
+    n_points = grid_size(grid)
+    tasks = [(quantity, grid, start, min(start + chunk_size, n_points))
+        for start in range(0, n_points, chunk_size)]
+
+    tmp = path + '.tmp'
+    mode = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(tmp, 'w', mode, allowZip64=True) as archive:
+        for name, values in grid.items():
+            write_array(archive, 'grid_' + name, values)
+        n_workers = n_workers or os.cpu_count()
+        with mp.Pool(n_workers) as pool:
+            ### at most two chunks per worker are in flight, so memory stays flat ###
+            pending = collections.deque()
+            for task in tasks + [None]:
+                if task is not None:
+                    pending.append(pool.apply_async(evaluate_chunk, (task,)))
+                while pending and (task is None or len(pending) == 2*n_workers):
+                    start, columns = pending.popleft().get()
+                    for name, column in columns.items():
+                        write_array(archive, '{}_{:06d}'.format(name, start // chunk_size), column)
+    os.replace(tmp, path)
+    return n_points
+
+def iter_chunks(path):
+
+    """
+    yields the columns of each chunk of a sweep archive as a dict, loading
+    one chunk at a time
+    """
+
+    with np.load(path) as archive:
+        columns = sorted({name.rsplit('_', 1)[0] for name in archive.files
+            if not name.startswith('grid_')})
+        n_chunks = sum(name.rsplit('_', 1)[0] == columns[0] for name in archive.files) if columns else 0
+        for n in range(n_chunks):
+            yield {name: archive['{}_{:06d}'.format(name, n)] for name in columns}
+
+def load(path):
+
+    """
+    returns every column of a sweep archive concatenated over the chunks
+    """
+
+    chunks = list(iter_chunks(path))
+    if not chunks:
+        raise ValueError('{} has no chunks (a sweep over an empty grid)'.format(path))
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+# usage: python sweep.py lj_well out.npz --sigma 3 4 101 --epsilon 0.5 2 101
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='sweep a derived quantity over a parameter grid')
+    parser.add_argument('quantity', choices=sorted(quantities))
+    parser.add_argument('path', help='output npz archive')
+    parser.add_argument('--chunk-size', type=int, default=None,
+        help='points per chunk (by default sized to the quantity)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--compress', action='store_true')
+    for name in sorted({name for _, names in quantities.values() for name in names}):
+        parser.add_argument('--' + name, type=float, nargs=3, metavar=('START', 'STOP', 'NUM'),
+            help='linearly spaced values of ' + name)
+    args = parser.parse_args()
+
+    names = quantities[args.quantity][1]
+    missing = [name for name in names if getattr(args, name) is None]
+    if missing:
+        parser.error('missing ranges for ' + ', '.join('--' + name for name in missing))
+    grid = {name: np.linspace(*getattr(args, name)[:2], int(getattr(args, name)[2]))
+        for name in names}
+    n_points = run(args.quantity, grid, args.path, args.chunk_size, args.workers, args.compress)
+    print('{} points written to {}'.format(n_points, args.path))
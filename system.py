@@ -0,0 +1,168 @@
+import numpy as np
+
+import lennard_jones as lj
+import neighbors
+import nonbonded
+import topology as topo
+
+### SYSTEM ###
+
+class System:
+
+    """
+    a complete force field for a set of atoms: bonded terms from a Topology,
+    plus Lennard-Jones and Coulomb interactions between atom types over a
+    Verlet neighbor list
+
+    per-type sigma/epsilon are combined once into mixing tables, and the
+    exclusions, 1-4 scale factors and pair parameters are gathered only when
+    the neighbor list is rebuilt; between rebuilds an evaluation is one bonded
+    pass and one fused nonbonded pass
+
+    the nonbonded interactions go to zero at the cutoff as set by cutoff_mode,
+    alpha and r_on (see nonbonded.pair_terms): by default both are
+    force-shifted, which keeps the energy of constant-energy dynamics from
+    drifting as pairs cross the cutoff; alpha=coulomb.wolf_alpha damps
+    Coulomb into the Wolf form for condensed phases, and tabulate then looks
+    it up in a table rather than evaluating erfc
+
+    with a periodic.Box, nonbonded pairs interact through their minimum image
+    (cutoff + skin at most half the narrowest box width); the bonded terms use
+    the coordinates as given, so molecules should be kept whole
+    """
+
+    def __init__(self, n_atoms, topology=None, types=None, sigmas=(3.4,),
+                 epsilons=(1.0,), charges=None, k=1, cutoff=10.0, skin=2.0,
+                 rule='lorentz-berthelot', masses=None, box=None,
+                 cutoff_mode='force-shift', alpha=0.0, r_on=None, tabulate=False):
+
+        self.n_atoms = n_atoms
+        self.topology = topology or topo.Topology(n_atoms)
+        self.types = np.zeros(n_atoms, dtype=np.int32) if types is None \
+            else np.asarray(types, dtype=np.int32)
+        self.sigma_table, self.epsilon_table = lj.mixing_table(sigmas, epsilons, rule)
+        self.charges = np.zeros(n_atoms) if charges is None \
+            else np.asarray(charges, dtype=float)
+        self.k = k
+        self.cutoff = cutoff
+        if cutoff_mode not in nonbonded.cutoff_modes:
+            raise ValueError('unknown cutoff mode: {}'.format(cutoff_mode))
+        self.cutoff_mode = cutoff_mode
+        self.alpha = alpha
+        self.r_on = r_on
+        self.tabulate = tabulate
+        self.masses = np.ones(n_atoms) if masses is None \
+            else np.asarray(masses, dtype=float)  # units g/mol
+        self.box = box
+        if box is not None:
+            box.check_cutoff(cutoff + skin)
+        self.neighbor_list = neighbors.NeighborList(cutoff, skin, box)
+        self.pairs = None
+
+    def update_pairs(self, coords):
+
+        """
+        rebuilds the nonbonded pair data if the neighbor list needed a rebuild
+        """
+
+        if self.neighbor_list.update(coords) or self.pairs is None:
+            self.pairs, self.lj_scale, self.coul_scale = \
+                self.topology.nonbonded_pairs(self.neighbor_list.pairs)
+            self.sigma, self.epsilon = lj.pair_parameters(
+                self.types, self.pairs, self.sigma_table, self.epsilon_table)
+
+    def bonded(self, coords):
+
+        """
+        returns the bonded energy (kJ/mol) and forces (N/mol), the fast and
+        cheap part of the force field
+        """
+
+        energies, bonded_forces = self.topology.energy_forces(np.asarray(coords, dtype=float))
+        return sum(energies.values()), bonded_forces
+
+    def nonbonded(self, coords):
+
+        """
+        returns the nonbonded energy (kJ/mol) and forces (N/mol), the slowly
+        varying and expensive part of the force field
+        """
+
+        coords = np.asarray(coords, dtype=float)
+        self.update_pairs(coords)
+        e_lj, e_coul, pair_forces = nonbonded.pair_forces(coords, self.pairs,
+            self.sigma, self.epsilon, self.charges, self.k,
+            self.lj_scale, self.coul_scale, self.cutoff, self.box,
+            self.cutoff_mode, self.alpha, self.r_on, self.tabulate)
+        return e_lj + e_coul, pair_forces
+
+    def energy_forces(self, coords):
+
+        """
+        returns the energy of each kind of term (kJ/mol) and the total force on
+        each atom (N/mol)
+        """
+
+        coords = np.asarray(coords, dtype=float)
+        self.update_pairs(coords)
+
+        energies, bonded_forces = self.topology.energy_forces(coords)
+        e_lj, e_coul, pair_forces = nonbonded.pair_forces(coords, self.pairs,
+            self.sigma, self.epsilon, self.charges, self.k,
+            self.lj_scale, self.coul_scale, self.cutoff, self.box,
+            self.cutoff_mode, self.alpha, self.r_on, self.tabulate)
+        energies['lennard_jones'] = e_lj
+        energies['coulomb'] = e_coul
+        return energies, bonded_forces + pair_forces
+
+    def __call__(self, coords):
+
+        """
+        returns the total energy (kJ/mol) and the force on each atom (N/mol)
+        """
+
+        energies, system_forces = self.energy_forces(coords)
+        return sum(energies.values()), system_forces
+
+### EXAMPLE SYSTEMS ###
+
+def water_cluster(n_side, spacing=3.1, seed=0):
+
+    """
+    returns coordinates, (O, H, H) indices and the flexible and rigid
+    topologies of a cubic cluster of randomly oriented SPC/Fw waters, with
+    masses, charges, atom types and per-type Lennard-Jones parameters (no
+    Lennard-Jones sites on H)
+    """
+
+    d_oh, th = 1.012, 113.24
+    half = np.radians(th/2)
+    water = np.array([[0, 0, 0], [d_oh*np.sin(half), d_oh*np.cos(half), 0],
+        [-d_oh*np.sin(half), d_oh*np.cos(half), 0]])
+
+    rng = np.random.default_rng(seed)
+    n_waters = n_side**3
+    sites = spacing * np.stack(np.unravel_index(np.arange(n_waters), (n_side,)*3), axis=1)
+    rotations = np.linalg.qr(rng.normal(size=(n_waters, 3, 3)))[0]
+    coords = (np.einsum('wij,aj->wai', rotations, water) + sites[:,None]).reshape(-1, 3)
+
+    n_atoms = 3 * n_waters
+    waters = np.arange(n_atoms).reshape(-1, 3)
+    bonds = np.concatenate([waters[:,[0,1]], waters[:,[0,2]]])
+    angles = waters[:,[1,0,2]]
+    kth = 317.6 * (np.pi/180)**2  # kJ/(mol*rad^2) to kJ/(mol*degree^2)
+    flexible = topo.Topology(n_atoms, bonds, d_oh, 4431.5, angles, th, kth)
+    rigid = topo.Topology(n_atoms, bonds, d_oh, 0, angles, th, 0)  # exclusions only
+
+    return {
+        'coords': coords,
+        'waters': waters,
+        'flexible': flexible,
+        'rigid': rigid,
+        'd_hh': 2 * d_oh * np.sin(half),
+        'masses': np.tile([15.999, 1.008, 1.008], n_waters),
+        'charges': np.tile([-0.82, 0.41, 0.41], n_waters),
+        'types': np.tile([0, 1, 1], n_waters),
+        'sigmas': (3.1655, 1.0),
+        'epsilons': (0.6503, 0.0),
+    }
@@ -0,0 +1,119 @@
+import numpy as np
+
+### TABULATED POTENTIALS ###
+
+class Table:
+
+    """
+    cubic Hermite lookup table of a pair potential on a uniform grid in r
+
+    each interval stores the coefficients of a cubic polynomial in the local
+    coordinate t (0 <= t < 1), so a lookup is one gather and a Horner step;
+    the force is the analytic derivative of the interpolated energy, which
+    keeps tabulated dynamics energy conserving
+    """
+
+    def __init__(self, r, energy, force, force_scale):
+
+        self.r_min = r[0]
+        self.r_max = r[-1]
+        self.h = r[1] - r[0]
+        self.force_scale = force_scale
+
+        e0, e1 = energy[:-1], energy[1:]
+        d0 = -force[:-1] / force_scale * self.h  # dE/dt at the left node
+        d1 = -force[1:] / force_scale * self.h  # dE/dt at the right node
+
+        ### polynomial coefficients, one contiguous array per power of t ###
+        self.a = e0
+        self.b = d0
+        self.c = 3*(e1 - e0) - 2*d0 - d1
+        self.d = 2*(e0 - e1) + d0 + d1
+
+    def __len__(self):
+        return len(self.a) + 1
+
+    def lookup(self, r):
+
+        """
+        returns the interval index, local coordinate and in-range mask for r
+
+        r below r_min is clamped to r_min, so the table holds its first value
+        there rather than extrapolating the first cubic; r at or beyond r_max
+        is masked out
+        """
+
+        r = np.asarray(r, dtype=float)
+        x = np.maximum((r - self.r_min) / self.h, 0)
+        k = x.astype(np.intp)
+        np.clip(k, 0, len(self.a) - 1, out=k)
+        return k, x - k, r < self.r_max
+
+    def evaluate(self, r):
+
+        """
+        returns the interpolated potential and force at r, zero beyond r_max
+        and held at their r_min values below r_min
+        """
+
+        k, t, inside = self.lookup(r)
+        b, c, d = self.b.take(k), self.c.take(k), self.d.take(k)
+        pot = self.a.take(k) + t*(b + t*(c + t*d))
+        dpot = b + t*(2*c + t*3*d)
+        tab_force = dpot * (-self.force_scale / self.h)
+        return pot * inside, tab_force * inside
+
+    def potential(self, r):
+
+        """
+        returns the interpolated potential at r
+        """
+
+        k, t, inside = self.lookup(r)
+        pot = self.a.take(k) + t*(self.b.take(k) + t*(self.c.take(k) + t*self.d.take(k)))
+        return pot * inside
+
+    def force(self, r):
+
+        "returns the interpolated force at r"
+
+        k, t, inside = self.lookup(r)
+        dpot = self.b.take(k) + t*(2*self.c.take(k) + t*3*self.d.take(k))
+        return dpot * (-self.force_scale / self.h) * inside
+
+def relative_error(approx, exact):
+
+    """
+    returns the largest error relative to the local magnitude, with a floor
+    of 1e-3 of the largest magnitude so zero crossings do not dominate
+    """
+
+    floor = 1e-3 * np.max(np.abs(exact))
+    return np.max(np.abs(approx - exact) / np.maximum(np.abs(exact), floor))
+
+def build(potential, force, r_min, r_max, tolerance=1e-5, force_scale=1e13,
+          min_points=64, max_points=2**22):
+
+    """
+    returns a Table of potential(r) and force(r) over [r_min, r_max]
+
+    the grid is refined by doubling until the interpolated energy and force at
+    the interval midpoints are within the relative tolerance of the direct
+    functions; force_scale converts dE/dr to force units (1e13 for kJ/Angstrom
+    to N, as used by every module)
+    """
+
+    n = min_points
+    while n <= max_points:
+        r = np.linspace(r_min, r_max, n)
+        table = Table(r, potential(r), force(r), force_scale)
+
+        mid = r[:-1] + table.h/2
+        tab_pot, tab_force = table.evaluate(mid)
+        if (relative_error(tab_pot, potential(mid)) <= tolerance
+                and relative_error(tab_force, force(mid)) <= tolerance):
+            return table
+        n = 2*n
+
+    raise ValueError(
+        'tolerance of {} not reached with {} points'.format(tolerance, max_points))
@@ -0,0 +1,245 @@
+import numpy as np
+
+import dihedrals as dihedral
+import forces
+import neighbors
+
+### BOND GRAPH ###
+
+def adjacency(n_atoms, bonds):
+
+    """
+    returns the bond graph in compressed form: the neighbors of atom a are
+    nbr[start[a]:start[a+1]]
+    """
+
+    bonds = np.asarray(bonds).reshape(-1, 2)
+    src = np.concatenate([bonds[:,0], bonds[:,1]])
+    dst = np.concatenate([bonds[:,1], bonds[:,0]])
+    order = np.argsort(src, kind='stable')
+    start = np.zeros(n_atoms + 1, dtype=np.int64)
+    start[1:] = np.cumsum(np.bincount(src, minlength=n_atoms))
+    return start, dst[order].astype(np.int32)
+
+def angles_from_bonds(n_atoms, bonds):
+
+    """
+    returns every angle (i, j, k) of the bond graph, with j at the vertex
+    """
+
+    start, nbr = adjacency(n_atoms, bonds)
+    center = np.repeat(np.arange(n_atoms), np.diff(start))
+    p = np.arange(len(nbr))
+    count = start[center + 1] - p - 1  # later neighbors of the same center
+    q = neighbors.ragged_arange(p + 1, count)
+    p = np.repeat(p, count)
+    return np.stack([nbr[p], center[p], nbr[q]], axis=1).astype(np.int32)
+
+def dihedrals_from_bonds(n_atoms, bonds):
+
+    """
+    returns every proper dihedral (i, j, k, l) of the bond graph, built around
+    each bond (j, k)
+    """
+
+    bonds = np.asarray(bonds).reshape(-1, 2)
+    start, nbr = adjacency(n_atoms, bonds)
+    degree = np.diff(start)
+    j, k = bonds[:,0], bonds[:,1]
+
+    count = degree[j] * degree[k]
+    b = np.repeat(np.arange(len(bonds)), count)
+    local = neighbors.ragged_arange(np.zeros(len(bonds), dtype=np.int64), count)
+    i = nbr[start[j[b]] + local // degree[k[b]]]
+    l = nbr[start[k[b]] + local % degree[k[b]]]
+
+    quads = np.stack([i, j[b], k[b], l], axis=1)
+    keep = (i != k[b]) & (l != j[b]) & (i != l)
+    return quads[keep].astype(np.int32)
+
+### EXCLUSIONS ###
+
+def pair_keys(i, j, n_atoms):
+
+    """
+    returns one int64 key per unordered atom pair, min(i, j)*n_atoms + max(i, j)
+    """
+
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    return np.minimum(i, j)*n_atoms + np.maximum(i, j)
+
+def exclusions(n_atoms, bonds):
+
+    """
+    returns the sorted keys of the excluded (1-2 and 1-3) pairs and of the
+    1-4 pairs of the bond graph; 1-4 pairs that are also 1-2 or 1-3 (in small
+    rings) count as excluded only
+    """
+
+    bonds = np.asarray(bonds).reshape(-1, 2)
+    angles = angles_from_bonds(n_atoms, bonds)
+    quads = dihedrals_from_bonds(n_atoms, bonds)
+
+    excluded = np.unique(np.concatenate([
+        pair_keys(bonds[:,0], bonds[:,1], n_atoms),
+        pair_keys(angles[:,0], angles[:,2], n_atoms),
+    ]))
+    keys14 = np.unique(pair_keys(quads[:,0], quads[:,3], n_atoms))
+    return excluded, np.setdiff1d(keys14, excluded, assume_unique=True)
+
+def contains(sorted_keys, keys):
+
+    """
+    returns a mask of which keys are in the sorted array sorted_keys
+    """
+
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.searchsorted(sorted_keys, keys)
+    return sorted_keys[np.minimum(pos, len(sorted_keys) - 1)] == keys
+
+### TOPOLOGY ###
+
+def compact(terms, width):
+
+    """
+    returns terms as a contiguous int32 (n_terms, width) array
+    """
+
+    if terms is None:
+        return np.zeros((0, width), dtype=np.int32)
+    return np.ascontiguousarray(np.asarray(terms, dtype=np.int32).reshape(-1, width))
+
+def per_term(value, terms, name):
+
+    """
+    returns a parameter broadcast to one float per term
+    """
+
+    if value is None:
+        if len(terms):
+            raise ValueError('missing parameter {} for {} terms'.format(name, len(terms)))
+        value = 0
+    return np.ascontiguousarray(np.broadcast_to(np.asarray(value, dtype=float), len(terms)))
+
+class Topology:
+
+    """
+    the bonded terms of a molecule as compact int32 index arrays with one
+    parameter value per term
+
+    parameters may be given as scalars (shared by every term) or arrays; units
+    follow the interaction modules (Angstroms, degrees, kJ/mol)
+
+    nonbonded pairs separated by one or two bonds are excluded, and pairs
+    separated by three bonds (1-4) are scaled by scale14_lj and scale14_coul
+    (AMBER values by default)
+    """
+
+    def __init__(self, n_atoms, bonds=None, bo=None, kb=None,
+                 angles=None, tho=None, kth=None,
+                 dihedrals=None, kphi=None, n=None, delta=None,
+                 impropers=None, kzeta=None, zetao=None,
+                 scale14_lj=0.5, scale14_coul=5/6):
+
+        self.n_atoms = n_atoms
+
+        self.bonds = compact(bonds, 2)
+        self.bo = per_term(bo, self.bonds, 'bo')
+        self.kb = per_term(kb, self.bonds, 'kb')
+
+        self.angles = compact(angles, 3)
+        self.tho = per_term(tho, self.angles, 'tho')
+        self.kth = per_term(kth, self.angles, 'kth')
+
+        self.dihedrals = compact(dihedrals, 4)
+        self.kphi = per_term(kphi, self.dihedrals, 'kphi')
+        self.n = per_term(n, self.dihedrals, 'n')
+        self.delta = per_term(delta, self.dihedrals, 'delta')
+
+        self.impropers = compact(impropers, 4)
+        self.kzeta = per_term(kzeta, self.impropers, 'kzeta')
+        self.zetao = per_term(zetao, self.impropers, 'zetao')
+
+        largest = max(t.max(initial=-1) for t in (self.bonds, self.angles,
+            self.dihedrals, self.impropers))
+        if largest >= n_atoms:
+            raise ValueError('atom index {} out of range for {} atoms'.format(largest, n_atoms))
+
+        ### nonbonded exclusions, derived once from the bond graph ###
+        self.excluded, self.pairs14 = exclusions(n_atoms, self.bonds)
+        self.scale14_lj = scale14_lj
+        self.scale14_coul = scale14_coul
+
+    @classmethod
+    def from_bonds(cls, n_atoms, bonds, bo, kb, tho=None, kth=None,
+                   kphi=None, n=None, delta=None, **kwargs):
+
+        """
+        returns a Topology whose angles (and dihedrals, if kphi is given) are
+        derived from the bond graph
+        """
+
+        angles = angles_from_bonds(n_atoms, bonds) if kth is not None else None
+        dihedrals = dihedrals_from_bonds(n_atoms, bonds) if kphi is not None else None
+        return cls(n_atoms, bonds, bo, kb, angles, tho, kth, dihedrals, kphi, n, delta, **kwargs)
+
+    def nonbonded_pairs(self, pairs):
+
+        """
+        returns the pairs (i, j) with exclusions removed, and the Lennard-Jones
+        and Coulomb scale factor of each remaining pair
+
+        the exclusion lists are sorted, so this is a vectorized binary search
+        rather than a check per pair
+        """
+
+        i, j = pairs
+        keys = pair_keys(i, j, self.n_atoms)
+        keep = ~contains(self.excluded, keys)
+        i, j, keys = i[keep], j[keep], keys[keep]
+
+        is14 = contains(self.pairs14, keys)
+        lj_scale = np.where(is14, self.scale14_lj, 1.0)
+        coul_scale = np.where(is14, self.scale14_coul, 1.0)
+        return (i, j), lj_scale, coul_scale
+
+    def energy_forces(self, coords):
+
+        """
+        returns the energy of each kind of bonded term (kJ/mol) and the total
+        bonded force on each atom (N/mol)
+
+        geometry and energies are computed in one vectorized pass per kind of
+        term (the dihedral angles and their force vectors share one), and
+        the force contributions of every kind are scattered onto one array
+        """
+
+        coords = np.asarray(coords, dtype=float)
+        energies = {}
+        terms = []
+
+        if len(self.bonds):
+            energy, contrib = forces.bond_terms(coords, self.bonds, self.bo, self.kb)
+            energies['bonds'] = np.sum(energy)
+            terms.append(contrib)
+
+        if len(self.angles):
+            energy, contrib = forces.angle_terms(coords, self.angles, self.tho, self.kth)
+            energies['angles'] = np.sum(energy)
+            terms.append(contrib)
+
+        if len(self.dihedrals):
+            phi, geometry = dihedral.quad_geometry(coords, self.dihedrals)
+            energies['dihedrals'] = np.sum(dihedral.potential(phi, self.kphi, self.n, self.delta))
+            terms.append(dihedral.quad_terms(coords, self.dihedrals,
+                dihedral.force(phi, self.kphi, self.n, self.delta), geometry))
+
+        if len(self.impropers):
+            zeta, geometry = dihedral.quad_geometry(coords, self.impropers)
+            energies['impropers'] = np.sum(dihedral.improper_potential(zeta, self.kzeta, self.zetao))
+            terms.append(dihedral.quad_terms(coords, self.impropers,
+                dihedral.improper_force(zeta, self.kzeta, self.zetao), geometry))
+
+        return energies, forces.accumulate(self.n_atoms, terms)
@@ -0,0 +1,462 @@
+import collections
+import gzip
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+### TRAJECTORY READERS ###
+
+# Each reader streams the frames of a trajectory file as (n_atoms, 3) arrays
+# of coordinates (Angstroms) without loading the whole file: XYZ and PDB are
+# read frame by frame from the text (gzipped if the name ends in .gz), and
+# DCD frames are views into a memory map of the file, so memory use does not
+# depend on the trajectory length.
+
+def open_text(path, mode='r'):
+
+    """
+    returns a text file object, through gzip if path ends in .gz
+    """
+
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', compresslevel=3) if 'w' in mode \
+            else gzip.open(path, mode + 't')
+    return open(path, mode)
+
+def extension(path):
+
+    """
+    returns the lowercase format extension of path, ignoring a final .gz
+    """
+
+    if path.lower().endswith('.gz'):
+        path = path[:-3]
+    return os.path.splitext(path)[1].lower()
+
+class XYZ:
+
+    """
+    reader for XYZ trajectories: each frame is an atom count line, a comment
+    line and one 'symbol x y z' line per atom
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        with open_text(path) as f:
+            self.n_atoms = int(f.readline())
+            f.readline()
+            self.symbols = [f.readline().split()[0] for _ in range(self.n_atoms)]
+
+    def __iter__(self):
+
+        with open_text(self.path) as f:
+            while True:
+                header = f.readline()
+                if not header.strip():
+                    return
+                n_atoms = int(header)
+                f.readline()
+                lines = [f.readline() for _ in range(n_atoms)]
+                yield np.array([line.split()[1:4] for line in lines], dtype=float)
+
+class PDB:
+
+    """
+    reader for multi-model PDB trajectories: the ATOM/HETATM records of each
+    MODEL (or of the whole file if there is none) form one frame
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        first = next(self.records())
+        self.n_atoms = len(first)
+        self.symbols = [line[76:78].strip() or line[12:16].strip()[:1] for line in first]
+
+    def records(self):
+
+        """
+        yields the ATOM/HETATM lines of each frame
+        """
+
+        with open_text(self.path) as f:
+            atoms = []
+            for line in f:
+                if line.startswith(('ATOM', 'HETATM')):
+                    atoms.append(line)
+                elif line.startswith(('ENDMDL', 'END')) and atoms:
+                    yield atoms
+                    atoms = []
+            if atoms:
+                yield atoms
+
+    def __iter__(self):
+
+        for atoms in self.records():
+            yield np.array([(line[30:38], line[38:46], line[46:54]) for line in atoms],
+                dtype=float)
+
+class DCD:
+
+    """
+    memory-mapped reader for CHARMM/NAMD DCD trajectories
+
+    the header is parsed once and the frames are mapped as a structured array
+    with one record per frame, so frames can be read in any order; frames
+    holds the raw record views (x, y, z and, if present, the unit cell),
+    positions is an array view of the coordinates, and iterating streams the
+    frames from the file in order
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.symbols = None
+        with open(path, 'rb') as f:
+            head = f.read(4)
+            endian = '<' if np.frombuffer(head, '<i4')[0] == 84 else '>'
+            if np.frombuffer(head, endian + 'i4')[0] != 84 or f.read(4) != b'CORD':
+                raise ValueError('{} is not a DCD file'.format(path))
+            control = np.frombuffer(f.read(80), endian + 'i4')
+            f.read(4)
+            has_cell = control[10] != 0 and control[19] != 0  # CHARMM format flag
+
+            size = np.frombuffer(f.read(4), endian + 'i4')[0]
+            f.seek(size + 4, os.SEEK_CUR)  # title record
+            f.read(4)
+            self.n_atoms = int(np.frombuffer(f.read(4), endian + 'i4')[0])
+            f.read(4)
+            offset = f.tell()
+
+        i4, f4 = endian + 'i4', endian + 'f4'
+        dtype = []
+        if has_cell:
+            dtype += [('cell_head', i4), ('cell', endian + 'f8', 6), ('cell_tail', i4)]
+        for axis in 'xyz':
+            dtype += [(axis + '_head', i4), (axis, f4, self.n_atoms), (axis + '_tail', i4)]
+        self.dtype = np.dtype(dtype)
+
+        n_frames = (os.path.getsize(path) - offset) // self.dtype.itemsize
+        self.timestep = np.frombuffer(control[9:10].tobytes(), endian + 'f4')[0]  # as stored, AKMA units in CHARMM
+        self.frames = np.memmap(path, dtype=self.dtype, mode='r', offset=offset,
+            shape=(n_frames,))
+
+    def __len__(self):
+
+        return len(self.frames)
+
+    @property
+    def positions(self):
+
+        "returns an array-like (n_frames, n_atoms, 3) view of the coordinates"
+
+        return Positions(self.frames)
+
+    def __getitem__(self, index):
+
+        frame = self.frames[index]
+        return np.stack([frame['x'], frame['y'], frame['z']], axis=-1).astype(float)
+
+    def __iter__(self):
+
+        # sequential reads, so pages of the map do not accumulate as resident
+        # memory over a long trajectory
+        with open(self.path, 'rb') as f:
+            f.seek(self.frames.offset)
+            for _ in range(len(self)):
+                frame = np.fromfile(f, dtype=self.dtype, count=1)[0]
+                yield np.stack([frame['x'], frame['y'], frame['z']], axis=-1).astype(float)
+
+class Positions:
+
+    """
+    array-like (n_frames, n_atoms, 3) view of the coordinates in a memory map
+    of DCD records; indexing with [frames, atoms] reads only those frames and
+    atoms, e.g. a chunk of atoms over the whole trajectory
+    """
+
+    def __init__(self, frames):
+
+        self.frames = frames
+        self.shape = (len(frames), frames.dtype['x'].shape[0], 3)
+
+    def __len__(self):
+
+        return self.shape[0]
+
+    def __getitem__(self, index):
+
+        frames, atoms = index if isinstance(index, tuple) else (index, slice(None))
+        records = self.frames[frames]
+        return np.stack([records[axis][..., atoms] for axis in 'xyz'], axis=-1).astype(float)
+
+readers = {
+    '.xyz': XYZ,
+    '.pdb': PDB,
+    '.dcd': DCD,
+}
+
+def open_trajectory(path):
+
+    """
+    returns the reader for a trajectory file, chosen by its extension
+    """
+
+    if extension(path) not in readers:
+        raise ValueError('unknown trajectory format: {}'.format(extension(path)))
+    return readers[extension(path)](path)
+
+### TRAJECTORY WRITERS ###
+
+# Writers take one frame of coordinates (Angstroms) at a time, and can be
+# passed directly as observers to the integrators (update writes a frame).
+# XYZ is plain text with a chosen number of decimals, optionally gzipped;
+# DCD stores float32 binary frames (12 bytes per atom) readable by the DCD
+# reader above and by VMD, MDAnalysis and similar tools.
+#
+# DCD is the format to write from a simulation: a frame is a few buffer
+# copies (about 0.1 ms for 3000 atoms), so writing it synchronously costs
+# little, and BackgroundWriter does not beat it. The thread only overlaps
+# work that releases the GIL (disk waits, gzip compression), while XYZ
+# formatting holds it, so on a busy or single-core machine it saves
+# little for text formats either (see bench_output in benchmarks.py).
+
+akma_time = 48.88821  # fs per AKMA time unit, the DCD timestep unit
+
+class XYZWriter:
+
+    """
+    writer for XYZ trajectories with the given atom symbols, coordinates
+    written with precision decimals
+    """
+
+    dtype = np.float64
+
+    def __init__(self, path, symbols, precision=5):
+
+        self.file = open_text(path, 'w')
+        self.n_atoms = len(symbols)
+        self.n_frames = 0
+        ### one format string per frame, with the symbols filled in ###
+        line = ' %.{}f %.{}f %.{}f\n'.format(precision, precision, precision)
+        self.template = ''.join(str(symbol) + line for symbol in symbols)
+
+    def write(self, coords, comment=''):
+
+        self.file.write('{}\n{}\n'.format(self.n_atoms, comment))
+        self.file.write(self.template % tuple(np.ravel(coords)))
+        self.n_frames += 1
+
+    def update(self, coords):
+
+        self.write(coords)
+
+    def close(self):
+
+        self.file.close()
+
+class DCDWriter:
+
+    """
+    writer for CHARMM-format DCD trajectories of len(symbols) atoms, with
+    frames timestep fs apart; the frame count in the header is updated as
+    frames are written
+    """
+
+    dtype = np.float32
+
+    def __init__(self, path, symbols, timestep=1.0):
+
+        self.file = open(path, 'wb')
+        self.n_atoms = len(symbols)
+        self.n_frames = 0
+
+        control = np.zeros(20, dtype='<i4')
+        control[2] = 1  # steps between frames
+        control[9] = np.array([timestep / akma_time], dtype='<f4').view('<i4')[0]
+        control[19] = 24  # CHARMM version, with no unit cell records
+        title = 'written by interactive-md'.ljust(80).encode()
+
+        self.record(b'CORD' + control.tobytes())
+        self.record(np.int32(1).astype('<i4').tobytes() + title)
+        self.record(np.int32(self.n_atoms).astype('<i4').tobytes())
+
+    def record(self, data):
+
+        size = np.int32(len(data)).astype('<i4').tobytes()
+        self.file.write(size + data + size)
+
+    def write(self, coords, comment=''):
+
+        coords = np.asarray(coords, dtype='<f4')
+        for axis in range(3):
+            self.record(np.ascontiguousarray(coords[:, axis]).tobytes())
+        self.n_frames += 1
+
+        ### frame count (and last step) in the header ###
+        end = self.file.tell()
+        self.file.seek(8)
+        self.file.write(np.int32(self.n_frames).astype('<i4').tobytes())
+        self.file.seek(20)
+        self.file.write(np.int32(self.n_frames).astype('<i4').tobytes())
+        self.file.seek(end)
+
+    def update(self, coords):
+
+        self.write(coords)
+
+    def close(self):
+
+        self.file.close()
+
+writers = {
+    '.xyz': XYZWriter,
+    '.dcd': DCDWriter,
+}
+
+def open_writer(path, symbols, **kwargs):
+
+    """
+    returns the writer for a trajectory file, chosen by its extension, with
+    keyword arguments passed on (precision for XYZ, timestep for DCD)
+    """
+
+    if extension(path) not in writers:
+        raise ValueError('unknown trajectory format: {}'.format(extension(path)))
+    return writers[extension(path)](path, symbols, **kwargs)
+
+class BackgroundWriter:
+
+    """
+    feeds frames to a trajectory writer (XYZWriter or DCDWriter) on a
+    background thread, so a simulation does not wait on a slow disk (a DCD
+    writer is better passed to the integrators directly, see above)
+
+    update(coords) copies the frame (as float32 for binary formats) into a
+    batch and returns; full batches of batch_size frames go to a queue of at
+    most max_batches batches, and update only blocks if the writer falls that
+    far behind, so memory stays bounded; it can be passed as an observer to
+    the integrators, or fed from a generator with extend
+
+    timings holds the seconds spent copying and waiting in the caller and
+    writing in the background; an error in the writer is raised by the next
+    call to update or close
+    """
+
+    def __init__(self, writer, batch_size=16, max_batches=8):
+
+        self.writer = writer
+        self.batch_size = batch_size
+        self.batch = []
+        self.queue = queue.Queue(maxsize=max_batches)
+        self.error = None
+        self.timings = {'copy': 0.0, 'wait': 0.0, 'write': 0.0}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            if self.error is None:
+                start = time.perf_counter()
+                try:
+                    for frame in batch:
+                        self.writer.write(*frame)
+                except Exception as error:
+                    self.error = error
+                self.timings['write'] += time.perf_counter() - start
+
+    def check(self):
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self):
+
+        """
+        queues the frames batched so far
+        """
+
+        if self.batch:
+            start = time.perf_counter()
+            self.queue.put(self.batch)
+            self.batch = []
+            self.timings['wait'] += time.perf_counter() - start
+
+    def update(self, coords, comment=''):
+
+        """
+        batches a copy of a frame of coordinates
+        """
+
+        self.check()
+        start = time.perf_counter()
+        self.batch.append((np.array(coords, dtype=self.writer.dtype), comment))
+        self.timings['copy'] += time.perf_counter() - start
+        if len(self.batch) == self.batch_size:
+            self.flush()
+
+    def extend(self, frames):
+
+        """
+        queues every frame of an iterable of coordinates
+        """
+
+        for coords in frames:
+            self.update(coords)
+
+    def close(self):
+
+        """
+        writes the remaining frames and closes the writer
+        """
+
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.close()
+        self.check()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+### ENERGY DECOMPOSITION ###
+
+def energy_series(frames, energy_forces, stride=1):
+
+    """
+    yields the energy of each kind of term (kJ/mol) for every stride-th frame
+
+    energy_forces(coords) returns (dict of energies, forces), such as
+    system.System.energy_forces; only one frame is held at a time
+    """
+
+    for index, coords in enumerate(frames):
+        if index % stride == 0:
+            yield energy_forces(coords)[0]
+
+def decompose(frames, energy_forces, stride=1):
+
+    """
+    returns the per-frame energy of each kind of term (kJ/mol) as arrays,
+    streaming the frames through energy_series
+    """
+
+    series = collections.defaultdict(list)
+    for energies in energy_series(frames, energy_forces, stride):
+        for name, energy in energies.items():
+            series[name].append(energy)
+    return {name: np.array(values) for name, values in series.items()}
@@ -0,0 +1,307 @@
+import dash_core_components as dcc
+import dash_html_components as html
+import functools
+import numpy as np
+import plotly.graph_objects as go
+
+import hessian
+import minimize
+import system
+import topology as topo
+
+### COLORS ###
+
+#E2C458 yellow
+#B09ADB purple
+#E6526A pink
+#c3c3c3 text
+
+### DESCRIPTION ###
+
+vibrations_text = html.Div([
+
+    ### header ###
+    html.H2(['Normal Modes']),
+    html.Hr(),
+
+    html.P([
+        '''
+        Near an energy minimum, every force field looks harmonic: the energy grows with the square of small displacements of the atoms, with the second derivatives of the energy (the Hessian matrix) as the force constants. Weighting the Hessian by the atomic masses and finding its eigenvectors splits any small motion of a molecule into independent vibrations, its normal modes, each with its own frequency. A molecule of N atoms has 3N - 6 of them (3N - 5 if it is linear), since the remaining motions are translations and rotations of the whole molecule.
+        '''
+    ], style={'textAlign':'justify'}),
+
+    html.P([
+        '''
+        The graphs below show the normal modes of small molecules, computed from the analytic second derivatives of the bond, angle, dihedral and nonbonded terms above at the minimized structure. The fastest vibration, usually a stretch of a bond to hydrogen, sets the timestep of a simulation: it must resolve the shortest period, about 11 fs for a C-H stretch near 3000 cm
+        ''',
+        html.Sup('-1'),
+        '''
+        .
+        '''
+    ], style={'textAlign':'justify'}),
+
+])
+
+### MOLECULES ###
+
+# Parameters in the units of the interaction modules (Angstroms, degrees,
+# kJ/mol); the angle constants are converted from per radian^2.
+
+per_degree2 = (np.pi/180)**2
+
+def tetrahedral_hydrogens(center, direction, azimuths, length=1.09, angle=109.5):
+
+    """
+    returns hydrogens bonded to a carbon at center, tilted from the axis
+    direction (+1 or -1 along z) by 180 - angle degrees, at the azimuths
+    (degrees) around it
+    """
+
+    tilt = np.radians(180 - angle)
+    phi = np.radians(azimuths)
+    return center + length * np.stack([np.sin(tilt)*np.cos(phi), np.sin(tilt)*np.sin(phi),
+        np.full(len(phi), direction*np.cos(tilt))], axis=1)
+
+def water():
+
+    "returns a flexible SPC/Fw water molecule"
+
+    w = system.water_cluster(1)
+    force_field = system.System(3, w['flexible'], w['types'], w['sigmas'], w['epsilons'],
+        w['charges'], masses=w['masses'])
+    return w['coords'], force_field, ['O', 'H', 'H'], [[0, 1], [0, 2]]
+
+def methane():
+
+    "returns methane with AMBER CT-HC bond and HC-CT-HC angle parameters"
+
+    coords = np.concatenate([[[0.0, 0.0, 0.0]], [[0.0, 0.0, 1.09]],
+        tetrahedral_hydrogens(np.zeros(3), -1, [0, 120, 240])])
+    bonds = [[0, 1], [0, 2], [0, 3], [0, 4]]
+    topology = topo.Topology.from_bonds(5, bonds, 1.09, 2845, 109.5, 292.9*per_degree2)
+    force_field = system.System(5, topology, masses=[12.011] + [1.008]*4)
+    return coords, force_field, ['C', 'H', 'H', 'H', 'H'], bonds
+
+def ethane():
+
+    """
+    returns staggered ethane with AMBER CT/HC bonds, angles and the H-C-C-H
+    torsion, and Lennard-Jones 1-4 interactions between the hydrogens
+    """
+
+    c1, c2 = np.array([0.0, 0.0, 0.763]), np.array([0.0, 0.0, -0.763])
+    coords = np.concatenate([[c1, c2], tetrahedral_hydrogens(c1, 1, [0, 120, 240]),
+        tetrahedral_hydrogens(c2, -1, [60, 180, 300])])
+    bonds = np.array([[0, 1], [0, 2], [0, 3], [0, 4], [1, 5], [1, 6], [1, 7]])
+    n_atoms = 8
+
+    angles = topo.angles_from_bonds(n_atoms, bonds)
+    hcc = np.any(angles[:,[0,2]] < 2, axis=1)  # an end atom is a carbon
+    dihedrals = topo.dihedrals_from_bonds(n_atoms, bonds)
+    topology = topo.Topology(n_atoms, bonds, np.where(np.arange(7) == 0, 1.526, 1.09),
+        np.where(np.arange(7) == 0, 2594, 2845), angles, 109.5,
+        np.where(hcc, 418.4, 292.9) * per_degree2, dihedrals, 1.2552, 3, 0)
+    force_field = system.System(n_atoms, topology, [0, 0] + [1]*6, sigmas=(3.40, 2.65),
+        epsilons=(0.4577, 0.0657), masses=[12.011]*2 + [1.008]*6)
+    return coords, force_field, ['C', 'C'] + ['H']*6, bonds.tolist()
+
+molecules = {
+    'water': water,
+    'methane': methane,
+    'ethane': ethane,
+}
+
+@functools.lru_cache(maxsize=8)
+def molecule_modes(name):
+
+    """
+    returns the minimized coordinates, symbols, bonds and normal Modes of a
+    molecule
+    """
+
+    coords, force_field, symbols, bonds = molecules[name]()
+    coords = minimize.lbfgs(force_field, coords, fmax=1e-4).coords
+    modes = hessian.normal_modes(hessian.system_hessian(force_field, coords), coords,
+        force_field.masses)
+    return coords, symbols, bonds, modes
+
+### CONTROLS ###
+
+vib_molecule_dropdown = dcc.Dropdown(
+    id='vib_molecule_dropdown',
+    options=[{'label': name, 'value': name} for name in molecules],
+    value='water',
+    clearable=False,
+    style={'color':'#000000'},
+)
+
+def mode_options(name):
+
+    """
+    returns the mode dropdown options of a molecule, labeled by frequency
+    """
+
+    frequencies = molecule_modes(name)[3].frequencies
+    return [{'label': '{}: {:.0f} cm\u207B\u00B9'.format(n + 1, f), 'value': n}
+        for n, f in enumerate(frequencies)]
+
+vib_mode_dropdown = dcc.Dropdown(
+    id='vib_mode_dropdown',
+    options=mode_options('water'),
+    value=len(mode_options('water')) - 1,
+    clearable=False,
+    style={'color':'#000000'},
+)
+
+### NORMAL MODE PLOT ###
+
+def update_mode_plot(name, mode):
+
+    coords, symbols, bonds, modes = molecule_modes(name)
+    mode = min(mode, len(modes.frequencies) - 1)
+    displacement = modes.displacements[mode]
+    heavy = np.array([s != 'H' for s in symbols])
+
+    fig = go.Figure()
+
+    ### bonds ###
+    segments = np.full((3*len(bonds), 3), np.nan)
+    segments[0::3] = coords[[i for i, j in bonds]]
+    segments[1::3] = coords[[j for i, j in bonds]]
+    fig.add_trace(
+        go.Scatter3d(
+            x=segments[:,0],
+            y=segments[:,1],
+            z=segments[:,2],
+            mode='lines',
+            hoverinfo='none',
+            line={'color':'#c3c3c3','width':6},
+        )
+    )
+
+    ### atoms ###
+    fig.add_trace(
+        go.Scatter3d(
+            x=coords[:,0],
+            y=coords[:,1],
+            z=coords[:,2],
+            mode='markers',
+            text=symbols,
+            hoverinfo='text',
+            marker={'color':np.where(heavy, '#E6526A', '#c3c3c3'),
+                'size':np.where(heavy, 14, 8), 'opacity':1},
+        )
+    )
+
+    ### mode displacements ###
+    fig.add_trace(
+        go.Cone(
+            x=coords[:,0],
+            y=coords[:,1],
+            z=coords[:,2],
+            u=displacement[:,0],
+            v=displacement[:,1],
+            w=displacement[:,2],
+            anchor='tail',
+            sizemode='absolute',
+            sizeref=0.6,
+            hoverinfo='none',
+            showscale=False,
+            colorscale=[[0, '#E2C458'], [1, '#E2C458']],
+        )
+    )
+
+    ### graph layout ###
+    axis = dict(visible=False)
+    fig.update_layout(
+        title='{} mode {}: {:.0f} cm<sup>-1</sup>'.format(name, mode + 1, modes.frequencies[mode]),
+        scene=dict(xaxis=axis, yaxis=axis, zaxis=axis, aspectmode='data'),
+        font=dict(
+            color="#c3c3c3"
+        ),
+        margin=dict(l=0, r=0, b=0),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=False,
+    )
+
+    return fig
+
+fig = update_mode_plot('water', vib_mode_dropdown.value)
+mode_plot = dcc.Graph(id='mode_plot',figure=fig)
+
+### VIBRATIONAL SPECTRUM PLOT ###
+
+def update_spectrum_plot(name, mode):
+
+    frequencies = molecule_modes(name)[3].frequencies
+    mode = min(mode, len(frequencies) - 1)
+    colors = ['#E6526A' if n == mode else '#B09ADB' for n in range(len(frequencies))]
+
+    fig = go.Figure()
+
+    ### one line per mode ###
+    fig.add_trace(
+        go.Bar(
+            x=frequencies,
+            y=np.ones(len(frequencies)),
+            width=20,
+            hovertext=['mode {}'.format(n + 1) for n in range(len(frequencies))],
+            marker={'color':colors},
+        )
+    )
+
+    ### timestep limit of the fastest mode ###
+    fig.add_annotation(
+        x=0.02,
+        y=0.98,
+        xref='paper',
+        yref='paper',
+        xanchor='left',
+        showarrow=False,
+        text='fastest mode: \u0394t \u2264 {:.2f} fs'.format(hessian.max_timestep(frequencies.max())),
+        font=dict(
+            color='#E6526A',
+        ),
+    )
+
+    ### graph layout ###
+    fig.update_xaxes(
+        range=[0, 4000],
+        showline=True,
+        mirror=True,
+        ticks="outside",
+        tickwidth=1,
+        ticklen=10,
+        linewidth=1,
+        gridwidth=1,
+        tickcolor='#c3c3c3',
+        linecolor='#c3c3c3',
+        gridcolor='#c3c3c3',
+    )
+
+    fig.update_yaxes(
+        range=[0, 1.2],
+        showline=True,
+        mirror=True,
+        showticklabels=False,
+        linewidth=1,
+        linecolor='#c3c3c3',
+        showgrid=False,
+    )
+
+    fig.update_layout(
+        title='Vibrational Frequencies',
+        xaxis_title="wavenumber (cm<sup>-1</sup>)",
+        font=dict(
+            color="#c3c3c3"
+        ),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=False,
+    )
+
+    return fig
+
+fig = update_spectrum_plot('water', vib_mode_dropdown.value)
+spectrum_plot = dcc.Graph(id='spectrum_plot',figure=fig)